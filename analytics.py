@@ -0,0 +1,219 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import literal
+from models import db, Book, Member, MembershipType, Staff, Borrowing, CirculationRollup, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'circulation_rollups'
+
+DIMENSIONS = ('total', 'genre', 'book', 'staff', 'membership_type')
+INTERVALS = ('day', 'week', 'month')
+
+
+def _dimension_key(dimension: str):
+    """Return the column a borrowing is grouped by for a dimension."""
+    if dimension == 'total':
+        return literal('')
+    if dimension == 'genre':
+        return Book.Genre
+    if dimension == 'book':
+        return Borrowing.BookID
+    if dimension == 'staff':
+        return Borrowing.StaffID
+    if dimension == 'membership_type':
+        return Member.MembershipTypeID
+    raise ValueError(f"Unknown analytics dimension: {dimension}")
+
+
+def _grouped_counts(date_column, dimension: str, start: date, end: date) -> List[Tuple]:
+    key = _dimension_key(dimension)
+    query = db.session.query(date_column, key, db.func.count(Borrowing.BorrowID))
+    if dimension == 'genre':
+        query = query.join(Book, Book.BookID == Borrowing.BookID)
+    elif dimension == 'membership_type':
+        query = query.join(Member, Member.MemberID == Borrowing.MemberID)
+    return query.filter(
+        date_column >= start, date_column <= end
+    ).group_by(date_column, key).all()
+
+
+def aggregate_borrowings(dimension: str, start: date, end: date) -> Dict[Tuple[date, str], Dict[str, int]]:
+    """Count checkouts and returns per day and dimension key straight from Borrowings.
+
+    The grouping runs in the database as two GROUP BY scans (checkouts by
+    BorrowDate, returns by ReturnDate), so only one row per day and key
+    crosses the wire. Used both to build rollups and to answer ranges the
+    rollup job has not reached yet.
+    """
+    counts = defaultdict(lambda: {'checkouts': 0, 'returns': 0})
+    for day, key, count in _grouped_counts(Borrowing.BorrowDate, dimension, start, end):
+        counts[(day, _normalize_key(key))]['checkouts'] += count
+    for day, key, count in _grouped_counts(Borrowing.ReturnDate, dimension, start, end):
+        counts[(day, _normalize_key(key))]['returns'] += count
+    return counts
+
+
+def _normalize_key(key) -> str:
+    return '' if key is None else str(key)
+
+
+# ================ Rollup batch job ================
+
+def get_rolled_through() -> Optional[date]:
+    """Return the last day covered by the rollup tables, if any."""
+    watermark = db.session.get(RollupWatermark, WATERMARK_NAME)
+    return watermark.RolledThrough if watermark else None
+
+
+def roll_up(through: Optional[date] = None, rebuild_from: Optional[date] = None) -> Dict[str, Any]:
+    """Extend the daily rollups from the watermark up to `through` (default yesterday).
+
+    Only complete days are rolled up, so a later `through` is clamped to
+    yesterday; today is always served live. Pass `rebuild_from` to
+    recompute days that were already rolled up, e.g. after back-dated
+    borrowing edits.
+    """
+    yesterday = date.today() - timedelta(days=1)
+    through = min(through, yesterday) if through else yesterday
+    rolled_through = get_rolled_through()
+
+    # Rollups are rebuilt from Borrowings, which no longer holds archived loans
+    from archive import get_horizon
+    archive_horizon = get_horizon()
+    if rebuild_from and archive_horizon and rebuild_from < archive_horizon:
+        raise ValueError(f"Cannot rebuild rollups before {archive_horizon}: those borrowings are archived")
+
+    if rebuild_from:
+        start = rebuild_from
+    elif rolled_through:
+        start = rolled_through + timedelta(days=1)
+    else:
+        start = db.session.query(db.func.min(Borrowing.BorrowDate)).scalar()
+        if start is None:
+            return {'rolled_from': None, 'rolled_through': None, 'rows': 0}
+
+    if start > through:
+        return {'rolled_from': None, 'rolled_through': rolled_through.isoformat() if rolled_through else None, 'rows': 0}
+
+    CirculationRollup.query.filter(
+        CirculationRollup.RollupDate >= start,
+        CirculationRollup.RollupDate <= through
+    ).delete(synchronize_session=False)
+
+    rows = []
+    for dimension in DIMENSIONS:
+        for (day, key), counts in aggregate_borrowings(dimension, start, through).items():
+            rows.append({
+                'RollupDate': day,
+                'Dimension': dimension,
+                'DimensionKey': key,
+                'Checkouts': counts['checkouts'],
+                'Returns': counts['returns']
+            })
+    if rows:
+        db.session.execute(CirculationRollup.__table__.insert(), rows)
+
+    new_watermark = max(through, rolled_through) if rolled_through else through
+    watermark = db.session.get(RollupWatermark, WATERMARK_NAME)
+    if watermark:
+        watermark.RolledThrough = new_watermark
+    else:
+        db.session.add(RollupWatermark(Name=WATERMARK_NAME, RolledThrough=new_watermark))
+
+    db.session.commit()
+    logger.info(f"Rolled up circulation from {start} to {through}: {len(rows)} rows")
+    return {'rolled_from': start.isoformat(), 'rolled_through': new_watermark.isoformat(), 'rows': len(rows)}
+
+
+# ================ Query ================
+
+def _bucket(day: date, interval: str) -> date:
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _rollup_counts(dimension: str, start: date, end: date) -> Dict[Tuple[date, str], Dict[str, int]]:
+    rows = db.session.query(
+        CirculationRollup.RollupDate,
+        CirculationRollup.DimensionKey,
+        CirculationRollup.Checkouts,
+        CirculationRollup.Returns
+    ).filter(
+        CirculationRollup.Dimension == dimension,
+        CirculationRollup.RollupDate >= start,
+        CirculationRollup.RollupDate <= end
+    ).all()
+    return {(day, key): {'checkouts': checkouts, 'returns': returns} for day, key, checkouts, returns in rows}
+
+
+def _labels(dimension: str, keys) -> Dict[str, Optional[str]]:
+    """Resolve dimension keys to display names in one query."""
+    if dimension == 'genre':
+        return {key: key or 'Uncategorized' for key in keys}
+    ids = [int(key) for key in keys if key]
+    if dimension == 'total' or not ids:
+        return {}
+    if dimension == 'book':
+        rows = db.session.query(Book.BookID, Book.Title).filter(Book.BookID.in_(ids))
+    elif dimension == 'staff':
+        rows = db.session.query(Staff.StaffID, Staff.Name).filter(Staff.StaffID.in_(ids))
+    else:
+        rows = db.session.query(MembershipType.MembershipTypeID, MembershipType.TypeName).filter(
+            MembershipType.MembershipTypeID.in_(ids))
+    return {str(key_id): name for key_id, name in rows}
+
+
+def get_circulation(start: date, end: date, group_by: str = 'total', interval: str = 'day') -> Dict[str, Any]:
+    """Checkouts and returns for a date range, grouped by dimension and interval.
+
+    Days up to the rollup watermark are read from the rollup table; any
+    remaining days are aggregated live from Borrowings.
+    """
+    if group_by not in DIMENSIONS:
+        raise ValueError(f"group_by must be one of: {', '.join(DIMENSIONS)}")
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of: {', '.join(INTERVALS)}")
+    if start > end:
+        raise ValueError("'from' must not be after 'to'")
+
+    rolled_through = get_rolled_through()
+    daily = {}
+    if rolled_through and rolled_through >= start:
+        daily.update(_rollup_counts(group_by, start, min(end, rolled_through)))
+    live_start = max(start, rolled_through + timedelta(days=1)) if rolled_through else start
+    if live_start <= end:
+        daily.update(aggregate_borrowings(group_by, live_start, end))
+
+    buckets = defaultdict(lambda: {'checkouts': 0, 'returns': 0})
+    for (day, key), counts in daily.items():
+        bucket = buckets[(_bucket(day, interval), key)]
+        bucket['checkouts'] += counts['checkouts']
+        bucket['returns'] += counts['returns']
+
+    labels = _labels(group_by, {key for _, key in buckets})
+    series = [
+        {
+            'date': bucket_date.isoformat(),
+            'key': key or None,
+            'label': labels.get(key),
+            'checkouts': counts['checkouts'],
+            'returns': counts['returns']
+        }
+        for (bucket_date, key), counts in sorted(buckets.items())
+    ]
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'group_by': group_by,
+        'interval': interval,
+        'rolled_up_through': rolled_through.isoformat() if rolled_through else None,
+        'live_from': live_start.isoformat() if live_start <= end else None,
+        'series': series
+    }
@@ -0,0 +1,121 @@
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import exists, func, literal, or_, select
+from models import db, Borrowing, Fine, BorrowingArchive, FineArchive, Tombstone, RollupWatermark
+import analytics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MONTHS = 12
+
+# Everything returned before this date may have been moved to the archive
+ARCHIVE_HORIZON = 'borrowings_archive'
+
+BORROWING_COLUMNS = ('BorrowID', 'MemberID', 'BookID', 'BorrowDate', 'DueDate', 'ReturnDate',
+                     'StaffID', 'CopyID', 'BranchID')
+FINE_COLUMNS = ('FineID', 'BorrowID', 'Amount', 'Paid')
+
+
+def months_before(day: date, months: int) -> date:
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def get_horizon() -> Optional[date]:
+    horizon = db.session.get(RollupWatermark, ARCHIVE_HORIZON)
+    return horizon.RolledThrough if horizon else None
+
+
+def archive_cutoff(months: int = DEFAULT_MONTHS) -> date:
+    """Loans returned before this date can be archived.
+
+    Circulation analytics aggregate live from Borrowings past the rollup
+    watermark, so nothing newer than the watermark is archived.
+    """
+    rolled_through = analytics.get_rolled_through()
+    if rolled_through is None:
+        raise ValueError("Run the analytics rollup before archiving borrowings")
+    return min(months_before(date.today(), months), rolled_through + timedelta(days=1))
+
+
+def _has_unpaid_fine():
+    return exists().where(Fine.BorrowID == Borrowing.BorrowID, or_(Fine.Paid.is_(None), Fine.Paid.is_(False)))
+
+
+def _copy_rows(target, source, columns, key, ids, archived_at) -> None:
+    source_columns = [getattr(source, column) for column in columns]
+    db.session.execute(target.__table__.insert().from_select(
+        list(columns) + ['ArchivedAt'],
+        select(*source_columns, literal(archived_at)).where(key.in_(ids))
+    ))
+
+
+def _archive_batch(borrow_ids, archived_at: datetime) -> int:
+    """Move one batch of borrowings and their (paid) fines; returns fines moved."""
+    fine_ids = [fine_id for (fine_id,) in db.session.query(Fine.FineID).filter(Fine.BorrowID.in_(borrow_ids))]
+
+    _copy_rows(BorrowingArchive, Borrowing, BORROWING_COLUMNS, Borrowing.BorrowID, borrow_ids, archived_at)
+    if fine_ids:
+        _copy_rows(FineArchive, Fine, FINE_COLUMNS, Fine.FineID, fine_ids, archived_at)
+
+    # Client caches drop archived rows like deleted ones
+    tombstones = [{'EntityType': 'borrowings', 'EntityID': borrow_id, 'DeletedAt': archived_at}
+                  for borrow_id in borrow_ids]
+    tombstones += [{'EntityType': 'fines', 'EntityID': fine_id, 'DeletedAt': archived_at} for fine_id in fine_ids]
+    db.session.execute(Tombstone.__table__.insert(), tombstones)
+
+    if fine_ids:
+        Fine.query.filter(Fine.FineID.in_(fine_ids)).delete(synchronize_session=False)
+    Borrowing.query.filter(Borrowing.BorrowID.in_(borrow_ids)).delete(synchronize_session=False)
+    return len(fine_ids)
+
+
+def archive_returned(months: int = DEFAULT_MONTHS, batch_size: int = 1000, progress=None) -> Dict[str, Any]:
+    """Move borrowings returned more than `months` ago, with their fines, to the archive tables.
+
+    Loans with an unpaid fine stay in the hot table. Each batch is copied,
+    tombstoned and deleted in its own transaction, so the job can stop at
+    any point and simply be run again.
+    """
+    cutoff = archive_cutoff(months)
+    candidates = db.session.query(Borrowing.BorrowID).filter(
+        Borrowing.ReturnDate < cutoff,
+        or_(Borrowing.BorrowDate.is_(None), Borrowing.BorrowDate < cutoff),
+        ~_has_unpaid_fine()
+    )
+    total = candidates.count()
+
+    horizon = db.session.get(RollupWatermark, ARCHIVE_HORIZON)
+    if horizon:
+        horizon.RolledThrough = max(horizon.RolledThrough, cutoff)
+    else:
+        db.session.add(RollupWatermark(Name=ARCHIVE_HORIZON, RolledThrough=cutoff))
+    db.session.commit()
+
+    borrowings_moved = 0
+    fines_moved = 0
+    while True:
+        borrow_ids = [borrow_id for (borrow_id,) in candidates.order_by(Borrowing.BorrowID).limit(batch_size)]
+        if not borrow_ids:
+            break
+        fines_moved += _archive_batch(borrow_ids, datetime.utcnow())
+        db.session.commit()
+        borrowings_moved += len(borrow_ids)
+        if progress:
+            progress(borrowings_moved / total if total else 1.0, f"Archived {borrowings_moved} of {total} borrowings")
+
+    logger.info(f"Archived {borrowings_moved} borrowings and {fines_moved} fines returned before {cutoff}")
+    return {'cutoff': cutoff.isoformat(), 'borrowings': borrowings_moved, 'fines': fines_moved}
+
+
+def get_table_sizes() -> Dict[str, int]:
+    """Row counts of the hot and archive tables."""
+    return {
+        'borrowings': db.session.query(func.count(Borrowing.BorrowID)).scalar(),
+        'fines': db.session.query(func.count(Fine.FineID)).scalar(),
+        'borrowings_archive': db.session.query(func.count(BorrowingArchive.BorrowID)).scalar(),
+        'fines_archive': db.session.query(func.count(FineArchive.FineID)).scalar()
+    }
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+from flask import current_app, make_response, render_template, request, url_for
+
+logger = logging.getLogger(__name__)
+
+# Far-future lifetime for versioned static URLs; the version changes with the content
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+BUNDLE_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# One bundle per page: the shared helpers plus that page's script. Page
+# scripts each declare their own top-level state (currentPage, itemsPerPage)
+# and bind to elements that only exist on their page, so they can't share
+# a single bundle.
+BUNDLES = {
+    'main': ['js/main.js'],
+    'dashboard': ['js/main.js', 'js/dashboard.js'],
+    'books': ['js/main.js', 'js/books.js'],
+    'members': ['js/main.js', 'js/members.js'],
+    'publishers': ['js/main.js', 'js/publishers.js'],
+    'staff': ['js/main.js', 'js/staff.js'],
+    'borrowings': ['js/main.js', 'js/borrowings.js'],
+    'fines': ['js/main.js', 'js/fines.js'],
+    'reservations': ['js/main.js', 'js/reservations.js'],
+    'membershiptypes': ['js/main.js', 'js/membershiptypes.js'],
+}
+
+
+def minify_js(source: str) -> str:
+    """Conservative line-based minification.
+
+    Drops comment-only lines, indentation and blank lines but keeps line
+    breaks, so automatic semicolon insertion behaves exactly as before.
+    Lines inside template literals are left untouched.
+    """
+    lines = []
+    in_template = False
+    in_block_comment = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_block_comment:
+                in_block_comment = '*/' not in stripped
+                continue
+            if stripped.startswith('/*'):
+                in_block_comment = '*/' not in stripped
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def build_bundles(static_folder: str) -> Dict[str, str]:
+    """Write minified per-page bundles to static/dist and return the manifest."""
+    output_dir = os.path.join(static_folder, BUNDLE_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                parts.append(f'// {source}\n' + minify_js(f.read()))
+        filename = f'{BUNDLE_DIR}/{name}.min.js'
+        with open(os.path.join(static_folder, filename), 'w', encoding='utf-8') as f:
+            f.write(';\n'.join(parts))
+        manifest[name] = filename
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Built {len(manifest)} JS bundles in {output_dir}")
+    return manifest
+
+
+class Assets:
+    """Content-hashed static URLs, immutable caching and cached page shells.
+
+    url_for('static', ...) gets a `v=<hash>` query argument derived from the
+    file's contents, and responses for versioned URLs are marked cacheable
+    for a year. Templates call js_bundle(name) to get either the built
+    bundle (after `flask assets-build`) or the individual source files.
+    """
+
+    def __init__(self, app=None):
+        self._hashes = {}
+        self._manifest = None
+        self._manifest_mtime = None
+        self._pages = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self._hashes = {}
+        self._pages = {}
+        app.extensions['assets'] = self
+        app.url_defaults(self._add_version)
+        app.after_request(self._cache_headers)
+        app.context_processor(lambda: {'js_bundle': self.js_bundle})
+
+    def file_hash(self, filename: str) -> Optional[str]:
+        path = os.path.join(current_app.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        self._hashes[filename] = (mtime, digest)
+        return digest
+
+    def _add_version(self, endpoint, values) -> None:
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = self.file_hash(values['filename'])
+            if digest:
+                values['v'] = digest
+
+    def _cache_headers(self, response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    def manifest(self) -> Dict[str, str]:
+        path = os.path.join(current_app.static_folder, BUNDLE_DIR, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._manifest_mtime = None
+            return {}
+        if mtime != self._manifest_mtime:
+            with open(path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def js_bundle(self, name: str) -> List[str]:
+        """URLs of the scripts for a bundle, preferring the built file."""
+        built = self.manifest().get(name)
+        if built and not current_app.debug:
+            return [url_for('static', filename=built)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def render_page(self, template: str):
+        """Render a context-free page shell once per process and serve it conditionally.
+
+        The shell is revalidated on every load (no-cache) but answered with a
+        304 when the ETag matches, so repeat visits cost no rendering. Shells
+        are re-rendered once `flask assets-build` rewrites the manifest, since
+        they embed the bundle URLs.
+        """
+        self.manifest()
+        build = self._manifest_mtime
+        page = self._pages.get(template)
+        if page is None or page[0] != build or current_app.debug:
+            html = render_template(template)
+            page = self._pages[template] = (build, html, hashlib.sha256(html.encode('utf-8')).hexdigest()[:16])
+
+        _, html, etag = page
+        response = make_response(html)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+assets = Assets()
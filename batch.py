@@ -0,0 +1,96 @@
+import logging
+from typing import Dict, Any, List
+from flask import current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_REQUESTS = 20
+
+METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Endpoints that make no sense inside a batch: the batch itself and streams
+UNBATCHABLE = {'library.api_batch', 'library.api_event_stream'}
+
+# Outer request headers that don't describe the sub-requests
+DROPPED_HEADERS = {'Content-Length', 'Content-Type'}
+
+
+def _error(status: int, message: str) -> Dict[str, Any]:
+    return {'status': status, 'body': {'error': message}}
+
+
+def _validate(item) -> str:
+    if not isinstance(item, dict):
+        return "Each request must be an object"
+    if str(item.get('method', 'GET')).upper() not in METHODS:
+        return f"Method must be one of {', '.join(METHODS)}"
+    path = item.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return "Path must start with /api/"
+    if not isinstance(item.get('headers', {}), dict):
+        return "Headers must be an object"
+    return ''
+
+
+def _dispatch(item: Dict[str, Any], headers: Dict[str, str], pinned_to_primary: bool) -> Dict[str, Any]:
+    app = current_app._get_current_object()
+    method = str(item.get('method', 'GET')).upper()
+    body = item.get('body')
+
+    # g lives on the app context, which every sub-request shares; give each
+    # one a clean g so per-request state (branch, replica, rate limit slot)
+    # doesn't leak between them
+    saved = dict(vars(g))
+    vars(g).clear()
+    g.pinned_to_primary = pinned_to_primary
+    try:
+        with app.test_request_context(
+            item['path'], method=method, headers={**headers, **item.get('headers', {})},
+            json=body if method in ('POST', 'PUT') else None,
+            environ_base={'REMOTE_ADDR': request.remote_addr}
+        ) as ctx:
+            if ctx.request.endpoint in UNBATCHABLE:
+                return _error(400, f"{item['path']} cannot be batched")
+            response = app.full_dispatch_request()
+    finally:
+        vars(g).clear()
+        vars(g).update(saved)
+
+    payload = response.get_json(silent=True)
+    if payload is None and response.status_code >= 400:
+        payload = {'error': response.status}
+    return {'status': response.status_code, 'body': payload}
+
+
+def run(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Execute sub-requests in order and collect their statuses and JSON bodies.
+
+    Every sub-request goes through the normal request pipeline (rate limits,
+    replica routing, branch scoping) but shares this request's app context,
+    and with it one database session and connection. A failing sub-request
+    doesn't stop the ones after it; each write still commits on its own.
+    Once a sub-request writes, the ones after it read from the primary so
+    they see that write.
+    """
+    if not isinstance(items, list):
+        raise ValueError("requests must be a list")
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise ValueError(f"At most {MAX_BATCH_REQUESTS} requests per batch")
+
+    headers = {key: value for key, value in request.headers.items() if key not in DROPPED_HEADERS}
+    results = []
+    wrote = False
+    for item in items:
+        problem = _validate(item)
+        if problem:
+            results.append(_error(400, problem))
+            continue
+        try:
+            results.append(_dispatch(item, headers, pinned_to_primary=wrote))
+        except Exception as e:
+            logger.error(f"Error in batched request {item['path']}: {str(e)}")
+            results.append(_error(500, str(e)))
+        wrote = wrote or str(item.get('method', 'GET')).upper() in WRITE_METHODS
+    return results
@@ -0,0 +1,75 @@
+"""Measure hot-table size and list latency before and after archiving returned borrowings.
+
+Seeds a throwaway SQLite database, times GET /api/borrowings and
+GET /api/fines, rolls up analytics, archives loans returned more than
+--months ago and times the same requests again.
+
+    python benchmarks/archive.py --borrowings 50000 --months 6
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PATHS = ['/api/borrowings', '/api/fines']
+
+
+def time_requests(client, runs: int) -> dict:
+    timings = {}
+    for path in PATHS:
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        timings[path] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--borrowings', type=int, default=20000)
+    parser.add_argument('--fines', type=int, default=2000)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'archive.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from main import create_app
+    from seed import seed
+    import analytics
+    import archive
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        seed(books=args.books, borrowings=args.borrowings, fines=args.fines)
+        before_sizes = archive.get_table_sizes()
+    before = time_requests(client, args.runs)
+
+    with app.app_context():
+        analytics.roll_up()
+        result = archive.archive_returned(args.months)
+        after_sizes = archive.get_table_sizes()
+    after = time_requests(client, args.runs)
+
+    print(f"Archived {result['borrowings']} borrowings and {result['fines']} fines returned before {result['cutoff']}")
+    print(f"{'table':<20}{'before':>10}{'after':>10}")
+    for table in before_sizes:
+        print(f"{table:<20}{before_sizes[table]:>10}{after_sizes[table]:>10}")
+    print(f"{'median ms':<20}{'before':>10}{'after':>10}")
+    for path in PATHS:
+        print(f"{path:<20}{before[path]:>10.1f}{after[path]:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
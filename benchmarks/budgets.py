@@ -0,0 +1,339 @@
+"""Check every route against its SQL statement, row and latency budget.
+
+Seeds a throwaway SQLite database, runs one request per route through the
+test client (reads --runs times, writes once, in an order that creates,
+updates and deletes its own rows) and records per route the SQL statements
+executed, rows fetched and wall time. Exits non-zero when a route exceeds
+its entry in budgets.json or has no case here at all, so a new lazy load in
+to_dict() or an extra lookup in a handler shows up as a failure.
+
+    python benchmarks/budgets.py
+    python benchmarks/budgets.py --update     # after an intended change
+
+Statement and row budgets are exact: the seed is fixed. Latency budgets
+carry headroom and can be scaled with --time-scale on slow machines.
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.json')
+
+# Endpoints that can't be measured as a single request/response
+SKIPPED_ENDPOINTS = {'static', 'library.api_event_stream'}
+
+# Latency budget written by --update: measured time times this, at least MIN_MS
+TIME_HEADROOM = 4
+MIN_MS = 100
+
+# Sent in X-Profile to record a profile and to read /api/profiles
+PROFILE_SECRET = 'budgets'
+
+TODAY = date.today().isoformat()
+DUE = (date.today() + timedelta(days=14)).isoformat()
+
+# (method, path, body). Paths and bodies may refer to rows created by earlier
+# cases as {name}, filled from the "id" of the response to ('POST', name) below.
+READS = [
+    ('GET', '/', None),
+    ('GET', '/dashboard', None),
+    ('GET', '/books', None),
+    ('GET', '/members', None),
+    ('GET', '/publishers', None),
+    ('GET', '/staff', None),
+    ('GET', '/borrowings', None),
+    ('GET', '/fines', None),
+    ('GET', '/reservations', None),
+    ('GET', '/membershiptypes', None),
+    ('GET', '/api/dashboard/stats', None),
+    ('GET', '/api/books/changes', None),
+    ('GET', '/api/publishers', None),
+    ('GET', '/api/branches', None),
+    ('GET', '/api/books', None),
+    ('GET', '/api/books/1', None),
+    ('GET', '/api/books/by-isbn/978-0-00000000-2', None),
+    ('GET', '/api/books/1/copies', None),
+    ('GET', '/api/books/1/similar', None),
+    ('GET', '/api/books/duplicates', None),
+    ('GET', '/api/members', None),
+    ('GET', '/api/members/1', None),
+    ('GET', '/api/members/1/recommendations', None),
+    ('GET', '/api/members/1/limits', None),
+    ('GET', '/api/members/1/balance', None),
+    ('GET', '/api/membershiptypes', None),
+    ('GET', '/api/membershiptypes/1', None),
+    ('GET', '/api/staff', None),
+    ('GET', '/api/staff/1', None),
+    ('GET', '/api/borrowings', None),
+    ('GET', '/api/borrowings/1', None),
+    ('GET', '/api/borrowings/overdue', None),
+    ('GET', '/api/fines', None),
+    ('GET', '/api/fines/1', None),
+    ('GET', '/api/fines/balances', None),
+    ('GET', '/api/reservations', None),
+    ('GET', '/api/circulation/events', None),
+    ('GET', '/api/circulation/projections', None),
+    ('GET', '/api/circulation/consistency', None),
+    ('GET', '/api/analytics/circulation', None),
+    ('GET', '/api/archive', None),
+    ('GET', '/api/replicas', None),
+    ('GET', '/api/jobs', None),
+    ('GET', '/api/query?query=' + quote('{ member(id: 1) { Name borrowings { DueDate book { Title } } fines { Amount } } }'),
+     None),
+]
+
+WRITES = [
+    ('POST', '/api/branches', {'Name': 'Budget Branch', 'Code': 'BUDGET'}),
+    ('PUT', '/api/branches/{branches}', {'Name': 'Budget Branch', 'Code': 'BUDGET', 'Address': '1 Main St'}),
+    ('POST', '/api/publishers', {'Name': 'Budget Publisher'}),
+    ('PUT', '/api/publishers/{publishers}', {'Name': 'Budget Publisher', 'Email': 'budget@example.com'}),
+    ('POST', '/api/books', {'Title': 'Budget Book', 'Author': 'Budget Author', 'ISBN': '9799999999990',
+                            'PublisherID': '{publishers}', 'Quantity': 3}),
+    ('PUT', '/api/books/{books}', {'Title': 'Budget Book', 'Author': 'Budget Author', 'ISBN': '9799999999990',
+                                   'PublisherID': '{publishers}', 'Quantity': 4}),
+    ('PUT', '/api/copies/1', {'Location': 'Shelf B'}),
+    ('POST', '/api/membershiptypes', {'TypeName': 'Budget', 'DurationMonths': 6, 'Fee': 5}),
+    ('PUT', '/api/membershiptypes/{membershiptypes}', {'TypeName': 'Budget', 'DurationMonths': 12, 'Fee': 8}),
+    ('POST', '/api/members', {'Name': 'Budget Member', 'Email': 'budget.member@example.com', 'Phone': '5550000001',
+                              'MembershipTypeID': '{membershiptypes}', 'MembershipDate': TODAY}),
+    ('PUT', '/api/members/{members}', {'Name': 'Budget Member', 'Email': 'budget.member@example.com',
+                                       'Phone': '5550000001', 'MembershipTypeID': '{membershiptypes}',
+                                       'MembershipDate': TODAY}),
+    ('POST', '/api/staff', {'Name': 'Budget Staff', 'Email': 'budget.staff@example.com', 'Phone': '5550000002',
+                            'Role': 'Librarian', 'HireDate': TODAY}),
+    ('PUT', '/api/staff/{staff}', {'Name': 'Budget Staff', 'Email': 'budget.staff@example.com',
+                                   'Phone': '5550000002', 'Role': 'Manager', 'HireDate': TODAY}),
+    ('POST', '/api/borrowings', {'MemberID': '{members}', 'BookID': '{books}', 'StaffID': '{staff}',
+                                 'BorrowDate': TODAY, 'DueDate': DUE}),
+    ('PUT', '/api/borrowings/{borrowings}', {'MemberID': '{members}', 'BookID': '{books}', 'StaffID': '{staff}',
+                                             'BorrowDate': TODAY, 'DueDate': DUE, 'ReturnDate': TODAY}),
+    ('POST', '/api/fines', {'BorrowID': '{borrowings}', 'Amount': 2.5}),
+    ('PUT', '/api/fines/{fines}', {'BorrowID': '{borrowings}', 'Amount': 2.5, 'Paid': True}),
+    ('POST', '/api/reservations', {'MemberID': '{members}', 'BookID': '{books}', 'ReservationDate': TODAY}),
+    ('PUT', '/api/reservations/{reservations}', {'MemberID': '{members}', 'BookID': '{books}',
+                                                 'ReservationDate': TODAY, 'Status': 'Fulfilled'}),
+    ('GET', '/api/reservations/{reservations}', None),
+    ('POST', '/api/jobs', {'JobType': 'prune_tombstones', 'Params': {}}),
+    ('GET', '/api/jobs/{jobs}', None),
+    ('POST', '/api/jobs/{jobs}/cancel', None),
+    ('POST', '/api/batch', {'requests': [{'method': 'GET', 'path': '/api/members/changes'},
+                                         {'method': 'GET', 'path': '/api/books/changes'},
+                                         {'method': 'GET', 'path': '/api/staff/changes'}]}),
+    ('POST', '/api/query', {'query': '{ members(first: 20) { Name reservations { book { Title } } } }'}),
+    ('GET', '/api/profiles', None),
+    ('GET', '/api/profiles/{profiles}', None),
+    ('GET', '/api/profiles/{profiles}/sql', None),
+    ('DELETE', '/api/reservations/{reservations}', None),
+    ('DELETE', '/api/fines/{fines}', None),
+    ('DELETE', '/api/borrowings/{borrowings}', None),
+    ('DELETE', '/api/staff/{staff}', None),
+    ('DELETE', '/api/members/{members}', None),
+    ('DELETE', '/api/membershiptypes/{membershiptypes}', None),
+    ('DELETE', '/api/books/{books}', None),
+    ('DELETE', '/api/publishers/{publishers}', None),
+    ('DELETE', '/api/branches/{branches}', None),
+]
+
+
+class Meter:
+    """Counts SQL statements and fetched rows issued from the measuring thread.
+
+    Background jobs started by a request run on other threads and are not
+    charged to it.
+    """
+
+    def __init__(self):
+        self.thread = threading.get_ident()
+        self.statements = 0
+        self.rows = 0
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.rows = 0
+
+    def on_execute(self, *args) -> None:
+        if threading.get_ident() == self.thread:
+            self.statements += 1
+
+    def on_fetch(self, count: int) -> None:
+        if threading.get_ident() == self.thread:
+            self.rows += count
+
+
+meter = Meter()
+
+
+class CountingCursor(sqlite3.Cursor):
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            meter.on_fetch(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        meter.on_fetch(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        meter.on_fetch(len(rows))
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+def fill(value, ids: dict):
+    """Substitute {name} placeholders with the IDs of rows created so far."""
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}') and value[1:-1] in ids:
+        return ids[value[1:-1]]
+    if isinstance(value, str) and '/{' in value:
+        return value.format(**ids)
+    return value
+
+
+def measure(client, method: str, path: str, body, runs: int, headers=None) -> dict:
+    timings = []
+    for _ in range(runs):
+        meter.reset()
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.get_data(as_text=True)}")
+    return {'statements': meter.statements, 'rows': meter.rows, 'ms': statistics.median(timings),
+            'response': response}
+
+
+def endpoint_of(app, method: str, path: str) -> str:
+    adapter = app.url_map.bind('localhost')
+    return adapter.match(path.split('?')[0], method=method)[0]
+
+
+def run_cases(app, runs: int) -> dict:
+    client = app.test_client()
+    results = {}
+    # A profiled request for the /api/profiles cases to look at
+    ids = {'profiles': client.get('/api/publishers', headers={'X-Profile': PROFILE_SECRET}).headers['X-Profile-ID']}
+    for method, template, body in READS + WRITES:
+        path = fill(template, ids)
+        # Profiles are only served to requests carrying the secret
+        headers = {'X-Profile': PROFILE_SECRET} if template.startswith('/api/profiles') else None
+        result = measure(client, method, path, fill(body, ids), runs if method == 'GET' else 1, headers)
+        created = result['response'].get_json(silent=True) or {}
+        if method == 'POST' and 'id' in created:
+            ids[template.rsplit('/', 1)[1]] = created['id']
+        name = f"{method} {template.split('?')[0]}"
+        result['endpoint'] = endpoint_of(app, method, path)
+        del result['response']
+        results[name] = result
+    return results
+
+
+def uncovered(app, results: dict) -> list:
+    covered = {(name.split(' ', 1)[0], result['endpoint']) for name, result in results.items()}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, rule.endpoint) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+def check(results: dict, budgets: dict, time_scale: float, check_time: bool) -> list:
+    failures = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            failures.append(f"{name}: no budget; run with --update")
+            continue
+        for metric in ('statements', 'rows'):
+            if result[metric] > budget[metric]:
+                failures.append(f"{name}: {result[metric]} {metric}, budget {budget[metric]}")
+        if check_time and result['ms'] > budget['ms'] * time_scale:
+            failures.append(f"{name}: {result['ms']:.1f} ms, budget {budget['ms'] * time_scale:.0f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per read (the median counts)')
+    parser.add_argument('--update', action='store_true', help=f'Rewrite {os.path.basename(BUDGET_FILE)}')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Multiply latency budgets by this')
+    parser.add_argument('--no-time', action='store_true', help='Only check statements and rows')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'budgets.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from sqlalchemy import event
+    from main import create_app
+    from models import db
+    from seed import seed
+    import analytics
+
+    app = create_app({
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'factory': CountingConnection}},
+        'PROFILING_ENABLED': True,
+        'PROFILE_SECRET': PROFILE_SECRET,
+        'PROFILE_DIR': os.path.join(os.path.dirname(db_path), 'profiles'),
+    })
+    with app.app_context():
+        seed(books=500, members=300, borrowings=3000, fines=300)
+        analytics.roll_up()
+        event.listen(db.engine, 'before_cursor_execute', meter.on_execute)
+
+    results = run_cases(app, args.runs)
+    failures = [f"{route}: no case in benchmarks/budgets.py" for route in uncovered(app, results)]
+
+    print(f"{'route':<52}{'statements':>11}{'rows':>8}{'ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<52}{result['statements']:>11}{result['rows']:>8}{result['ms']:>9.1f}")
+
+    if args.update:
+        budgets = {
+            name: {'statements': result['statements'], 'rows': result['rows'],
+                   'ms': max(MIN_MS, math.ceil(result['ms'] * TIME_HEADROOM))}
+            for name, result in results.items()
+        }
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump(budgets, f, indent=2)
+            f.write('\n')
+        print(f"Wrote {len(budgets)} budgets to {BUDGET_FILE}")
+    else:
+        with open(BUDGET_FILE) as f:
+            budgets = json.load(f)
+        failures += check(results, budgets, args.time_scale, not args.no_time)
+
+    if failures:
+        print(f"\n{len(failures)} budget failures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll routes within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Check that replaying the circulation log reproduces the tables.
+
+Seeds a throwaway SQLite database, backfills the log, then checks loans
+out, edits, moves, returns and deletes them through the API. Afterwards
+the availability, per-book and per-member projections rebuilt from the
+log must match Books.Quantity and the Borrowings rows. Exits non-zero on
+any mismatch.
+
+    python benchmarks/circulation_replay.py
+"""
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+TODAY = date.today()
+
+
+def loan(member_id: int, book_id: int, **changes) -> dict:
+    body = {'MemberID': member_id, 'BookID': book_id, 'StaffID': 1,
+            'BorrowDate': TODAY.isoformat(), 'DueDate': (TODAY + timedelta(days=14)).isoformat()}
+    body.update(changes)
+    return body
+
+
+# (name, [(method, path, body)]); '{id}' is the loan created by the scenario's POST
+SCENARIOS = [
+    ('move an open loan to another member, then delete it', [
+        ('POST', '/api/borrowings', loan(1, 1)),
+        ('PUT', '/api/borrowings/{id}', loan(2, 1)),
+        ('DELETE', '/api/borrowings/{id}', None),
+    ]),
+    ('move an open loan to another member, then return it', [
+        ('POST', '/api/borrowings', loan(3, 2)),
+        ('PUT', '/api/borrowings/{id}', loan(4, 2)),
+        ('PUT', '/api/borrowings/{id}', loan(4, 2, ReturnDate=TODAY.isoformat())),
+    ]),
+    ('return a loan and move it to another member and book at once', [
+        ('POST', '/api/borrowings', loan(5, 3)),
+        ('PUT', '/api/borrowings/{id}', loan(6, 4, ReturnDate=TODAY.isoformat())),
+        ('DELETE', '/api/borrowings/{id}', None),
+    ]),
+    ('move an open loan to another book, then return it', [
+        ('POST', '/api/borrowings', loan(9, 7)),
+        ('PUT', '/api/borrowings/{id}', loan(9, 8)),
+        ('PUT', '/api/borrowings/{id}', loan(9, 8, ReturnDate=TODAY.isoformat())),
+    ]),
+    ('move an open loan to another book and leave it open', [
+        ('POST', '/api/borrowings', loan(12, 11)),
+        ('PUT', '/api/borrowings/{id}', loan(12, 12)),
+    ]),
+    ('move an open loan to another book and member, then delete it', [
+        ('POST', '/api/borrowings', loan(10, 9)),
+        ('PUT', '/api/borrowings/{id}', loan(11, 10)),
+        ('DELETE', '/api/borrowings/{id}', None),
+    ]),
+    ('move a returned loan to another book, then reopen it', [
+        ('POST', '/api/borrowings', loan(7, 5)),
+        ('PUT', '/api/borrowings/{id}', loan(7, 5, ReturnDate=TODAY.isoformat())),
+        ('PUT', '/api/borrowings/{id}', loan(8, 6, ReturnDate=TODAY.isoformat())),
+        ('PUT', '/api/borrowings/{id}', loan(8, 6)),
+    ]),
+]
+
+
+def run_scenarios(client) -> list:
+    failures = []
+    for name, steps in SCENARIOS:
+        ids = {}
+        for method, path, body in steps:
+            response = client.open(path.format(**ids), method=method, json=body)
+            if response.status_code >= 400:
+                failures.append(f"{name}: {method} {path} returned {response.status_code}: "
+                                f"{response.get_data(as_text=True)}")
+                break
+            if method == 'POST':
+                ids['id'] = response.get_json()['id']
+    return failures
+
+
+def expected_stats(key: str) -> dict:
+    from models import Borrowing
+    stats = defaultdict(lambda: {'checkouts': 0, 'returns': 0, 'open_loans': 0})
+    for borrowing in Borrowing.query:
+        owner = getattr(borrowing, key)
+        if owner is None:
+            continue
+        stats[owner]['checkouts'] += 1
+        stats[owner]['returns' if borrowing.ReturnDate else 'open_loans'] += 1
+    return stats
+
+
+def compare(name: str, replayed: dict, expected: dict) -> list:
+    zero = {'checkouts': 0, 'returns': 0, 'open_loans': 0}
+    return [f"{name} {key}: log says {replayed.get(key, zero)}, table says {expected.get(key, zero)}"
+            for key in sorted(set(replayed) | set(expected))
+            if replayed.get(key, zero) != expected.get(key, zero)]
+
+
+def main():
+    db_path = os.path.join(tempfile.mkdtemp(), 'replay.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from main import create_app
+    from seed import seed
+    import circulation
+
+    app = create_app()
+    with app.app_context():
+        seed(books=50, members=50, borrowings=200, fines=20)
+        circulation.backfill_from_borrowings()
+
+    failures = run_scenarios(app.test_client())
+
+    with app.app_context():
+        projections = circulation.build_projections()
+        drift = circulation.check_quantity_drift()
+        failures += [f"book {row['BookID']}: Quantity {row['Quantity']}, log says {row['ExpectedQuantity']}"
+                     for row in drift['drifted']]
+        failures += compare('book', projections['book_stats'], expected_stats('BookID'))
+        failures += compare('member', projections['member_stats'], expected_stats('MemberID'))
+
+    print(f"{len(SCENARIOS)} scenarios replayed over {drift['books_checked']} books")
+    if failures:
+        print(f"\n{len(failures)} mismatches:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Log replay matches the tables")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Measure desk-scanner ISBN lookups per second.
+
+Seeds a throwaway SQLite database and compares scanning with
+GET /api/books/by-isbn/<isbn> (one indexed query per scan), and with
+isbn.lookup() alone, against the old way of downloading /api/books and
+searching it client-side. Scans mix
+ISBN-13s, hyphenated ISBN-13s and ISBN-10s, as scanners and people send.
+
+    python benchmarks/isbn_lookup.py --books 20000 --scans 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def spellings(isbn13: str) -> list:
+    from isbn import isbn10_check_digit
+    hyphenated = f'{isbn13[:3]}-{isbn13[3]}-{isbn13[4:8]}-{isbn13[8:12]}-{isbn13[12]}'
+    isbn10 = isbn13[3:12] + isbn10_check_digit(isbn13[3:12])
+    return [isbn13, hyphenated, isbn10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--scans', type=int, default=5000)
+    parser.add_argument('--list-scans', type=int, default=5, help='Scans timed with the download-everything way')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'isbn.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from sqlalchemy import event
+    from main import create_app
+    from models import db
+    from seed import seed, make_isbn
+    from isbn import normalize, lookup
+
+    app = create_app()
+    client = app.test_client()
+    statements = [0]
+    with app.app_context():
+        seed(books=args.books, members=100, borrowings=1000, fines=100)
+        event.listen(db.engine, 'before_cursor_execute', lambda *_: statements.__setitem__(0, statements[0] + 1))
+
+    rng = random.Random(7)
+    scans = [rng.choice(spellings(make_isbn(rng.randrange(args.books)))) for _ in range(args.scans)]
+
+    statements[0] = 0
+    started = time.perf_counter()
+    for scan in scans:
+        response = client.get(f'/api/books/by-isbn/{scan}')
+        assert response.status_code == 200, response.get_data(as_text=True)
+    indexed = time.perf_counter() - started
+    indexed_statements = statements[0] / len(scans)
+
+    with app.app_context():
+        started = time.perf_counter()
+        for scan in scans:
+            assert lookup(normalize(scan)) is not None
+        direct = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for scan in scans[:args.list_scans]:
+        wanted = normalize(scan)
+        books = client.get('/api/books').get_json()
+        assert any(book['ISBN'] == wanted for book in books)
+    listed = time.perf_counter() - started
+
+    print(f"{args.books} books, {len(scans)} scans")
+    print(f"by-isbn:   {len(scans) / indexed:10.0f} scans/s  {indexed / len(scans) * 1000:8.2f} ms/scan"
+          f"  {indexed_statements:.1f} statements/scan")
+    print(f"lookup():  {len(scans) / direct:10.0f} scans/s  {direct / len(scans) * 1000:8.2f} ms/scan"
+          f"  (without the HTTP stack)")
+    print(f"/api/books:{args.list_scans / listed:10.1f} scans/s  {listed / args.list_scans * 1000:8.2f} ms/scan")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Compare gunicorn worker models on the /api/books and /api/borrowings hot paths.
+
+Starts gunicorn once per profile with gunicorn.conf.py, drives it with a
+pool of client threads for a fixed duration and reports throughput and
+latency percentiles. Needs gunicorn installed (and gevent for that profile).
+
+    DATABASE_URL=sqlite:////tmp/library.db python benchmarks/seed.py
+    DATABASE_URL=sqlite:////tmp/library.db python benchmarks/loadtest.py --profiles sync gthread
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/api/books', '/api/borrowings']
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not come up at {url}")
+
+
+def drive(base_url: str, paths, concurrency: int, duration: float) -> dict:
+    """Hit the paths round-robin from `concurrency` threads for `duration` seconds."""
+    latencies = {path: [] for path in paths}
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=30) as response:
+                    response.read()
+                latencies[path].append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = {}
+    for path, samples in latencies.items():
+        samples.sort()
+        results[path] = {
+            'requests': len(samples),
+            'rps': len(samples) / duration,
+            'p50_ms': statistics.median(samples) * 1000 if samples else None,
+            'p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000 if samples else None,
+            'p99_ms': samples[int(len(samples) * 0.99) - 1] * 1000 if samples else None,
+        }
+    results['errors'] = len(errors)
+    return results
+
+
+def run_profile(profile: str, args) -> dict:
+    env = dict(os.environ, RATE_LIMIT_ENABLED='0', GUNICORN_PROFILE=profile, GUNICORN_BIND=f'127.0.0.1:{args.port}',
+               GUNICORN_WORKERS=str(args.workers), GUNICORN_ACCESS_LOG='', LOG_LEVEL='warning')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base_url + args.paths[0])
+        drive(base_url, args.paths, args.concurrency, min(2.0, args.duration))  # warm up
+        return drive(base_url, args.paths, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'path':<18} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for profile in args.profiles:
+        try:
+            results = run_profile(profile, args)
+        except Exception as e:
+            print(f"{profile:<8} failed: {e}")
+            continue
+        for path in args.paths:
+            r = results[path]
+            if not r['requests']:
+                print(f"{profile:<8} {path:<18} no successful requests")
+                continue
+            print(f"{profile:<8} {path:<18} {r['rps']:9.1f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f}")
+        if results['errors']:
+            print(f"{profile:<8} {results['errors']} failed requests")
+
+
+if __name__ == '__main__':
+    main()
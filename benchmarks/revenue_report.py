@@ -0,0 +1,68 @@
+"""Time the monthly revenue report on one process versus a process pool.
+
+Seeds a throwaway SQLite database, builds the same report with
+--workers 1 (every partition aggregated in this process) and with each
+count in --pool, checks that every run produces identical figures and
+prints the speedup over the single process.
+
+    python benchmarks/revenue_report.py --members 200000 --fines 200000 --pool 2,4,8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--borrowings', type=int, default=200000)
+    parser.add_argument('--fines', type=int, default=100000)
+    parser.add_argument('--from', dest='first', default='2024-01', help='First month (YYYY-MM).')
+    parser.add_argument('--to', dest='last', default=date.today().strftime('%Y-%m'),
+                        help='Last month (YYYY-MM), defaults to this month.')
+    parser.add_argument('--pool', default='2,4', help='Comma-separated worker counts to compare.')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'revenue.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from main import create_app
+    from seed import seed
+    import reports
+
+    start = date.fromisoformat(f'{args.first}-01')
+    end = date.fromisoformat(f'{args.last}-01')
+
+    app = create_app()
+    with app.app_context():
+        seed(books=1000, members=args.members, borrowings=args.borrowings, fines=args.fines)
+
+        def best(workers):
+            report, timings = None, []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                report = reports.build_revenue_report(start, end, workers=workers)
+                timings.append(time.perf_counter() - started)
+            return report, min(timings)
+
+        print(f"{args.members} members, {args.fines} fines, {args.first} to {args.last} "
+              f"({os.cpu_count()} CPUs, best of {args.runs})")
+        baseline, single = best(1)
+        print(f"workers  1: {single:7.2f} s")
+        for workers in (int(count) for count in args.pool.split(',')):
+            report, elapsed = best(workers)
+            assert report == baseline, f"{workers} workers disagree with one"
+            print(f"workers {workers:2d}: {elapsed:7.2f} s  {single / elapsed:5.2f}x")
+        print(f"Revenue {baseline['totals']['Revenue']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Fill a database with synthetic library data for benchmarks.
+
+    DATABASE_URL=sqlite:////tmp/library.db python benchmarks/seed.py --books 5000 --borrowings 50000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GENRES = ['Fiction', 'Science', 'History', 'Fantasy', 'Biography', 'Poetry', 'Mystery', None]
+
+
+def make_isbn(i: int) -> str:
+    from isbn import isbn13_check_digit
+    first12 = f'978{i:09d}'
+    return first12 + isbn13_check_digit(first12)
+
+
+def seed(books: int = 1000, members: int = 500, staff: int = 10, borrowings: int = 5000,
+         publishers: int = 20, fines: int = 500, random_seed: int = 42) -> dict:
+    """Insert synthetic rows with bulk inserts; must run inside an app context."""
+    from models import db, Publisher, Book, Member, MembershipType, Staff, Borrowing, Fine
+    import copies
+
+    rng = random.Random(random_seed)
+    db.create_all()
+
+    db.session.execute(MembershipType.__table__.insert(), [
+        {'TypeName': name, 'DurationMonths': months, 'Fee': fee}
+        for name, months, fee in [('Standard', 12, 25.0), ('Student', 12, 10.0), ('Premium', 12, 60.0)]
+    ])
+    db.session.execute(Publisher.__table__.insert(), [
+        {'Name': f'Publisher {i}', 'Email': f'publisher{i}@example.com', 'Phone': f'555{i:07d}'}
+        for i in range(publishers)
+    ])
+    db.session.execute(Book.__table__.insert(), [
+        {
+            'Title': f'Book {i}', 'Author': f'Author {i % 300}', 'ISBN': make_isbn(i), 'ISBN13': make_isbn(i),
+            'Genre': rng.choice(GENRES), 'PublishedYear': rng.randint(1950, 2025),
+            'PublisherID': rng.randint(1, publishers), 'Quantity': rng.randint(1, 10)
+        }
+        for i in range(books)
+    ])
+    db.session.execute(Member.__table__.insert(), [
+        {
+            'Name': f'Member {i}', 'Email': f'member{i}@example.com', 'Phone': f'777{i:07d}',
+            'MembershipTypeID': rng.randint(1, 3), 'MembershipDate': date(2024, 1, 1) + timedelta(days=i % 365)
+        }
+        for i in range(members)
+    ])
+    db.session.execute(Staff.__table__.insert(), [
+        {'Name': f'Staff {i}', 'Email': f'staff{i}@example.com', 'Phone': f'888{i:07d}', 'Role': 'Librarian'}
+        for i in range(staff)
+    ])
+
+    today = date.today()
+    rows = []
+    for _ in range(borrowings):
+        borrow_date = today - timedelta(days=rng.randint(0, 720))
+        due_date = borrow_date + timedelta(days=14)
+        returned = rng.random() < 0.85 and due_date < today + timedelta(days=14)
+        rows.append({
+            'MemberID': rng.randint(1, members), 'BookID': rng.randint(1, books),
+            'BorrowDate': borrow_date, 'DueDate': due_date,
+            'ReturnDate': borrow_date + timedelta(days=rng.randint(1, 30)) if returned else None,
+            'StaffID': rng.randint(1, staff)
+        })
+    if rows:
+        db.session.execute(Borrowing.__table__.insert(), rows)
+
+    # Fines on a sample of borrowings (IDs are sequential in a fresh database); most are paid
+    if borrowings and fines:
+        db.session.execute(Fine.__table__.insert(), [
+            {'BorrowID': borrow_id, 'Amount': round(rng.uniform(0.5, 20.0), 2), 'Paid': rng.random() < 0.8}
+            for borrow_id in rng.sample(range(1, borrowings + 1), min(fines, borrowings))
+        ])
+
+    db.session.commit()
+
+    # Stock is seeded as a count and expanded into copies the same way existing databases are
+    copies.migrate_quantities()
+    return {'books': books, 'members': members, 'staff': staff, 'borrowings': borrowings,
+            'fines': min(fines, borrowings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--staff', type=int, default=10)
+    parser.add_argument('--borrowings', type=int, default=5000)
+    parser.add_argument('--fines', type=int, default=500)
+    args = parser.parse_args()
+
+    from main import create_app
+    with create_app().app_context():
+        print(seed(books=args.books, members=args.members, staff=args.staff, borrowings=args.borrowings,
+                   fines=args.fines))
+
+
+if __name__ == '__main__':
+    main()
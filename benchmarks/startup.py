@@ -0,0 +1,74 @@
+"""Measure worker start-up cost: importing main, building the app and serving the first request.
+
+Each sample runs in a fresh interpreter so module caches don't hide import
+cost. Also reports how many database connections were opened before the
+first request, which should be zero.
+
+    DATABASE_URL=sqlite:////tmp/library.db python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = r'''
+import json, time
+started = time.perf_counter()
+
+# On the Engine class, before main is imported, so connections opened by
+# any engine while importing or in create_app() are counted too
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+connects = []
+event.listen(Engine, 'connect', lambda *args: connects.append(time.perf_counter()))
+
+import main
+imported = time.perf_counter()
+app = main.create_app()
+created = time.perf_counter()
+connects_before_request = len(connects)
+
+client = app.test_client()
+response = client.get(PATH)
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'status': response.status_code,
+    'connects_before_request': connects_before_request,
+}))
+'''
+
+
+def run_sample(path: str) -> dict:
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    output = subprocess.run(
+        [sys.executable, '-c', f'PATH = {path!r}\n' + SAMPLE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/dashboard', help='Route used for the first request')
+    args = parser.parse_args()
+
+    samples = [run_sample(args.path) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts, first request to {args.path} (status {samples[-1]['status']})")
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [sample[key] for sample in samples]
+        print(f"  {key:<18} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+    print(f"  database connections before first request: {max(s['connects_before_request'] for s in samples)}")
+
+
+if __name__ == '__main__':
+    main()
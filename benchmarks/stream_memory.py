@@ -0,0 +1,82 @@
+"""Measure peak memory of a large list response, streamed versus materialized.
+
+Seeds a throwaway SQLite database with --rows borrowings and reads them
+back as GET /api/borrowings, tracking the Python heap with tracemalloc.
+The old way (every ORM object, then every dict, then one JSON string) is
+measured with the same eager loading, so the difference is only in
+serialization. The streamed peak should stay flat as --rows grows.
+
+    python benchmarks/stream_memory.py --rows 1000000
+    python benchmarks/stream_memory.py --rows 1000000 --skip-materialized
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn):
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    return size, tracemalloc.get_traced_memory()[1] - baseline, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--skip-materialized', action='store_true',
+                        help='Only measure streaming (the old way needs several GB at 1M rows)')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'stream.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from flask import jsonify
+    from sqlalchemy.orm import joinedload
+    from main import create_app
+    from models import db, Borrowing
+    from seed import seed
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        seed(books=1000, members=1000, borrowings=args.rows, fines=0)
+        db.session.remove()
+
+    def streamed():
+        response = client.get('/api/borrowings', buffered=False)
+        assert response.status_code == 200
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def materialized():
+        with app.test_request_context('/api/borrowings'):
+            borrowings = Borrowing.query.options(
+                joinedload(Borrowing.member), joinedload(Borrowing.book), joinedload(Borrowing.staff)
+            ).all()
+            size = len(jsonify([borrowing.to_dict() for borrowing in borrowings]).get_data())
+            db.session.remove()
+            return size
+
+    tracemalloc.start()
+    print(f"{args.rows} borrowings")
+    size, peak, elapsed = measure(streamed)
+    print(f"streamed:     peak {peak / 2**20:9.1f} MiB  {elapsed:7.1f} s  {size / 2**20:8.1f} MiB of JSON")
+    if not args.skip_materialized:
+        size, peak, elapsed = measure(materialized)
+        print(f"materialized: peak {peak / 2**20:9.1f} MiB  {elapsed:7.1f} s  {size / 2**20:8.1f} MiB of JSON")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
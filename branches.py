@@ -0,0 +1,36 @@
+import logging
+from typing import Optional
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+BRANCH_HEADER = 'X-Branch-ID'
+
+
+def current_branch_id() -> Optional[int]:
+    """Branch the current request is scoped to, if any.
+
+    Desks send it as the X-Branch-ID header; `?branch=<id>` overrides it
+    for ad-hoc queries. Without either, requests see every branch.
+    """
+    if not has_request_context():
+        return None
+    if 'branch_id' not in g:
+        branch_id = request.args.get('branch', type=int)
+        if branch_id is None:
+            branch_id = request.headers.get(BRANCH_HEADER, type=int)
+        g.branch_id = branch_id
+    return g.branch_id
+
+
+def scoped(query, model, branch_id: Optional[int] = None):
+    """Restrict a query to one branch's rows.
+
+    Every branch-owned table leads an index with BranchID, so a scoped list
+    or count reads only that branch's slice of the table.
+    """
+    if branch_id is None:
+        branch_id = current_branch_id()
+    if branch_id is None:
+        return query
+    return query.filter(model.BranchID == branch_id)
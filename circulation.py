@@ -0,0 +1,288 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional
+from sqlalchemy import event, func
+from models import db, Book, Borrowing, CirculationEvent
+
+logger = logging.getLogger(__name__)
+
+# Event types
+CHECKOUT = 'checkout'
+RETURN = 'return'
+UNRETURN = 'unreturn'
+DELETE = 'delete'
+STOCK = 'stock'
+REMOVE = 'remove'
+# A loan moved to another member or book: written as a pair, MOVE_OUT for
+# its old member and book and MOVE_IN for its new ones
+MOVE_OUT = 'move_out'
+MOVE_IN = 'move_in'
+
+EVENT_TYPES = (CHECKOUT, RETURN, UNRETURN, DELETE, STOCK, REMOVE, MOVE_OUT, MOVE_IN)
+
+# Effect of each event on Books.Quantity. DELETE, STOCK, REMOVE and the
+# MOVE pair carry their own delta.
+QUANTITY_EFFECT = {
+    CHECKOUT: -1,
+    RETURN: 1,
+    UNRETURN: -1,
+}
+
+
+@event.listens_for(CirculationEvent, 'before_update')
+@event.listens_for(CirculationEvent, 'before_delete')
+def _reject_mutation(mapper, connection, target):
+    raise ValueError("Circulation events are append-only")
+
+
+def record_event(event_type: str, borrowing: Optional[Borrowing] = None,
+                 book_id: Optional[int] = None, quantity_delta: Optional[int] = None) -> CirculationEvent:
+    """Append a circulation event to the current session.
+
+    The event is committed (or rolled back) together with the caller's
+    transaction, so the log never disagrees with the rows it describes.
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown circulation event type: {event_type}")
+
+    if quantity_delta is None:
+        quantity_delta = QUANTITY_EFFECT.get(event_type, 0)
+
+    circulation_event = CirculationEvent(EventType=event_type, QuantityDelta=quantity_delta)
+
+    if borrowing is not None:
+        # A new borrowing needs its primary key before it can be referenced
+        if borrowing.BorrowID is None:
+            db.session.flush()
+        circulation_event.BorrowID = borrowing.BorrowID
+        circulation_event.BookID = borrowing.BookID
+        circulation_event.MemberID = borrowing.MemberID
+        circulation_event.StaffID = borrowing.StaffID
+
+    if book_id is not None:
+        circulation_event.BookID = book_id
+
+    db.session.add(circulation_event)
+    return circulation_event
+
+
+def record_stock_change(book: Book, quantity_delta: int) -> Optional[CirculationEvent]:
+    """Record a manual change to a book's stock, e.g. from the book form."""
+    if not quantity_delta:
+        return None
+    if book.BookID is None:
+        db.session.flush()
+    return record_event(STOCK, book_id=book.BookID, quantity_delta=quantity_delta)
+
+
+def record_reassignment(borrowing: Borrowing, member_id: Optional[int], book_id: Optional[int],
+                        is_open: bool) -> None:
+    """Record a loan moving to another member and/or book.
+
+    Call before changing the borrowing. MOVE_OUT takes the loan away from
+    its current member and book, and MOVE_IN gives it to the new ones, so
+    a replay credits later returns and deletes to where the loan is by
+    then. An open loan's copy moves with it: the old book gets a copy
+    back and the new one has one fewer.
+    """
+    if member_id == borrowing.MemberID and book_id == borrowing.BookID:
+        return
+    record_event(MOVE_OUT, borrowing, quantity_delta=1 if is_open else 0)
+    moved_in = record_event(MOVE_IN, borrowing, quantity_delta=-1 if is_open else 0)
+    moved_in.MemberID = member_id
+    moved_in.BookID = book_id
+
+
+def record_removal(book: Book) -> CirculationEvent:
+    """Record a book being deleted from the catalogue.
+
+    Its stock leaves with it, and the projections forget the book.
+    """
+    return record_event(REMOVE, book_id=book.BookID, quantity_delta=-(book.Quantity or 0))
+
+
+# ================ Projections ================
+
+class AvailabilityProjection:
+    """Available copies per book, i.e. the value Books.Quantity should hold."""
+
+    def __init__(self):
+        self.available = defaultdict(int)
+
+    def apply(self, row) -> None:
+        if row.BookID is None:
+            return
+        if row.EventType == REMOVE:
+            self.available.pop(row.BookID, None)
+        else:
+            self.available[row.BookID] += row.QuantityDelta
+
+    def result(self) -> Dict[int, int]:
+        return dict(self.available)
+
+
+class BookStatsProjection:
+    """Checkout, return and open-loan counts per book."""
+
+    def __init__(self):
+        self.stats = defaultdict(lambda: {'checkouts': 0, 'returns': 0, 'open_loans': 0})
+
+    def apply(self, row) -> None:
+        if row.BookID is None or row.EventType == STOCK:
+            return
+        if row.EventType == REMOVE:
+            self.stats.pop(row.BookID, None)
+            return
+        _apply_loan_event(self.stats[row.BookID], row)
+
+    def result(self) -> Dict[int, Dict[str, int]]:
+        return dict(self.stats)
+
+
+class MemberStatsProjection:
+    """Checkout, return and open-loan counts per member."""
+
+    def __init__(self):
+        self.stats = defaultdict(lambda: {'checkouts': 0, 'returns': 0, 'open_loans': 0})
+
+    def apply(self, row) -> None:
+        if row.MemberID is None or row.EventType in (STOCK, REMOVE):
+            return
+        _apply_loan_event(self.stats[row.MemberID], row)
+
+    def result(self) -> Dict[int, Dict[str, int]]:
+        return dict(self.stats)
+
+
+def _apply_loan_event(stats: Dict[str, int], row) -> None:
+    if row.EventType == CHECKOUT:
+        stats['checkouts'] += 1
+        stats['open_loans'] += 1
+    elif row.EventType == RETURN:
+        stats['returns'] += 1
+        stats['open_loans'] -= 1
+    elif row.EventType == UNRETURN:
+        stats['returns'] -= 1
+        stats['open_loans'] += 1
+    elif row.EventType in (DELETE, MOVE_OUT):
+        stats['checkouts'] -= 1
+        # Deleting or moving away an open loan gives the copy back
+        if row.QuantityDelta > 0:
+            stats['open_loans'] -= 1
+        else:
+            stats['returns'] -= 1
+    elif row.EventType == MOVE_IN:
+        stats['checkouts'] += 1
+        if row.QuantityDelta < 0:
+            stats['open_loans'] += 1
+        else:
+            stats['returns'] += 1
+
+
+def iter_events(batch_size: int = 1000) -> Iterable:
+    """Stream the event log in insertion order without loading it into memory."""
+    query = db.session.query(
+        CirculationEvent.EventID,
+        CirculationEvent.EventType,
+        CirculationEvent.BorrowID,
+        CirculationEvent.BookID,
+        CirculationEvent.MemberID,
+        CirculationEvent.QuantityDelta
+    ).order_by(CirculationEvent.EventID)
+    return query.yield_per(batch_size)
+
+
+def replay(projections: List[Any], batch_size: int = 1000) -> List[Any]:
+    """Feed every event to each projection in a single pass over the log."""
+    for row in iter_events(batch_size):
+        for projection in projections:
+            projection.apply(row)
+    return projections
+
+
+def build_projections(batch_size: int = 1000) -> Dict[str, Any]:
+    """Rebuild availability and per-book/per-member stats from the log."""
+    availability, book_stats, member_stats = replay(
+        [AvailabilityProjection(), BookStatsProjection(), MemberStatsProjection()],
+        batch_size
+    )
+    return {
+        'availability': availability.result(),
+        'book_stats': book_stats.result(),
+        'member_stats': member_stats.result()
+    }
+
+
+# ================ Consistency ================
+
+def check_quantity_drift() -> Dict[str, Any]:
+    """Compare Books.Quantity against the log in one grouped scan.
+
+    Books that have no events at all predate the log and are reported as
+    untracked rather than drifted; run backfill_from_borrowings() once to
+    bring them under the log.
+    """
+    expected = db.session.query(
+        CirculationEvent.BookID.label('BookID'),
+        func.sum(CirculationEvent.QuantityDelta).label('expected')
+    ).group_by(CirculationEvent.BookID).subquery()
+
+    rows = db.session.query(
+        Book.BookID, Book.Title, Book.Quantity, expected.c.expected
+    ).outerjoin(expected, Book.BookID == expected.c.BookID).all()
+
+    drifted = []
+    untracked = []
+    for book_id, title, quantity, expected_quantity in rows:
+        if expected_quantity is None:
+            untracked.append(book_id)
+        elif quantity != expected_quantity:
+            drifted.append({
+                'BookID': book_id,
+                'Title': title,
+                'Quantity': quantity,
+                'ExpectedQuantity': int(expected_quantity),
+                'Drift': quantity - int(expected_quantity)
+            })
+
+    return {
+        'books_checked': len(rows),
+        'drifted': drifted,
+        'untracked': untracked
+    }
+
+
+def backfill_from_borrowings() -> int:
+    """Seed an empty log from the current Borrowings and Books rows.
+
+    Each book gets an opening stock event equal to its current Quantity plus
+    its open loans, followed by a checkout (and, if returned, a return) for
+    every existing borrowing, so the log sums to the current Quantity.
+    Returns the number of events written.
+    """
+    if db.session.query(CirculationEvent.EventID).first() is not None:
+        raise ValueError("Circulation log is not empty; backfill only runs once")
+
+    open_loans = dict(db.session.query(
+        Borrowing.BookID, func.count(Borrowing.BorrowID)
+    ).filter(Borrowing.ReturnDate.is_(None)).group_by(Borrowing.BookID).all())
+
+    written = 0
+    for book_id, quantity in db.session.query(Book.BookID, Book.Quantity):
+        db.session.add(CirculationEvent(
+            EventType=STOCK, BookID=book_id,
+            QuantityDelta=quantity + open_loans.get(book_id, 0)
+        ))
+        written += 1
+
+    borrowings = db.session.query(Borrowing).order_by(Borrowing.BorrowDate, Borrowing.BorrowID)
+    for borrowing in borrowings.yield_per(1000):
+        record_event(CHECKOUT, borrowing)
+        written += 1
+        if borrowing.ReturnDate:
+            record_event(RETURN, borrowing)
+            written += 1
+
+    db.session.commit()
+    logger.info(f"Backfilled {written} circulation events")
+    return written
@@ -0,0 +1,196 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+from sqlalchemy import Integer, cast, func, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Book, Copy, Borrowing
+
+logger = logging.getLogger(__name__)
+
+# Copy statuses. Only AVAILABLE copies count towards Book.Quantity.
+AVAILABLE = 'available'
+ON_LOAN = 'on_loan'
+LOST = 'lost'
+WITHDRAWN = 'withdrawn'
+
+STATUSES = (AVAILABLE, ON_LOAN, LOST, WITHDRAWN)
+
+# A conditional claim only loses when another transaction took the same copy
+# between our select and update; retrying picks the next one. Adding copies
+# retries the same way when another request took the same barcodes.
+CLAIM_ATTEMPTS = 5
+
+
+def make_barcode(book_id: int, ordinal: int) -> str:
+    return f'{book_id:06d}-{ordinal:03d}'
+
+
+def _next_ordinal(book_id: int) -> int:
+    """One past the highest ordinal among a book's barcodes.
+
+    Not the copy count plus one: deleted copies leave gaps, and barcodes
+    past 999 sort wrongly as text, so the ordinals are compared as numbers.
+    """
+    prefix = make_barcode(book_id, 0).rsplit('-', 1)[0] + '-'
+    ordinal = cast(func.substr(Copy.Barcode, len(prefix) + 1), Integer)
+    return (db.session.query(func.max(ordinal)).filter(
+        Copy.BookID == book_id, Copy.Barcode.startswith(prefix)
+    ).scalar() or 0) + 1
+
+
+def _availability_changed(book: Book) -> None:
+    # Quantity is a column_property; reload it on next access
+    db.session.expire(book, ['Quantity'])
+
+
+def add_copies(book: Book, count: int, location: Optional[str] = None,
+               branch_id: Optional[int] = None) -> List[Copy]:
+    """Add `count` available copies of a book with generated barcodes.
+
+    Copies are shelved at the book's branch unless branch_id says otherwise.
+    """
+    if book.BookID is None:
+        db.session.flush()
+    if count <= 0:
+        return []
+    if branch_id is None:
+        branch_id = book.BranchID
+    for attempt in range(CLAIM_ATTEMPTS):
+        start = _next_ordinal(book.BookID)
+        new_copies = [
+            Copy(BookID=book.BookID, Barcode=make_barcode(book.BookID, start + i), Status=AVAILABLE,
+                 Location=location, BranchID=branch_id)
+            for i in range(count)
+        ]
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(new_copies)
+            break
+        except IntegrityError:
+            # Another request added copies of the same book since we read the
+            # ordinals; the unique Barcode refused ours, so read them again
+            if attempt == CLAIM_ATTEMPTS - 1:
+                raise
+    _availability_changed(book)
+    return new_copies
+
+
+def _set_status(book: Book, status: str, copy_id: Optional[int] = None,
+                branch_id: Optional[int] = None) -> Optional[Copy]:
+    """Move one available copy of a book to `status` and return it.
+
+    Candidates are selected with FOR UPDATE SKIP LOCKED, so concurrent
+    checkouts of a popular title lock different copy rows instead of queueing
+    on one. The update is also conditional on the copy still being available,
+    which keeps the claim safe on databases without row locks (SQLite).
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        query = db.session.query(Copy.CopyID).filter(Copy.BookID == book.BookID, Copy.Status == AVAILABLE)
+        if copy_id is not None:
+            query = query.filter(Copy.CopyID == copy_id)
+        if branch_id is not None:
+            query = query.filter(Copy.BranchID == branch_id)
+        candidate = query.order_by(Copy.CopyID).limit(1).with_for_update(skip_locked=True).scalar()
+        if candidate is None:
+            return None
+
+        claimed = db.session.execute(
+            update(Copy).where(Copy.CopyID == candidate, Copy.Status == AVAILABLE).values(Status=status)
+        ).rowcount
+        if claimed:
+            _availability_changed(book)
+            return db.session.get(Copy, candidate, populate_existing=True)
+    return None
+
+
+def claim_copy(book: Book, copy_id: Optional[int] = None, branch_id: Optional[int] = None) -> Optional[Copy]:
+    """Put an available copy on loan: a specific one if copy_id is given, else
+    any copy, limited to one branch when branch_id is given."""
+    return _set_status(book, ON_LOAN, copy_id, branch_id)
+
+
+def release_copy(borrowing: Borrowing) -> None:
+    """Make the copy held by a borrowing available again."""
+    if borrowing.CopyID is None:
+        return
+    db.session.execute(
+        update(Copy).where(Copy.CopyID == borrowing.CopyID, Copy.Status == ON_LOAN).values(Status=AVAILABLE)
+    )
+    book = db.session.get(Book, borrowing.BookID) if borrowing.BookID else None
+    if book:
+        _availability_changed(book)
+
+
+def withdraw_copies(book: Book, count: int, branch_id: Optional[int] = None) -> int:
+    """Withdraw up to `count` available copies; returns how many were withdrawn."""
+    withdrawn = 0
+    while withdrawn < count and _set_status(book, WITHDRAWN, branch_id=branch_id):
+        withdrawn += 1
+    return withdrawn
+
+
+def count_available(branch_id: Optional[int] = None) -> int:
+    query = db.session.query(func.count(Copy.CopyID)).filter(Copy.Status == AVAILABLE)
+    if branch_id is not None:
+        query = query.filter(Copy.BranchID == branch_id)
+    return query.scalar() or 0
+
+
+def migrate_quantities(batch_size: int = 1000) -> Dict[str, Any]:
+    """Create Copies rows for books that predate per-copy tracking.
+
+    Each book without copies gets one available copy per unit of its old
+    Quantity plus one on-loan copy for every open borrowing, and those
+    borrowings are linked to their copy. Books that already have copies
+    are skipped, so the migration can be re-run safely.
+    """
+    has_copies = db.session.query(Copy.CopyID).filter(Copy.BookID == Book.BookID).exists()
+    pending = db.session.query(
+        Book.BookID, Book.LegacyQuantity, Book.BranchID
+    ).filter(~has_copies).order_by(Book.BookID).all()
+
+    books_migrated = 0
+    copies_created = 0
+    loans_linked = 0
+    for offset in range(0, len(pending), batch_size):
+        batch = pending[offset:offset + batch_size]
+        book_ids = [book_id for book_id, _, _ in batch]
+
+        open_loans = defaultdict(list)
+        for borrow_id, book_id in db.session.query(Borrowing.BorrowID, Borrowing.BookID).filter(
+            Borrowing.BookID.in_(book_ids), Borrowing.ReturnDate.is_(None), Borrowing.CopyID.is_(None)
+        ).order_by(Borrowing.BorrowID):
+            open_loans[book_id].append(borrow_id)
+
+        rows = []
+        loan_barcodes = {}
+        for book_id, quantity, branch_id in batch:
+            ordinal = 1
+            for _ in range(max(quantity or 0, 0)):
+                rows.append({'BookID': book_id, 'Barcode': make_barcode(book_id, ordinal),
+                             'Status': AVAILABLE, 'BranchID': branch_id})
+                ordinal += 1
+            for borrow_id in open_loans[book_id]:
+                barcode = make_barcode(book_id, ordinal)
+                rows.append({'BookID': book_id, 'Barcode': barcode, 'Status': ON_LOAN, 'BranchID': branch_id})
+                loan_barcodes[barcode] = borrow_id
+                ordinal += 1
+
+        if rows:
+            db.session.execute(Copy.__table__.insert(), rows)
+        if loan_barcodes:
+            links = [
+                {'BorrowID': loan_barcodes[barcode], 'CopyID': copy_id}
+                for copy_id, barcode in db.session.query(Copy.CopyID, Copy.Barcode).filter(
+                    Copy.Barcode.in_(list(loan_barcodes))
+                )
+            ]
+            db.session.execute(update(Borrowing), links)
+
+        db.session.commit()
+        books_migrated += len(batch)
+        copies_created += len(rows)
+        loans_linked += len(loan_barcodes)
+
+    logger.info(f"Migrated {books_migrated} books to {copies_created} copies ({loans_linked} on loan)")
+    return {'books': books_migrated, 'copies': copies_created, 'loans_linked': loans_linked}
@@ -0,0 +1,187 @@
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Any, Optional, Tuple
+from flask import current_app
+from sqlalchemy import and_, tuple_
+from sqlalchemy.orm import joinedload
+from models import db, Book, Borrowing, DueNotification, Member
+from branches import scoped
+
+logger = logging.getLogger(__name__)
+
+DUE_SOON = 'due_soon'
+OVERDUE = 'overdue'
+
+KINDS = (DUE_SOON, OVERDUE)
+
+DEFAULT_DUE_SOON_DAYS = 2
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _open_loans():
+    # ReturnDate IS NULL then a DueDate range: one range of ix_borrowings_open_due
+    # (ix_borrowings_branch_open when branch-scoped), already in DueDate order
+    return Borrowing.query.filter(Borrowing.ReturnDate.is_(None))
+
+
+def count_overdue(today: Optional[date] = None, branch_id: Optional[int] = None) -> int:
+    today = today or date.today()
+    return scoped(_open_loans(), Borrowing, branch_id).filter(Borrowing.DueDate < today).count()
+
+
+def encode_cursor(borrowing: Borrowing) -> str:
+    return f'{borrowing.DueDate.isoformat()}.{borrowing.BorrowID}'
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        due_date, borrow_id = cursor.split('.')
+        return datetime.strptime(due_date, '%Y-%m-%d').date(), int(borrow_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def get_overdue_page(after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                     today: Optional[date] = None, branch_id: Optional[int] = None) -> Dict[str, Any]:
+    """One page of overdue loans, longest overdue first.
+
+    Paged by (DueDate, BorrowID) rather than offset, so each page is a
+    seek into the due-date index however deep the list goes. Pass the
+    returned `next` back as `after` for the following page.
+    """
+    today = today or date.today()
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = scoped(_open_loans(), Borrowing, branch_id).filter(Borrowing.DueDate < today)
+    if after:
+        query = query.filter(tuple_(Borrowing.DueDate, Borrowing.BorrowID) > decode_cursor(after))
+    borrowings = query.options(
+        joinedload(Borrowing.member), joinedload(Borrowing.book), joinedload(Borrowing.staff)
+    ).order_by(
+        Borrowing.DueDate, Borrowing.BorrowID
+    ).limit(limit + 1).all()
+
+    more = len(borrowings) > limit
+    borrowings = borrowings[:limit]
+    return {
+        'as_of': today.isoformat(),
+        'items': [dict(borrowing.to_dict(), DaysOverdue=(today - borrowing.DueDate).days)
+                  for borrowing in borrowings],
+        'next': encode_cursor(borrowings[-1]) if more else None
+    }
+
+
+class FileOutbox:
+    """Writes each notification as an .eml file in a directory.
+
+    A stand-in for SMTP: a mail relay, or a person, can pick the files up
+    from there. Files are written under a temporary name and renamed, so a
+    reader never sees half a message.
+    """
+
+    def __init__(self, directory: str, sender: str):
+        self.directory = directory
+        self.sender = sender
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, name: str, recipient: str, subject: str, body: str) -> str:
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = recipient
+        message['Subject'] = subject
+        message.set_content(body)
+        path = os.path.join(self.directory, f'{name}.eml')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(message.as_bytes())
+        os.replace(path + '.tmp', path)
+        return os.path.basename(path)
+
+
+def get_outbox() -> FileOutbox:
+    return FileOutbox(
+        current_app.config.get('NOTIFICATION_OUTBOX') or os.path.join(tempfile.gettempdir(), 'library-outbox'),
+        current_app.config.get('NOTIFICATION_SENDER') or 'library@localhost'
+    )
+
+
+def _compose(kind: str, member_name: str, title: str, due_date: date, today: date) -> Tuple[str, str]:
+    if kind == OVERDUE:
+        days = (today - due_date).days
+        subject = f'Overdue: {title}'
+        body = (f"Dear {member_name},\n\n\"{title}\" was due back on {due_date.isoformat()} "
+                f"and is now {days} day{'s' if days != 1 else ''} overdue. Please return it as soon as you can.\n")
+    else:
+        subject = f'Due soon: {title}'
+        body = (f"Dear {member_name},\n\n\"{title}\" is due back on {due_date.isoformat()}. "
+                f"Please return or renew it by then.\n")
+    return subject, body
+
+
+def _window(kind: str, today: date, due_soon_days: int):
+    if kind == OVERDUE:
+        return Borrowing.DueDate < today
+    return and_(Borrowing.DueDate >= today, Borrowing.DueDate <= today + timedelta(days=due_soon_days))
+
+
+def _pending(kind: str, today: date, due_soon_days: int):
+    """Open loans in the kind's due-date window without a reminder yet."""
+    already_sent = and_(DueNotification.BorrowID == Borrowing.BorrowID,
+                        DueNotification.Kind == kind,
+                        DueNotification.DueDate == Borrowing.DueDate)
+    return db.session.query(
+        Borrowing.BorrowID, Borrowing.MemberID, Borrowing.DueDate, Member.Name, Member.Email, Book.Title
+    ).join(Member, Member.MemberID == Borrowing.MemberID).join(Book, Book.BookID == Borrowing.BookID).outerjoin(
+        DueNotification, already_sent
+    ).filter(
+        Borrowing.ReturnDate.is_(None), _window(kind, today, due_soon_days), DueNotification.NotificationID.is_(None)
+    )
+
+
+def send_due_notifications(today: Optional[date] = None, due_soon_days: Optional[int] = None,
+                           batch_size: int = 500, progress=None) -> Dict[str, Any]:
+    """The daily batch: remind members of loans due soon and overdue.
+
+    Walks the open-loan due-date index for loans due within `due_soon_days`
+    and loans past due, writes one message per loan to the outbox and
+    records it in DueNotifications. Each loan gets each reminder once per
+    due date, so the batch can run any number of times a day. A batch's
+    messages are written before its rows commit: a crash in between means
+    those few are sent again on the next run, never that one is lost.
+    """
+    today = today or date.today()
+    if due_soon_days is None:
+        due_soon_days = current_app.config.get('DUE_SOON_DAYS', DEFAULT_DUE_SOON_DAYS)
+    outbox = get_outbox()
+
+    sent = {kind: 0 for kind in KINDS}
+    for step, kind in enumerate(KINDS):
+        last = None
+        while True:
+            query = _pending(kind, today, due_soon_days)
+            if last is not None:
+                query = query.filter(tuple_(Borrowing.DueDate, Borrowing.BorrowID) > last)
+            rows = query.order_by(Borrowing.DueDate, Borrowing.BorrowID).limit(batch_size).all()
+            if not rows:
+                break
+
+            notifications = []
+            for borrow_id, member_id, due_date, member_name, email, title in rows:
+                subject, body = _compose(kind, member_name, title, due_date, today)
+                message_file = outbox.send(f'{today.isoformat()}-{kind}-{borrow_id}', email, subject, body)
+                notifications.append({'BorrowID': borrow_id, 'MemberID': member_id, 'Kind': kind,
+                                      'DueDate': due_date, 'Recipient': email, 'MessageFile': message_file,
+                                      'CreatedAt': datetime.utcnow()})
+            db.session.execute(DueNotification.__table__.insert(), notifications)
+            db.session.commit()
+
+            sent[kind] += len(rows)
+            last = (rows[-1].DueDate, rows[-1].BorrowID)
+        if progress:
+            progress((step + 1) / len(KINDS), f"Sent {sent[kind]} {kind.replace('_', '-')} reminders")
+
+    logger.info(f"Sent {sent[DUE_SOON]} due-soon and {sent[OVERDUE]} overdue reminders for {today}")
+    return {'date': today.isoformat(), 'due_soon': sent[DUE_SOON], 'overdue': sent[OVERDUE]}
@@ -0,0 +1,404 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import bindparam, func, or_, update
+from models import db, Book, Publisher, Job
+from jobs import job_queue, QUEUED
+import isbn
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = 'catalog_enrichment'
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MISS_TTL_DAYS = 30
+
+OPEN_LIBRARY_URL = 'https://openlibrary.org/api/books'
+
+YEAR = re.compile(r'\b(1[5-9]\d\d|20\d\d)\b')
+
+# Books missing any of the fields enrichment can fill
+MISSING = or_(Book.Genre.is_(None), Book.PublishedYear.is_(None), Book.PublisherID.is_(None))
+
+# Returned by MetadataCache.get() for ISBNs it has never been told about
+UNCACHED = object()
+
+
+def _text(value, length: int) -> Optional[str]:
+    text = str(value).strip()[:length] if value is not None else ''
+    return text or None
+
+
+def _record(genre=None, year=None, publisher=None) -> Optional[Dict[str, Any]]:
+    """A source's answer cut down to what Books can hold, or None if it has nothing."""
+    if isinstance(year, str):
+        match = YEAR.search(year)
+        year = int(match.group(1)) if match else None
+    elif year is not None:
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            year = None
+    record = {
+        'Genre': _text(genre, 100),
+        'PublishedYear': year,
+        'Publisher': _text(publisher, 255)
+    }
+    return record if any(value is not None for value in record.values()) else None
+
+
+# ================ Sources ================
+
+class JsonFileSource:
+    """Metadata from a JSON file, for tests and offline dumps.
+
+    Either one object keyed by ISBN or one object per line with an "isbn"
+    key; records have any of "genre", "published_year" and "publisher".
+    The file is read once.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = 'file-' + os.path.splitext(os.path.basename(path))[0]
+        self._records = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._records is None:
+            with open(self.path) as f:
+                text = f.read()
+            stripped = text.lstrip()
+            if stripped.startswith('{') and not self.path.endswith('.jsonl'):
+                entries = [dict(value, isbn=key) for key, value in json.loads(text).items()]
+            else:
+                entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+            records = {}
+            for entry in entries:
+                isbn13 = isbn.try_normalize(str(entry.get('isbn', '')))
+                record = _record(entry.get('genre'), entry.get('published_year'), entry.get('publisher'))
+                if isbn13 and record:
+                    records[isbn13] = record
+            self._records = records
+        return self._records
+
+    def lookup(self, isbns: List[str]) -> Dict[str, Dict[str, Any]]:
+        records = self._load()
+        return {isbn13: records[isbn13] for isbn13 in isbns if isbn13 in records}
+
+
+class SQLiteSource:
+    """Metadata from a SQLite dump with a books(isbn13, genre, published_year, publisher) table."""
+
+    batch_size = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = 'sqlite-' + os.path.splitext(os.path.basename(path))[0]
+
+    def lookup(self, isbns: List[str]) -> Dict[str, Dict[str, Any]]:
+        # A connection per call: lookups run on several threads
+        with closing(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)) as conn:
+            rows = conn.execute(
+                f"SELECT isbn13, genre, published_year, publisher FROM books "
+                f"WHERE isbn13 IN ({','.join('?' * len(isbns))})", isbns
+            ).fetchall()
+        found = {}
+        for isbn13, genre, year, publisher in rows:
+            record = _record(genre, year, publisher)
+            if record:
+                found[isbn13] = record
+        return found
+
+
+class OpenLibrarySource:
+    """Metadata from the Open Library books API (https://openlibrary.org/dev/docs/api/books).
+
+    The first subject stands in for the genre and the year is taken from
+    the free-form publish date.
+    """
+
+    batch_size = 50
+
+    def __init__(self, url: str = OPEN_LIBRARY_URL, timeout: float = 10.0):
+        self.url = url
+        self.name = 'openlibrary-' + urllib.parse.urlsplit(url).hostname
+        self.timeout = timeout
+
+    def lookup(self, isbns: List[str]) -> Dict[str, Dict[str, Any]]:
+        query = urllib.parse.urlencode({
+            'bibkeys': ','.join(f'ISBN:{isbn13}' for isbn13 in isbns), 'format': 'json', 'jscmd': 'data'
+        })
+        request = urllib.request.Request(f'{self.url}?{query}', headers={'User-Agent': 'library-catalog-enrichment'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = json.load(response)
+        found = {}
+        for key, entry in body.items():
+            subjects = entry.get('subjects') or [{}]
+            publishers = entry.get('publishers') or [{}]
+            record = _record(subjects[0].get('name'), entry.get('publish_date'), publishers[0].get('name'))
+            if record:
+                found[key.split(':', 1)[-1]] = record
+        return found
+
+
+def get_source(spec: Optional[str] = None):
+    """The metadata source named by ENRICHMENT_SOURCE, or None if there is none.
+
+    Sources have lookup(isbns) returning records for the ISBN-13s they
+    know, a batch_size for how many ISBNs to ask for at once, and a name
+    that keeps their cache entries apart from other sources'.
+
+        openlibrary (or an http(s) URL)   OpenLibrarySource
+        sqlite:///path/to/dump.db         SQLiteSource
+        path/to/file.json[l]              JsonFileSource
+    """
+    spec = spec if spec is not None else current_app.config.get('ENRICHMENT_SOURCE')
+    if not spec:
+        return None
+    if spec == 'openlibrary':
+        return OpenLibrarySource()
+    if spec.startswith(('http://', 'https://')):
+        return OpenLibrarySource(spec)
+    if spec.startswith('sqlite:///'):
+        return SQLiteSource(spec[len('sqlite:///'):])
+    if spec.endswith(('.json', '.jsonl')):
+        return JsonFileSource(spec)
+    raise ValueError(f"Unknown metadata source: {spec}")
+
+
+# ================ Cache ================
+
+class MetadataCache:
+    """Lookup results on disk, one JSON file per ISBN-13.
+
+    Misses are cached too, for `miss_ttl`, so ISBNs no source knows about
+    aren't asked for on every run but are tried again eventually. Found
+    records are kept until the files are deleted. Files are written under
+    a temporary name and renamed, so a reader never sees half a record.
+    """
+
+    def __init__(self, directory: str, miss_ttl: timedelta):
+        self.directory = directory
+        self.miss_ttl = miss_ttl.total_seconds()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, isbn13: str) -> str:
+        # Spread over 100 subdirectories to keep directory listings short
+        return os.path.join(self.directory, isbn13[-2:], f'{isbn13}.json')
+
+    def get(self, isbn13: str):
+        """The cached record, None for a cached miss, or UNCACHED."""
+        try:
+            with open(self._path(isbn13)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return UNCACHED
+        if entry['record'] is None and time.time() - entry['fetched_at'] > self.miss_ttl:
+            return UNCACHED
+        return entry['record']
+
+    def put(self, isbn13: str, record: Optional[Dict[str, Any]]) -> None:
+        path = self._path(isbn13)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'record': record, 'fetched_at': time.time()}, f)
+        os.replace(temp_path, path)
+
+
+def get_cache(source) -> MetadataCache:
+    directory = current_app.config.get('ENRICHMENT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'library-enrichment')
+    return MetadataCache(
+        os.path.join(directory, source.name),
+        timedelta(days=current_app.config.get('ENRICHMENT_MISS_TTL_DAYS', DEFAULT_MISS_TTL_DAYS))
+    )
+
+
+# ================ Pipeline ================
+
+def _fetch(source, isbns: List[str], concurrency: int) -> Tuple[Dict[str, Dict[str, Any]], set]:
+    """Look ISBNs up a source batch at a time, `concurrency` batches at once.
+
+    Returns what was found and the ISBNs whose batch failed; those aren't
+    cached, so the next run asks again.
+    """
+    chunks = [isbns[i:i + source.batch_size] for i in range(0, len(isbns), source.batch_size)]
+
+    def lookup(chunk):
+        try:
+            return source.lookup(chunk), set()
+        except Exception as e:
+            logger.error(f"Metadata lookup for {len(chunk)} ISBNs failed: {str(e)}")
+            return {}, set(chunk)
+
+    if len(chunks) == 1 or concurrency <= 1:
+        results = [lookup(chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks)), thread_name_prefix='enrichment') as pool:
+            results = list(pool.map(lookup, chunks))
+
+    found, failed = {}, set()
+    for chunk_found, chunk_failed in results:
+        found.update(chunk_found)
+        failed |= chunk_failed
+    return found, failed
+
+
+def _publisher_ids(names: Iterable[str]) -> Dict[str, int]:
+    """PublisherIDs by lower-cased name, adding publishers not seen before."""
+    wanted = {name.lower(): name for name in names}
+    if not wanted:
+        return {}
+    ids = {name.lower(): publisher_id for publisher_id, name in db.session.query(
+        Publisher.PublisherID, Publisher.Name
+    ).filter(func.lower(Publisher.Name).in_(list(wanted)))}
+    for key, name in wanted.items():
+        if key not in ids:
+            publisher = Publisher(Name=name)
+            db.session.add(publisher)
+            db.session.flush()
+            ids[key] = publisher.PublisherID
+    return ids
+
+
+# Fills only fields that are still NULL, so a value a librarian entered
+# after the batch was read is never overwritten
+FILL = update(Book.__table__).where(Book.__table__.c.BookID == bindparam('b_BookID')).values({
+    column: func.coalesce(Book.__table__.c[column], bindparam(f'b_{column}', type_=Book.__table__.c[column].type))
+    for column in ('Genre', 'PublishedYear', 'PublisherID')
+})
+
+
+def enrich(book_ids: Optional[List[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+           progress=None, source=None, cache: Optional[MetadataCache] = None) -> Dict[str, Any]:
+    """Fill in missing Genre, PublishedYear and Publisher from a metadata source.
+
+    Walks the books missing any of them (all, or just `book_ids`) by
+    BookID a batch at a time. Each batch's ISBNs are answered from the
+    disk cache where possible; the rest are looked up in the source,
+    ENRICHMENT_CONCURRENCY requests at a time, and cached. Updates are
+    applied to the batch in one executemany and committed, so a long run
+    can be cancelled between batches without losing work. Publishers are
+    matched by name and added when new. Books without a valid ISBN are
+    skipped.
+    """
+    source = source or get_source()
+    if source is None:
+        raise ValueError("No metadata source configured; set ENRICHMENT_SOURCE")
+    cache = cache or get_cache(source)
+    concurrency = current_app.config.get('ENRICHMENT_CONCURRENCY', DEFAULT_CONCURRENCY)
+
+    query = db.session.query(Book.BookID, Book.ISBN13).filter(Book.ISBN13.isnot(None), MISSING)
+    if book_ids:
+        query = query.filter(Book.BookID.in_(book_ids))
+    total = query.count()
+
+    stats = {'books': 0, 'updated': 0, 'cached': 0, 'fetched': 0, 'not_found': 0, 'failed': 0}
+    last_id = 0
+    while True:
+        rows = query.filter(Book.BookID > last_id).order_by(Book.BookID).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].BookID
+
+        records = {}
+        misses = []
+        for isbn13 in {row.ISBN13 for row in rows}:
+            cached = cache.get(isbn13)
+            if cached is UNCACHED:
+                misses.append(isbn13)
+            else:
+                records[isbn13] = cached
+        stats['cached'] += len(records)
+        if misses:
+            found, failed = _fetch(source, sorted(misses), concurrency)
+            for isbn13 in misses:
+                if isbn13 not in failed:
+                    records[isbn13] = found.get(isbn13)
+                    cache.put(isbn13, records[isbn13])
+            stats['fetched'] += len(found)
+            stats['failed'] += len(failed)
+
+        publisher_ids = _publisher_ids(
+            record['Publisher'] for record in records.values() if record and record['Publisher']
+        )
+        updates = []
+        for row in rows:
+            if row.ISBN13 not in records:
+                continue
+            record = records[row.ISBN13]
+            if record is None:
+                stats['not_found'] += 1
+                continue
+            updates.append({
+                'b_BookID': row.BookID,
+                'b_Genre': record['Genre'],
+                'b_PublishedYear': record['PublishedYear'],
+                'b_PublisherID': publisher_ids.get(record['Publisher'].lower()) if record['Publisher'] else None
+            })
+        if updates:
+            db.session.execute(FILL, updates)
+        db.session.commit()
+
+        stats['books'] += len(rows)
+        stats['updated'] += len(updates)
+        if progress:
+            progress(stats['books'] / total if total else 1.0,
+                     f"Enriched {stats['updated']} of {stats['books']} books")
+
+    logger.info(f"Enriched {stats['updated']} of {stats['books']} books missing metadata "
+                f"({stats['cached']} cached, {stats['fetched']} fetched, {stats['failed']} failed)")
+    return stats
+
+
+def wanted(book: Book) -> bool:
+    """Whether a book is missing metadata and enrichment is configured."""
+    return bool(current_app.config.get('ENRICHMENT_SOURCE')) and book.ISBN13 is not None and (
+        book.Genre is None or book.PublishedYear is None or book.PublisherID is None
+    )
+
+
+def schedule(book_id: int) -> Optional[Job]:
+    """Queue enrichment of a newly added book.
+
+    Only the new book is looked up: a full run would also re-read every
+    older book the source has never had an answer for. The book joins an
+    enrichment run that is still waiting to start, so a burst of additions
+    gets one run; a queued full run already covers it. Errors are logged
+    rather than raised: callers have already committed their work.
+    """
+    try:
+        for job in Job.query.filter_by(JobType=JOB_TYPE, Status=QUEUED).order_by(Job.JobID):
+            params = json.loads(job.Params) if job.Params else {}
+            book_ids = params.get('book_ids')
+            if not book_ids:
+                return job
+            if len(book_ids) >= DEFAULT_BATCH_SIZE:
+                continue
+            # Only if it's still queued and nobody else added to it meanwhile;
+            # once started, a run has read its book IDs
+            added = db.session.execute(
+                update(Job).where(Job.JobID == job.JobID, Job.Status == QUEUED, Job.Params == job.Params)
+                .values(Params=json.dumps(dict(params, book_ids=book_ids + [book_id])))
+            ).rowcount
+            db.session.commit()
+            if added:
+                return job
+        return job_queue.submit(JOB_TYPE, {'book_ids': [book_id]})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error scheduling catalog enrichment: {str(e)}")
+        return None
@@ -0,0 +1,354 @@
+import json
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, NamedTuple, Optional
+from models import db, Publisher, Book, Member, Borrowing, Fine, Reservation
+from branches import scoped
+
+logger = logging.getLogger(__name__)
+
+# Limits on what a single query may ask for
+MAX_DEPTH = 6
+MAX_COST = 10000
+MAX_ROWS = 20000
+DEFAULT_FIRST = 50
+MAX_FIRST = 500
+
+# Assumed children per parent when estimating the cost of a nested list
+LIST_ESTIMATE = 10
+
+# Keys per IN (...) when loading a relation
+LOAD_CHUNK = 500
+
+
+class Field(NamedTuple):
+    name: str
+    alias: str
+    args: Dict[str, Any]
+    selections: Optional[List['Field']]
+
+
+class Relation(NamedTuple):
+    target: str
+    parent_key: str
+    model: Any
+    column: Any
+    join: Any = None
+    many: bool = True
+
+
+class Type(NamedTuple):
+    model: Any
+    key: str
+    scalars: tuple
+    relations: Dict[str, Relation]
+
+
+def _many(target, parent_key, model, column, join=None):
+    return Relation(target, parent_key, model, column, join)
+
+
+def _one(target, parent_key, model, column):
+    return Relation(target, parent_key, model, column, many=False)
+
+
+TYPES = {
+    'Publisher': Type(Publisher, 'PublisherID', ('PublisherID', 'Name', 'Address', 'Email', 'Phone'), {
+        'books': _many('Book', 'PublisherID', Book, Book.PublisherID),
+    }),
+    'Book': Type(Book, 'BookID', ('BookID', 'Title', 'Author', 'ISBN', 'ISBN13', 'Genre', 'PublishedYear', 'PublisherID',
+                                  'BranchID', 'Quantity'), {
+        'publisher': _one('Publisher', 'PublisherID', Publisher, Publisher.PublisherID),
+        'borrowings': _many('Borrowing', 'BookID', Borrowing, Borrowing.BookID),
+        'reservations': _many('Reservation', 'BookID', Reservation, Reservation.BookID),
+    }),
+    'Member': Type(Member, 'MemberID', ('MemberID', 'Name', 'Email', 'Phone', 'Address', 'MembershipTypeID',
+                                        'MembershipDate'), {
+        'borrowings': _many('Borrowing', 'MemberID', Borrowing, Borrowing.MemberID),
+        'fines': _many('Fine', 'MemberID', Fine, Borrowing.MemberID, join=Borrowing),
+        'reservations': _many('Reservation', 'MemberID', Reservation, Reservation.MemberID),
+    }),
+    'Borrowing': Type(Borrowing, 'BorrowID', ('BorrowID', 'MemberID', 'BookID', 'BorrowDate', 'DueDate',
+                                              'ReturnDate', 'StaffID', 'CopyID', 'BranchID'), {
+        'member': _one('Member', 'MemberID', Member, Member.MemberID),
+        'book': _one('Book', 'BookID', Book, Book.BookID),
+        'fines': _many('Fine', 'BorrowID', Fine, Fine.BorrowID),
+    }),
+    'Fine': Type(Fine, 'FineID', ('FineID', 'BorrowID', 'Amount', 'Paid'), {
+        'borrowing': _one('Borrowing', 'BorrowID', Borrowing, Borrowing.BorrowID),
+    }),
+    'Reservation': Type(Reservation, 'ReservationID', ('ReservationID', 'MemberID', 'BookID', 'ReservationDate',
+                                                       'Status'), {
+        'member': _one('Member', 'MemberID', Member, Member.MemberID),
+        'book': _one('Book', 'BookID', Book, Book.BookID),
+    }),
+}
+
+# Root field -> (type, whether it returns a list)
+ROOTS = {
+    'publisher': ('Publisher', False), 'publishers': ('Publisher', True),
+    'book': ('Book', False), 'books': ('Book', True),
+    'member': ('Member', False), 'members': ('Member', True),
+    'borrowing': ('Borrowing', False), 'borrowings': ('Borrowing', True),
+    'fine': ('Fine', False), 'fines': ('Fine', True),
+    'reservation': ('Reservation', False), 'reservations': ('Reservation', True),
+}
+
+TOKEN = re.compile(r'\s*(?:(#[^\n]*)|("(?:[^"\\]|\\.)*")|(-?\d+)|([A-Za-z_]\w*)|([{}():,]))')
+
+
+# ================ Parsing ================
+
+def _tokenize(source: str) -> List[str]:
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if not match:
+            raise ValueError(f"Unexpected character at {position}: {source[position]!r}")
+        position = match.end()
+        if not match.group(1):
+            tokens.append(match.group(0).strip())
+    return tokens
+
+
+class _Parser:
+    """Parser for the subset of GraphQL used here: fields, aliases, literal
+    arguments and nested selections. No fragments, variables or directives."""
+
+    def __init__(self, source: str):
+        self.tokens = _tokenize(source)
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f"Expected {expected or 'more input'}, got {token or 'end of query'}")
+        self.position += 1
+        return token
+
+    def document(self) -> List[Field]:
+        if self.peek() == 'query':
+            self.take()
+            if self.peek() not in ('{', None):
+                self.take()
+        selections = self.selection_set()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()} after query")
+        return selections
+
+    def selection_set(self) -> List[Field]:
+        self.take('{')
+        fields = []
+        while self.peek() != '}':
+            fields.append(self.field())
+            if self.peek() == ',':
+                self.take()
+        self.take('}')
+        return fields
+
+    def name(self) -> str:
+        token = self.take()
+        if not re.match(r'[A-Za-z_]\w*$', token):
+            raise ValueError(f"Expected a name, got {token}")
+        return token
+
+    def field(self) -> Field:
+        alias = name = self.name()
+        if self.peek() == ':':
+            self.take()
+            name = self.name()
+        args = self.arguments() if self.peek() == '(' else {}
+        selections = self.selection_set() if self.peek() == '{' else None
+        return Field(name, alias, args, selections)
+
+    def arguments(self) -> Dict[str, Any]:
+        self.take('(')
+        args = {}
+        while self.peek() != ')':
+            key = self.name()
+            self.take(':')
+            args[key] = self.value()
+            if self.peek() == ',':
+                self.take()
+        self.take(')')
+        return args
+
+    def value(self):
+        token = self.take()
+        if token.startswith('"'):
+            return json.loads(token)
+        if re.match(r'-?\d+$', token):
+            return int(token)
+        literals = {'true': True, 'false': False, 'null': None}
+        if token in literals:
+            return literals[token]
+        raise ValueError(f"Unsupported argument value {token}")
+
+
+def parse(source: str) -> List[Field]:
+    return _Parser(source).document()
+
+
+# ================ Validation and cost ================
+
+def _first(field: Field) -> int:
+    first = field.args.get('first', DEFAULT_FIRST)
+    if not isinstance(first, int) or not 0 < first <= MAX_FIRST:
+        raise ValueError(f"first must be between 1 and {MAX_FIRST}")
+    return first
+
+
+def _check(type_name: str, selections: Optional[List[Field]], rows: int, depth: int) -> int:
+    """Validate a selection set and return its estimated cost in rows loaded."""
+    if not selections:
+        raise ValueError(f"{type_name} needs a selection of fields")
+    if depth > MAX_DEPTH:
+        raise ValueError(f"Query is nested deeper than {MAX_DEPTH} levels")
+    schema = TYPES[type_name]
+    cost = 0
+    for field in selections:
+        if field.name in schema.scalars:
+            if field.selections is not None:
+                raise ValueError(f"{type_name}.{field.name} has no fields to select")
+        elif field.name in schema.relations:
+            relation = schema.relations[field.name]
+            children = rows * LIST_ESTIMATE if relation.many else rows
+            cost += children + _check(relation.target, field.selections, children, depth + 1)
+        else:
+            raise ValueError(f"{type_name} has no field {field.name}")
+    return cost
+
+
+def estimate_cost(fields: List[Field]) -> int:
+    cost = 0
+    for field in fields:
+        if field.name not in ROOTS:
+            raise ValueError(f"Unknown query field {field.name}")
+        type_name, many = ROOTS[field.name]
+        if not many and 'id' not in field.args:
+            raise ValueError(f"{field.name} needs an id argument")
+        rows = _first(field) if many else 1
+        cost += rows + _check(type_name, field.selections, rows, 1)
+    return cost
+
+
+# ================ Execution ================
+
+def _scalar(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class _Executor:
+    """Resolves a parsed query one selection level at a time.
+
+    Each relation in the query is loaded for every parent row at once, with
+    one IN (...) query per LOAD_CHUNK keys, DataLoader style. The number of
+    SQL statements therefore depends on the shape of the query, not on how
+    many rows it returns.
+    """
+
+    def __init__(self):
+        self.rows_loaded = 0
+        self.statements = 0
+
+    def _count(self, rows: int) -> None:
+        self.rows_loaded += rows
+        if self.rows_loaded > MAX_ROWS:
+            raise ValueError(f"Query loads more than {MAX_ROWS} rows; select less or lower first")
+
+    def root(self, field: Field):
+        type_name, many = ROOTS[field.name]
+        schema = TYPES[type_name]
+        key = getattr(schema.model, schema.key)
+        query = db.session.query(schema.model)
+        if hasattr(schema.model, 'BranchID'):
+            query = scoped(query, schema.model)
+        if many:
+            offset = field.args.get('offset', 0)
+            if not isinstance(offset, int) or offset < 0:
+                raise ValueError("offset must be a non-negative integer")
+            rows = query.order_by(key).offset(offset).limit(_first(field)).all()
+        else:
+            rows = query.filter(key == field.args['id']).all()
+        self.statements += 1
+        self._count(len(rows))
+
+        resolved = self.resolve(type_name, rows, field.selections)
+        if many:
+            return resolved
+        return resolved[0] if resolved else None
+
+    def load(self, relation: Relation, keys: List[Any]) -> Dict[Any, List[Any]]:
+        """Children of every parent key, grouped by key."""
+        grouped = defaultdict(list)
+        for start in range(0, len(keys), LOAD_CHUNK):
+            query = db.session.query(relation.model, relation.column)
+            if relation.join is not None:
+                query = query.join(relation.join)
+            chunk = keys[start:start + LOAD_CHUNK]
+            target_key = getattr(relation.model, TYPES[relation.target].key)
+            rows = query.filter(relation.column.in_(chunk)).order_by(target_key).all()
+            self.statements += 1
+            self._count(len(rows))
+            for child, parent_key in rows:
+                grouped[parent_key].append(child)
+        return grouped
+
+    def resolve(self, type_name: str, rows: List[Any], selections: List[Field]) -> List[Dict[str, Any]]:
+        schema = TYPES[type_name]
+        results = [{} for _ in rows]
+        for field in selections:
+            if field.name in schema.scalars:
+                for row, result in zip(rows, results):
+                    result[field.alias] = _scalar(getattr(row, field.name))
+                continue
+
+            relation = schema.relations[field.name]
+            parent_keys = [getattr(row, relation.parent_key) for row in rows]
+            grouped = self.load(relation, list({key for key in parent_keys if key is not None}))
+
+            # Resolve every distinct child once, then hand them out to parents
+            children = {}
+            for group in grouped.values():
+                for child in group:
+                    children.setdefault(id(child), child)
+            resolved = dict(zip(children, self.resolve(relation.target, list(children.values()), field.selections)))
+
+            for parent_key, result in zip(parent_keys, results):
+                group = [resolved[id(child)] for child in grouped.get(parent_key, [])]
+                result[field.alias] = group if relation.many else (group[0] if group else None)
+        return results
+
+
+def execute(source: str) -> Dict[str, Any]:
+    """Run a GraphQL-style query against the library models.
+
+    For example
+
+        { member(id: 3) { Name fines { Amount Paid } reservations { book { Title } } } }
+
+    returns {"data": {"member": {...}}, "cost": ..., "statements": ...}.
+    Raises ValueError for malformed queries and queries over the cost limits.
+    """
+    fields = parse(source)
+    cost = estimate_cost(fields)
+    if cost > MAX_COST:
+        raise ValueError(f"Query cost {cost} exceeds the limit of {MAX_COST}")
+
+    executor = _Executor()
+    data = {field.alias: executor.root(field) for field in fields}
+    return {'data': data, 'cost': cost, 'statements': executor.statements}
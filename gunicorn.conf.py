@@ -0,0 +1,93 @@
+"""Production gunicorn settings.
+
+Run with `gunicorn` from the project root (this file is picked up
+automatically) or `gunicorn -c gunicorn.conf.py`. Everything can be
+tuned through environment variables:
+
+    GUNICORN_PROFILE     sync | gthread | gevent (default gthread)
+                         sync     CPU-bound pages, one request per worker
+                         gthread  mixed API traffic waiting on the database
+                         gevent   many long-lived connections (streaming);
+                                  use it for workers serving /api/events
+    GUNICORN_WORKERS     worker processes (default 2 * CPUs + 1)
+    GUNICORN_THREADS     threads per gthread worker (default 4)
+    GUNICORN_CONNECTIONS greenlets per gevent worker (default 1000)
+    GUNICORN_BIND        address to bind (default 0.0.0.0:5000)
+
+Two app settings follow from these unless set explicitly:
+
+    EVENT_BACKEND        'database' with more than one worker, so an event
+                         reaches clients connected to any worker
+    EVENT_MAX_STREAMS    half the threads of a gthread worker, leaving the
+                         rest for API requests; 0 (streams refused) for sync
+                         workers, which would be tied up by one stream
+"""
+import multiprocessing
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+
+wsgi_app = 'main:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+if profile == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+elif profile == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS', 1000))
+elif profile == 'sync':
+    worker_class = 'sync'
+else:
+    raise ValueError(f"Unknown GUNICORN_PROFILE: {profile}")
+
+# Read by create_app() when gunicorn loads the app
+if workers > 1:
+    os.environ.setdefault('EVENT_BACKEND', 'database')
+if profile == 'gthread':
+    os.environ.setdefault('EVENT_MAX_STREAMS', str(max(1, threads // 2)))
+elif profile == 'sync':
+    os.environ.setdefault('EVENT_MAX_STREAMS', '0')
+
+# Build the app once in the master so workers fork with routes and templates
+# already imported; database pools are reset in post_fork below.
+preload_app = True
+
+# Recycle workers periodically, staggered so they don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# A sync worker is blocked while an idle keep-alive connection is open, so
+# it closes them quickly; threaded and async workers can keep them longer.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 2 if profile == 'sync' else 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Drop any pooled connections inherited from the master.
+
+    A connection shared between processes corrupts both ends, so every
+    worker starts with empty pools. close=False leaves the parent's sockets
+    alone instead of closing them from the child.
+    """
+    if profile == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; psycopg2 calls will block the gevent loop")
+
+    import main
+    from models import db
+    from replicas import replica_router
+
+    with main.app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    for replica in replica_router.replicas:
+        replica.engine.dispose(close=False)
@@ -0,0 +1,113 @@
+import logging
+import re
+from typing import Dict, Any, Optional
+from sqlalchemy import bindparam, func, select, update
+from models import db, Book, Copy
+import copies
+
+logger = logging.getLogger(__name__)
+
+SEPARATORS = re.compile(r'[\s\-]')
+
+
+def isbn13_check_digit(first12: str) -> str:
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def isbn10_check_digit(first9: str) -> str:
+    total = sum(int(digit) * (10 - i) for i, digit in enumerate(first9))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def normalize(value: str) -> str:
+    """Return the ISBN-13 form of an ISBN-10 or ISBN-13.
+
+    Hyphens, spaces and an "ISBN" prefix are ignored. Raises ValueError
+    when the value isn't an ISBN or its check digit is wrong.
+    """
+    cleaned = SEPARATORS.sub('', value or '').upper()
+    if cleaned.startswith('ISBN'):
+        cleaned = cleaned[4:].lstrip(':')
+
+    if len(cleaned) == 10 and cleaned[:9].isdigit() and (cleaned[9].isdigit() or cleaned[9] == 'X'):
+        if isbn10_check_digit(cleaned[:9]) != cleaned[9]:
+            raise ValueError(f"Invalid ISBN-10 check digit: {value}")
+        first12 = '978' + cleaned[:9]
+        return first12 + isbn13_check_digit(first12)
+
+    if len(cleaned) == 13 and cleaned.isdigit():
+        if not cleaned.startswith(('978', '979')):
+            raise ValueError(f"ISBN-13 must start with 978 or 979: {value}")
+        if isbn13_check_digit(cleaned[:12]) != cleaned[12]:
+            raise ValueError(f"Invalid ISBN-13 check digit: {value}")
+        return cleaned
+
+    raise ValueError(f"Not an ISBN-10 or ISBN-13: {value}")
+
+
+def try_normalize(value: str) -> Optional[str]:
+    try:
+        return normalize(value)
+    except ValueError:
+        return None
+
+
+def _lookup_statement(at_branch: bool):
+    available = select(func.count(Copy.CopyID)).where(Copy.BookID == Book.BookID, Copy.Status == copies.AVAILABLE)
+    columns = [Book.BookID, Book.Title, Book.Author, Book.ISBN, Book.ISBN13, Book.BranchID,
+               available.scalar_subquery().label('Quantity')]
+    if at_branch:
+        columns.append(available.where(Copy.BranchID == bindparam('branch_id')).scalar_subquery().label('AvailableHere'))
+    return select(*columns).where(Book.ISBN13 == bindparam('isbn13')).order_by(Book.BookID).limit(1)
+
+
+# Built once: scans are the hottest lookup at the desk, so skip per-call
+# query construction and the ORM layer
+LOOKUP = _lookup_statement(at_branch=False)
+LOOKUP_AT_BRANCH = _lookup_statement(at_branch=True)
+
+
+def lookup(isbn13: str, branch_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """A book and its availability by ISBN-13, in one query on the ISBN13 index.
+
+    With a branch, AvailableHere counts the copies on that branch's shelves.
+    """
+    if branch_id is None:
+        row = db.session.connection().execute(LOOKUP, {'isbn13': isbn13}).first()
+    else:
+        row = db.session.connection().execute(LOOKUP_AT_BRANCH, {'isbn13': isbn13, 'branch_id': branch_id}).first()
+    return row._asdict() if row else None
+
+
+def backfill(batch_size: int = 1000) -> Dict[str, Any]:
+    """Fill Books.ISBN13 for books that predate it.
+
+    Books whose ISBN doesn't validate are left NULL and reported, so they
+    can be fixed by hand; they just can't be found by scanning.
+    """
+    last_id = 0
+    updated = 0
+    invalid = []
+    while True:
+        batch = db.session.query(Book.BookID, Book.ISBN).filter(
+            Book.BookID > last_id, Book.ISBN13.is_(None)
+        ).order_by(Book.BookID).limit(batch_size).all()
+        if not batch:
+            break
+        rows = []
+        for book_id, raw in batch:
+            normalized = try_normalize(raw)
+            if normalized:
+                rows.append({'BookID': book_id, 'ISBN13': normalized})
+            else:
+                invalid.append(book_id)
+        if rows:
+            db.session.execute(update(Book), rows)
+        db.session.commit()
+        updated += len(rows)
+        last_id = batch[-1][0]
+
+    logger.info(f"Normalized {updated} ISBNs; {len(invalid)} books have invalid ISBNs")
+    return {'updated': updated, 'invalid': len(invalid), 'invalid_book_ids': invalid[:100]}
@@ -0,0 +1,335 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional
+from sqlalchemy import exists, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Job, JobSlot
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once cancellation has been requested."""
+
+
+class JobContext:
+    """Handed to every job handler to report progress and observe cancellation.
+
+    Status writes go through their own short transactions on the engine, so
+    they never commit (or roll back) the handler's work in db.session.
+    """
+
+    def __init__(self, job_id: int, params: Dict[str, Any]):
+        self.job_id = job_id
+        self.params = params
+
+    def _write(self, **values) -> None:
+        with db.engine.begin() as conn:
+            conn.execute(update(Job.__table__).where(Job.__table__.c.JobID == self.job_id).values(**values))
+
+    def progress(self, fraction: float, message: Optional[str] = None) -> None:
+        """Record progress as a fraction between 0 and 1 and abort if cancelled."""
+        self._write(Progress=max(0.0, min(1.0, fraction)), Message=message)
+        self.check_cancelled()
+
+    def cancel_requested(self) -> bool:
+        with db.engine.connect() as conn:
+            return bool(conn.execute(
+                Job.__table__.select().with_only_columns(Job.__table__.c.CancelRequested)
+                .where(Job.__table__.c.JobID == self.job_id)
+            ).scalar())
+
+    def check_cancelled(self) -> None:
+        if self.cancel_requested():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Background job runner backed by the jobs table.
+
+    Jobs run on a thread pool inside the web processes; no broker is
+    needed. A queued job is a row in jobs, and any process may claim it
+    with a conditional UPDATE on Status='queued'. Each job type has a
+    concurrency limit shared by all processes: a job runs only while it
+    holds one of its type's rows in job_slots. Polling and cancellation
+    go through the database, so any worker can answer for any job.
+
+    Every process polls for queued jobs and refreshes the heartbeat of
+    the jobs it runs. A running job whose heartbeat is older than the
+    lease (its process died or was killed) is failed and its slot freed,
+    so jobs left over from a restart don't hold their type's slots.
+
+    Configuration:
+        JOB_WORKERS          jobs run at once by each process (default 4)
+        JOB_POLL_INTERVAL    seconds between polls for queued jobs (default 2)
+        JOB_LEASE_SECONDS    seconds without a heartbeat before a running
+                             job is taken to be orphaned (default 60)
+    """
+
+    def __init__(self, app=None, max_workers: int = 4):
+        self.app = None
+        self.max_workers = max_workers
+        self.poll_interval = 2
+        self.lease_seconds = 60
+        self.handlers = {}
+        self.limits = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._running = set()
+        self._poller = None
+        self._slots_ready = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.max_workers = app.config.get('JOB_WORKERS', self.max_workers)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', self.lease_seconds)
+        app.extensions['job_queue'] = self
+        # Started by the first request rather than here, so importing the app
+        # (or forking from a preloaded master) never starts threads
+        app.before_request(self._ensure_poller)
+
+    def job_type(self, name: str, max_concurrent: int = 1) -> Callable:
+        """Register a handler for a job type.
+
+        Handlers are called as handler(ctx, **params) inside an app context
+        and return a JSON-serialisable result.
+        """
+        def decorator(func):
+            self.handlers[name] = func
+            self.limits[name] = max_concurrent
+            return func
+        return decorator
+
+    @property
+    def worker(self) -> str:
+        # Read each time: a preloaded app is imported before the fork
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use so importing the app never starts threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        return self._executor
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """Create a queued job row and start it if its type has a free slot."""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job = Job(JobType=job_type, Status=QUEUED, Params=json.dumps(params or {}))
+        db.session.add(job)
+        db.session.commit()
+        self._ensure_poller()
+        self._dispatch(job_type)
+        return job
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """Request cancellation; queued jobs are cancelled immediately."""
+        job = db.session.get(Job, job_id)
+        if job is None or job.Status in FINISHED_STATUSES:
+            return job
+
+        job.CancelRequested = True
+        if job.Status == QUEUED:
+            job.Status = CANCELLED
+            job.FinishedAt = datetime.utcnow()
+        db.session.commit()
+        return job
+
+    # ================ Claiming ================
+
+    def _ensure_slots(self) -> None:
+        """Create the job_slots rows for every registered type's limit."""
+        slots = JobSlot.__table__
+        with db.engine.connect() as conn:
+            existing = set(conn.execute(select(slots.c.JobType, slots.c.Slot)).all())
+        for job_type, limit in self.limits.items():
+            for slot in range(limit):
+                if (job_type, slot) in existing:
+                    continue
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(slots.insert().values(JobType=job_type, Slot=slot))
+                except IntegrityError:
+                    # Another process created it first
+                    pass
+        self._slots_ready = True
+
+    def _claim(self, job_type: str) -> Optional[int]:
+        """Take the oldest queued job of a type and a free slot for it, or None.
+
+        Both updates commit together: a job is never marked running
+        without holding a slot, nor a slot held by a job that isn't.
+        """
+        jobs, slots = Job.__table__, JobSlot.__table__
+        with db.engine.connect() as conn:
+            while True:
+                job_id = conn.execute(
+                    select(jobs.c.JobID).where(jobs.c.JobType == job_type, jobs.c.Status == QUEUED)
+                    .order_by(jobs.c.JobID).limit(1)
+                ).scalar()
+                if job_id is None:
+                    conn.rollback()
+                    return None
+
+                for slot in range(self.limits[job_type]):
+                    if conn.execute(
+                        update(slots).where(slots.c.JobType == job_type, slots.c.Slot == slot, slots.c.JobID.is_(None))
+                        .values(JobID=job_id)
+                    ).rowcount:
+                        break
+                else:
+                    # Every slot is taken, here or in another process
+                    conn.rollback()
+                    return None
+
+                now = datetime.utcnow()
+                if conn.execute(
+                    update(jobs).where(jobs.c.JobID == job_id, jobs.c.Status == QUEUED)
+                    .values(Status=RUNNING, StartedAt=now, HeartbeatAt=now, Worker=self.worker)
+                ).rowcount:
+                    conn.commit()
+                    return job_id
+                # Cancelled, or claimed by another process, since it was read
+                conn.rollback()
+
+    def _release(self, job_id: int) -> None:
+        slots = JobSlot.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(slots).where(slots.c.JobID == job_id).values(JobID=None))
+
+    def _dispatch(self, job_type: Optional[str] = None) -> None:
+        """Start queued jobs while this process has threads to run them on."""
+        if not self._slots_ready:
+            self._ensure_slots()
+        for name in [job_type] if job_type else list(self.handlers):
+            while True:
+                with self._lock:
+                    if len(self._running) >= self.max_workers:
+                        return
+                    job_id = self._claim(name)
+                    if job_id is None:
+                        break
+                    self._running.add(job_id)
+                self.executor.submit(self._run, job_id, name)
+
+    # ================ Polling ================
+
+    def _ensure_poller(self) -> None:
+        with self._lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_loop, name='job-poller', daemon=True)
+                self._poller.start()
+
+    def _poll_loop(self) -> None:
+        with self.app.app_context():
+            while True:
+                try:
+                    self._heartbeat()
+                    self._fail_orphans()
+                    self._dispatch()
+                except Exception as e:
+                    logger.error(f"Job poller error: {str(e)}")
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            running = list(self._running)
+        if running:
+            jobs = Job.__table__
+            with db.engine.begin() as conn:
+                conn.execute(update(jobs).where(jobs.c.JobID.in_(running), jobs.c.Status == RUNNING)
+                             .values(HeartbeatAt=datetime.utcnow()))
+
+    def _fail_orphans(self) -> None:
+        """Fail running jobs whose process stopped heartbeating, and free their slots.
+
+        They aren't requeued: a handler may have committed part of its
+        work before its process died.
+        """
+        jobs, slots = Job.__table__, JobSlot.__table__
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with db.engine.begin() as conn:
+            orphans = conn.execute(select(jobs.c.JobID, jobs.c.Worker).where(
+                jobs.c.Status == RUNNING, or_(jobs.c.HeartbeatAt.is_(None), jobs.c.HeartbeatAt < expired)
+            )).all()
+            for job_id, worker in orphans:
+                if conn.execute(
+                    update(jobs).where(jobs.c.JobID == job_id, jobs.c.Status == RUNNING).values(
+                        Status=FAILED, Error=f"Worker {worker} stopped before the job finished",
+                        FinishedAt=datetime.utcnow()
+                    )
+                ).rowcount:
+                    logger.warning(f"Job {job_id} orphaned by worker {worker}; marked failed")
+            # Slots held by jobs that are no longer running
+            conn.execute(update(slots).where(
+                slots.c.JobID.isnot(None),
+                ~exists().where(jobs.c.JobID == slots.c.JobID, jobs.c.Status == RUNNING)
+            ).values(JobID=None))
+
+    # ================ Running ================
+
+    def _run(self, job_id: int, job_type: str) -> None:
+        try:
+            with self.app.app_context():
+                try:
+                    self._execute(job_id, job_type)
+                finally:
+                    self._release(job_id)
+        except Exception:
+            logger.exception(f"Job {job_id} crashed outside its handler")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+        # Its slot is free; start the next job of the type, from any process
+        try:
+            with self.app.app_context():
+                self._dispatch(job_type)
+        except Exception as e:
+            logger.error(f"Error starting queued {job_type} jobs: {str(e)}")
+
+    def _execute(self, job_id: int, job_type: str) -> None:
+        job = db.session.get(Job, job_id)
+        params = json.loads(job.Params) if job.Params else {}
+        ctx = JobContext(job_id, params)
+
+        try:
+            ctx.check_cancelled()
+            result = self.handlers[job_type](ctx, **params)
+            db.session.commit()
+            ctx._write(Status=SUCCEEDED, Progress=1.0, Result=json.dumps(result, default=str),
+                       FinishedAt=datetime.utcnow())
+        except JobCancelled:
+            db.session.rollback()
+            ctx._write(Status=CANCELLED, FinishedAt=datetime.utcnow())
+            logger.info(f"Job {job_id} ({job_type}) cancelled")
+        except Exception as e:
+            db.session.rollback()
+            ctx._write(Status=FAILED, Error=str(e), FinishedAt=datetime.utcnow())
+            logger.error(f"Job {job_id} ({job_type}) failed: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+job_queue = JobQueue()
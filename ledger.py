@@ -0,0 +1,201 @@
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import case, func, insert, literal, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Member, Borrowing, Fine, BorrowingArchive, FineArchive, FineBalance
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# What one fine adds to its member's balance: (member, assessed, paid, unpaid count)
+Share = Tuple[Optional[int], Decimal, Decimal, int]
+NO_SHARE: Share = (None, ZERO, ZERO, 0)
+
+
+def to_amount(value) -> Decimal:
+    """A money amount from a request, as an exact Decimal in cents.
+
+    Raises ValueError for anything that isn't a non-negative number.
+    """
+    try:
+        # Via str so a JSON float like 0.1 becomes 0.10, not 0.1000000000000000055...
+        amount = Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+
+def _cents(value) -> Decimal:
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _unpaid(model=Fine):
+    return or_(model.Paid.is_(None), model.Paid.is_(False))
+
+
+def _sums(model):
+    return (
+        func.coalesce(func.sum(model.Amount), 0),
+        func.coalesce(func.sum(case((_unpaid(model), 0), else_=model.Amount)), 0),
+        func.count(case((_unpaid(model), 1)))
+    )
+
+
+def _totals(model, borrowing_model):
+    return db.session.query(*_sums(model)).join(borrowing_model, model.BorrowID == borrowing_model.BorrowID)
+
+
+def _computed(member_id: int):
+    """A member's balance row summed from scratch over Fines and the fine archive, as a SELECT."""
+    parts = union_all(*(
+        select(*(total.label(name) for total, name in zip(_sums(model), ('assessed', 'paid', 'unpaid')))).join(
+            borrowing_model, model.BorrowID == borrowing_model.BorrowID
+        ).where(borrowing_model.MemberID == member_id)
+        for model, borrowing_model in ((Fine, Borrowing), (FineArchive, BorrowingArchive))
+    )).subquery()
+    assessed, paid = func.sum(parts.c.assessed), func.sum(parts.c.paid)
+    return select(literal(member_id), assessed, paid, assessed - paid, func.sum(parts.c.unpaid))
+
+
+def _create(member_id: int) -> None:
+    """Create a member's balance row from their current fines.
+
+    Rows are created at a member's first balance lookup, like the loan
+    counters, so existing data needs no migration. As there, the sums
+    and the insert are one INSERT ... SELECT so a fine recorded between
+    them isn't lost.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(FineBalance).from_select(
+                ['MemberID', 'Assessed', 'Paid', 'Outstanding', 'UnpaidCount'], _computed(member_id)
+            ))
+    except IntegrityError:
+        # Another request created it first
+        pass
+
+
+def fine_share(borrow_id: Optional[int], amount, paid: Optional[bool]) -> Share:
+    """The member a fine counts against, and what it adds to their balance."""
+    if borrow_id is None:
+        return NO_SHARE
+    member_id = db.session.query(Borrowing.MemberID).filter(Borrowing.BorrowID == borrow_id).scalar()
+    amount = _cents(amount)
+    return (member_id, amount, amount, 0) if paid else (member_id, amount, ZERO, 1)
+
+
+def borrowing_share(borrowing: Borrowing) -> Share:
+    """What all of a loan's fines add to its member's balance together."""
+    assessed, paid, unpaid = _totals(Fine, Borrowing).filter(Borrowing.BorrowID == borrowing.BorrowID).one()
+    return borrowing.MemberID, _cents(assessed), _cents(paid), unpaid or 0
+
+
+def _apply(member_id: Optional[int], assessed: Decimal, paid: Decimal, unpaid: int) -> None:
+    """Add to a member's balance in the current transaction.
+
+    Members without a balance row are skipped; theirs is summed from
+    scratch when first looked up.
+    """
+    if member_id is None or (not assessed and not paid and not unpaid):
+        return
+    db.session.execute(
+        update(FineBalance).where(FineBalance.MemberID == member_id).values(
+            Assessed=FineBalance.Assessed + assessed,
+            Paid=FineBalance.Paid + paid,
+            Outstanding=FineBalance.Outstanding + (assessed - paid),
+            UnpaidCount=FineBalance.UnpaidCount + unpaid
+        )
+    )
+
+
+def record(before: Share, after: Share) -> None:
+    """Move a change between two shares from fine_share() or borrowing_share() onto the balances.
+
+    A fine created is record(NO_SHARE, share), one deleted is
+    record(share, NO_SHARE); paying or moving one is the difference
+    between its shares before and after.
+    """
+    if before[0] == after[0]:
+        _apply(after[0], after[1] - before[1], after[2] - before[2], after[3] - before[3])
+    else:
+        _apply(before[0], -before[1], -before[2], -before[3])
+        _apply(after[0], after[1], after[2], after[3])
+
+
+# Members' balances, outer-joined so members without a row are told apart
+# from members who don't exist
+BALANCE = select(Member.MemberID, Member.Name, FineBalance).select_from(Member).outerjoin(
+    FineBalance, Member.MemberID == FineBalance.MemberID
+)
+
+
+def get_balance(member_id: int) -> Optional[Dict[str, Any]]:
+    """A member's fine balance, creating the balance row if needed."""
+    row = db.session.execute(BALANCE.where(Member.MemberID == member_id)).first()
+    if row is None:
+        return None
+    if row.FineBalance is None:
+        _create(member_id)
+        row = db.session.execute(BALANCE.where(Member.MemberID == member_id)).first()
+    return dict(row.FineBalance.to_dict(), MemberName=row.Name)
+
+
+def outstanding(member_id: int) -> Decimal:
+    """A member's unpaid fine total, creating the balance row if needed."""
+    balance = db.session.get(FineBalance, member_id)
+    if balance is None:
+        _create(member_id)
+        balance = db.session.get(FineBalance, member_id)
+    return balance.Outstanding if balance is not None else ZERO
+
+
+def get_debtors(minimum: Decimal = CENT, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Members owing at least `minimum`, largest balance first, from the Outstanding index.
+
+    Only members with a balance row are listed; run fine-ledger-rebuild
+    once after upgrading so every member has one.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = db.session.query(FineBalance, Member.Name).join(
+        Member, FineBalance.MemberID == Member.MemberID
+    ).filter(FineBalance.Outstanding >= minimum).order_by(
+        FineBalance.Outstanding.desc(), FineBalance.MemberID
+    ).limit(limit).all()
+    return [dict(balance.to_dict(), MemberName=name) for balance, name in rows]
+
+
+def rebuild(batch_size: int = 1000) -> Dict[str, Any]:
+    """Resum every member's balance from Fines and the fine archive.
+
+    For after bulk loads or direct SQL edits that bypassed the routes.
+    """
+    totals = {}
+    for model, borrowing_model in ((Fine, Borrowing), (FineArchive, BorrowingArchive)):
+        query = _totals(model, borrowing_model).add_columns(borrowing_model.MemberID).filter(
+            borrowing_model.MemberID.isnot(None)
+        ).group_by(borrowing_model.MemberID)
+        for assessed, paid, unpaid, member_id in query:
+            previous = totals.get(member_id, (ZERO, ZERO, 0))
+            totals[member_id] = (previous[0] + _cents(assessed), previous[1] + _cents(paid), previous[2] + unpaid)
+
+    FineBalance.query.delete(synchronize_session=False)
+    member_ids = [member_id for (member_id,) in db.session.query(Member.MemberID).order_by(Member.MemberID)]
+    for start in range(0, len(member_ids), batch_size):
+        rows = []
+        for member_id in member_ids[start:start + batch_size]:
+            assessed, paid, unpaid = totals.get(member_id, (ZERO, ZERO, 0))
+            rows.append({'MemberID': member_id, 'Assessed': assessed, 'Paid': paid,
+                         'Outstanding': assessed - paid, 'UnpaidCount': unpaid})
+        db.session.execute(FineBalance.__table__.insert(), rows)
+    db.session.commit()
+
+    logger.info(f"Rebuilt fine balances for {len(member_ids)} members")
+    return {'members': len(member_ids)}
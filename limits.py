@@ -0,0 +1,155 @@
+import logging
+from typing import Dict, Any, Optional
+from sqlalchemy import exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Member, MembershipType, MemberCounter, Borrowing, FineBalance
+import ledger
+
+logger = logging.getLogger(__name__)
+
+
+def _computed(member_id: int):
+    """A member's open loans, counted from scratch, as (MemberID, OpenLoans)."""
+    return select(literal(member_id), func.count(Borrowing.BorrowID)).where(
+        Borrowing.MemberID == member_id, Borrowing.ReturnDate.is_(None)
+    )
+
+
+def _create(member_id: int) -> None:
+    """Create a member's counter row from their current loans.
+
+    Counters are created lazily at a member's first checkout, so members
+    who never borrow don't need one and existing data needs no migration.
+    The count and the insert are one INSERT ... SELECT: a checkout or
+    return committed between a separate count and insert would be missed,
+    since adjust() skips members who don't have a row yet.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(MemberCounter).from_select(['MemberID', 'OpenLoans'], _computed(member_id)))
+    except IntegrityError:
+        # Another checkout for the same member created it first
+        pass
+
+
+# One primary-key read: the member's limits, loan counter and fine balance together
+POLICY = select(
+    Member.MemberID, MembershipType.MaxLoans, MembershipType.MaxUnpaidFines,
+    MemberCounter.OpenLoans, FineBalance.Outstanding.label('UnpaidFines')
+).select_from(Member).outerjoin(
+    MembershipType, Member.MembershipTypeID == MembershipType.MembershipTypeID
+).outerjoin(MemberCounter, Member.MemberID == MemberCounter.MemberID).outerjoin(
+    FineBalance, Member.MemberID == FineBalance.MemberID
+)
+
+
+def _ensure(member_id: int, row, balance: bool = True) -> bool:
+    """Create whichever of a member's counter and balance rows is missing.
+
+    Returns whether anything was created. claim_loan() only needs the
+    balance for a fine limit, so it passes balance=False when there is
+    none and leaves creating it to the ledger.
+    """
+    created = False
+    if row.OpenLoans is None:
+        _create(member_id)
+        created = True
+    if balance and row.UnpaidFines is None:
+        ledger.outstanding(member_id)
+        created = True
+    return created
+
+
+def _policy(member_id: int):
+    return db.session.execute(POLICY.where(Member.MemberID == member_id)).first()
+
+
+def _refusal(row) -> Optional[str]:
+    if row.MaxLoans is not None and row.OpenLoans >= row.MaxLoans:
+        return f"Member has reached the limit of {row.MaxLoans} open loans"
+    if row.MaxUnpaidFines is not None and row.UnpaidFines > row.MaxUnpaidFines:
+        return f"Member has {row.UnpaidFines:.2f} in unpaid fines (limit {row.MaxUnpaidFines:.2f})"
+    return None
+
+
+def claim_loan(member_id: int) -> Optional[str]:
+    """Count a new open loan against a member, if their membership allows it.
+
+    Returns None when the loan was counted, or why it was refused. The
+    increment is conditional on the limits still holding, like a copy
+    claim, so two desks can't both take a member's last allowed loan.
+    """
+    row = _policy(member_id)
+    if row is None:
+        return "Member not found"
+    if _ensure(member_id, row, balance=row.MaxUnpaidFines is not None):
+        row = _policy(member_id)
+
+    refusal = _refusal(row)
+    if refusal:
+        return refusal
+
+    claim = update(MemberCounter).where(MemberCounter.MemberID == member_id)
+    if row.MaxLoans is not None:
+        claim = claim.where(MemberCounter.OpenLoans < row.MaxLoans)
+    if row.MaxUnpaidFines is not None:
+        claim = claim.where(~exists().where(
+            FineBalance.MemberID == member_id, FineBalance.Outstanding > row.MaxUnpaidFines
+        ))
+    if db.session.execute(claim.values(OpenLoans=MemberCounter.OpenLoans + 1)).rowcount:
+        return None
+    return _refusal(_policy(member_id)) or "Member has reached their borrowing limit"
+
+
+def adjust(member_id: Optional[int], open_loans: int) -> None:
+    """Apply a change to a member's open loan count in the current transaction.
+
+    Members without a counter row are skipped; theirs is counted from
+    scratch when first needed. Fines are tracked by the ledger module.
+    """
+    if member_id is None or not open_loans:
+        return
+    db.session.execute(
+        update(MemberCounter).where(MemberCounter.MemberID == member_id).values(
+            OpenLoans=MemberCounter.OpenLoans + open_loans
+        )
+    )
+
+
+def get_counters(member_id: int) -> Optional[Dict[str, Any]]:
+    """A member's counters and limits, creating the counter row if needed."""
+    row = _policy(member_id)
+    if row is None:
+        return None
+    if _ensure(member_id, row):
+        row = _policy(member_id)
+    return {
+        'MemberID': member_id,
+        'OpenLoans': row.OpenLoans,
+        'UnpaidFines': float(row.UnpaidFines),
+        'MaxLoans': row.MaxLoans,
+        'MaxUnpaidFines': float(row.MaxUnpaidFines) if row.MaxUnpaidFines is not None else None,
+        'CanBorrow': _refusal(row) is None
+    }
+
+
+def rebuild(batch_size: int = 1000) -> Dict[str, Any]:
+    """Recount every member's open loans from Borrowings.
+
+    For after bulk loads or direct SQL edits that bypassed the routes.
+    """
+    open_loans = dict(db.session.query(Borrowing.MemberID, func.count(Borrowing.BorrowID)).filter(
+        Borrowing.MemberID.isnot(None), Borrowing.ReturnDate.is_(None)
+    ).group_by(Borrowing.MemberID).all())
+
+    MemberCounter.query.delete(synchronize_session=False)
+    member_ids = [member_id for (member_id,) in db.session.query(Member.MemberID).order_by(Member.MemberID)]
+    for start in range(0, len(member_ids), batch_size):
+        db.session.execute(MemberCounter.__table__.insert(), [
+            {'MemberID': member_id, 'OpenLoans': open_loans.get(member_id, 0)}
+            for member_id in member_ids[start:start + batch_size]
+        ])
+    db.session.commit()
+
+    logger.info(f"Rebuilt counters for {len(member_ids)} members")
+    return {'members': len(member_ids)}
@@ -1,7 +1,10 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
 from datetime import datetime, date
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Publisher(db.Model):
     __tablename__ = 'publishers'
@@ -11,6 +14,7 @@ class Publisher(db.Model):
     Address = db.Column(db.Text, nullable=True)
     Email = db.Column(db.String(100), unique=True, nullable=True)
     Phone = db.Column(db.String(15), unique=True, nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     books = db.relationship('Book', backref='publisher', lazy=True)
 
@@ -24,6 +28,24 @@ class Publisher(db.Model):
         }
 
 
+class Branch(db.Model):
+    __tablename__ = 'branches'
+
+    BranchID = db.Column(db.Integer, primary_key=True)
+    Name = db.Column(db.String(255), nullable=False)
+    Code = db.Column(db.String(20), unique=True, nullable=False)
+    Address = db.Column(db.Text, nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'BranchID': self.BranchID,
+            'Name': self.Name,
+            'Code': self.Code,
+            'Address': self.Address
+        }
+
+
 class Book(db.Model):
     __tablename__ = 'books'
 
@@ -31,13 +53,20 @@ class Book(db.Model):
     Title = db.Column(db.String(255), nullable=False)
     Author = db.Column(db.String(255), nullable=False)
     ISBN = db.Column(db.String(20), unique=True, nullable=False)
+    # ISBN as entered is free-form; scanners look books up by its ISBN-13 form
+    ISBN13 = db.Column(db.String(13), nullable=True, index=True)
     Genre = db.Column(db.String(100), nullable=True)
     PublishedYear = db.Column(db.Integer, nullable=True)
     PublisherID = db.Column(db.Integer, db.ForeignKey('publishers.PublisherID', ondelete='SET NULL'), nullable=True)
-    Quantity = db.Column(db.Integer, nullable=False, default=0)
+    # Stock count from before per-copy tracking. Only read when migrating to
+    # Copies; Quantity (below) is now derived from copy status.
+    LegacyQuantity = db.Column('Quantity', db.Integer, nullable=False, default=0)
+    BranchID = db.Column(db.Integer, db.ForeignKey('branches.BranchID', ondelete='SET NULL'), nullable=True, index=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     borrowings = db.relationship('Borrowing', backref='book', lazy=True)
     reservations = db.relationship('Reservation', backref='book', lazy=True)
+    copies = db.relationship('Copy', backref='book', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -45,21 +74,63 @@ class Book(db.Model):
             'Title': self.Title,
             'Author': self.Author,
             'ISBN': self.ISBN,
+            'ISBN13': self.ISBN13,
             'Genre': self.Genre,
             'PublishedYear': self.PublishedYear,
             'PublisherID': self.PublisherID,
+            'BranchID': self.BranchID,
             'Quantity': self.Quantity,
             'PublisherName': self.publisher.Name if self.publisher else None
         }
 
 
+class Copy(db.Model):
+    __tablename__ = 'copies'
+
+    CopyID = db.Column(db.Integer, primary_key=True)
+    BookID = db.Column(db.Integer, db.ForeignKey('books.BookID', ondelete='CASCADE'), nullable=False)
+    Barcode = db.Column(db.String(50), unique=True, nullable=False)
+    Status = db.Column(db.String(20), nullable=False, default='available')
+    Location = db.Column(db.String(100), nullable=True)
+    BranchID = db.Column(db.Integer, db.ForeignKey('branches.BranchID', ondelete='SET NULL'), nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_copies_book_status', 'BookID', 'Status'),
+        db.Index('ix_copies_branch_status', 'BranchID', 'Status'),
+    )
+
+    def to_dict(self):
+        return {
+            'CopyID': self.CopyID,
+            'BookID': self.BookID,
+            'Barcode': self.Barcode,
+            'Status': self.Status,
+            'Location': self.Location,
+            'BranchID': self.BranchID
+        }
+
+
+# Available copies, counted from the (BookID, Status) index. Checkouts update
+# one copy row each instead of all contending for the book row.
+Book.Quantity = db.column_property(
+    select(func.count(Copy.CopyID)).where(
+        Copy.BookID == Book.BookID, Copy.Status == 'available'
+    ).correlate_except(Copy).scalar_subquery()
+)
+
+
 class MembershipType(db.Model):
     __tablename__ = 'membership_types'
 
     MembershipTypeID = db.Column(db.Integer, primary_key=True)
     TypeName = db.Column(db.String(100), nullable=False)
     DurationMonths = db.Column(db.Integer, nullable=False)
-    Fee = db.Column(db.Float, nullable=False)
+    Fee = db.Column(db.Numeric(10, 2), nullable=False)
+    # Checkout policy; NULL means no limit
+    MaxLoans = db.Column(db.Integer, nullable=True)
+    MaxUnpaidFines = db.Column(db.Numeric(10, 2), nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     members = db.relationship('Member', backref='membership_type', lazy=True)
 
@@ -68,7 +139,9 @@ class MembershipType(db.Model):
             'MembershipTypeID': self.MembershipTypeID,
             'TypeName': self.TypeName,
             'DurationMonths': self.DurationMonths,
-            'Fee': self.Fee
+            'Fee': float(self.Fee) if self.Fee is not None else None,
+            'MaxLoans': self.MaxLoans,
+            'MaxUnpaidFines': float(self.MaxUnpaidFines) if self.MaxUnpaidFines is not None else None
         }
 
 
@@ -82,6 +155,7 @@ class Member(db.Model):
     Address = db.Column(db.Text, nullable=True)
     MembershipTypeID = db.Column(db.Integer, db.ForeignKey('membership_types.MembershipTypeID', ondelete='SET NULL'), nullable=True)
     MembershipDate = db.Column(db.Date, nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     borrowings = db.relationship('Borrowing', backref='member', lazy=True)
     reservations = db.relationship('Reservation', backref='member', lazy=True)
@@ -99,6 +173,45 @@ class Member(db.Model):
         }
 
 
+class MemberCounter(db.Model):
+    __tablename__ = 'member_counters'
+
+    # Maintained by the borrowing routes (see limits.py) so the checkout
+    # policy check doesn't count Borrowings. Unpaid fines are in FineBalance.
+    MemberID = db.Column(db.Integer, db.ForeignKey('members.MemberID', ondelete='CASCADE'), primary_key=True)
+    OpenLoans = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'MemberID': self.MemberID,
+            'OpenLoans': self.OpenLoans
+        }
+
+
+class FineBalance(db.Model):
+    __tablename__ = 'fine_balances'
+
+    # A member's running fine totals, live and archived, maintained by the
+    # fine and borrowing routes (see ledger.py) so a balance is one
+    # primary-key read instead of a sum over Fines.
+    MemberID = db.Column(db.Integer, db.ForeignKey('members.MemberID', ondelete='CASCADE'), primary_key=True)
+    Assessed = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    Paid = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    Outstanding = db.Column(db.Numeric(12, 2), nullable=False, default=0, index=True)
+    UnpaidCount = db.Column(db.Integer, nullable=False, default=0)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'MemberID': self.MemberID,
+            'Assessed': float(self.Assessed),
+            'Paid': float(self.Paid),
+            'Outstanding': float(self.Outstanding),
+            'UnpaidCount': self.UnpaidCount,
+            'UpdatedAt': self.UpdatedAt.isoformat() if self.UpdatedAt else None
+        }
+
+
 class Staff(db.Model):
     __tablename__ = 'staff'
 
@@ -108,6 +221,8 @@ class Staff(db.Model):
     Phone = db.Column(db.String(15), unique=True, nullable=False)
     Role = db.Column(db.String(50), nullable=True)
     HireDate = db.Column(db.Date, nullable=True)
+    BranchID = db.Column(db.Integer, db.ForeignKey('branches.BranchID', ondelete='SET NULL'), nullable=True, index=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     borrowings = db.relationship('Borrowing', backref='staff', lazy=True)
 
@@ -118,7 +233,8 @@ class Staff(db.Model):
             'Email': self.Email,
             'Phone': self.Phone,
             'Role': self.Role,
-            'HireDate': self.HireDate.strftime('%Y-%m-%d') if self.HireDate else None
+            'HireDate': self.HireDate.strftime('%Y-%m-%d') if self.HireDate else None,
+            'BranchID': self.BranchID
         }
 
 
@@ -132,9 +248,20 @@ class Borrowing(db.Model):
     DueDate = db.Column(db.Date, nullable=False)
     ReturnDate = db.Column(db.Date, nullable=True)
     StaffID = db.Column(db.Integer, db.ForeignKey('staff.StaffID', ondelete='SET NULL'), nullable=True)
+    CopyID = db.Column(db.Integer, db.ForeignKey('copies.CopyID', ondelete='SET NULL'), nullable=True)
+    BranchID = db.Column(db.Integer, db.ForeignKey('branches.BranchID', ondelete='SET NULL'), nullable=True)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     fines = db.relationship('Fine', backref='borrowing', lazy=True)
 
+    # Branch-scoped open-loan and overdue lists read only their branch's slice;
+    # ix_borrowings_open_due is the library-wide due-date queue (ReturnDate IS
+    # NULL, then open loans in DueDate order)
+    __table_args__ = (
+        db.Index('ix_borrowings_branch_open', 'BranchID', 'ReturnDate', 'DueDate'),
+        db.Index('ix_borrowings_open_due', 'ReturnDate', 'DueDate'),
+    )
+
     def to_dict(self):
         return {
             'BorrowID': self.BorrowID,
@@ -144,6 +271,8 @@ class Borrowing(db.Model):
             'DueDate': self.DueDate.strftime('%Y-%m-%d'),
             'ReturnDate': self.ReturnDate.strftime('%Y-%m-%d') if self.ReturnDate else None,
             'StaffID': self.StaffID,
+            'CopyID': self.CopyID,
+            'BranchID': self.BranchID,
             'MemberName': self.member.Name if self.member else None,
             'BookTitle': self.book.Title if self.book else None,
             'StaffName': self.staff.Name if self.staff else None
@@ -155,8 +284,9 @@ class Fine(db.Model):
 
     FineID = db.Column(db.Integer, primary_key=True)
     BorrowID = db.Column(db.Integer, db.ForeignKey('borrowings.BorrowID', ondelete='CASCADE'), nullable=True)
-    Amount = db.Column(db.Float, nullable=False)
+    Amount = db.Column(db.Numeric(10, 2), nullable=False)
     Paid = db.Column(db.Boolean, default=False)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def to_dict(self):
         borrowing = self.borrowing
@@ -166,7 +296,7 @@ class Fine(db.Model):
         return {
             'FineID': self.FineID,
             'BorrowID': self.BorrowID,
-            'Amount': self.Amount,
+            'Amount': float(self.Amount),
             'Paid': self.Paid,
             'MemberName': member_name,
             'BookTitle': book_title,
@@ -183,6 +313,7 @@ class Reservation(db.Model):
     BookID = db.Column(db.Integer, db.ForeignKey('books.BookID', ondelete='CASCADE'), nullable=True)
     ReservationDate = db.Column(db.Date, nullable=True, default=date.today)
     Status = db.Column(db.String(20), default='Pending')
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -194,3 +325,236 @@ class Reservation(db.Model):
             'MemberName': self.member.Name if self.member else None,
             'BookTitle': self.book.Title if self.book else None
         }
+
+
+class BorrowingArchive(db.Model):
+    __tablename__ = 'borrowings_archive'
+
+    # Long-returned loans moved out of borrowings by archive.archive_returned().
+    # IDs are kept from the hot table; there are no foreign keys, so history
+    # survives members, books and staff being deleted.
+    BorrowID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    MemberID = db.Column(db.Integer, nullable=True, index=True)
+    BookID = db.Column(db.Integer, nullable=True, index=True)
+    BorrowDate = db.Column(db.Date, nullable=True)
+    DueDate = db.Column(db.Date, nullable=False)
+    ReturnDate = db.Column(db.Date, nullable=True)
+    StaffID = db.Column(db.Integer, nullable=True)
+    CopyID = db.Column(db.Integer, nullable=True)
+    BranchID = db.Column(db.Integer, nullable=True)
+    ArchivedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    member = db.relationship('Member', primaryjoin='foreign(BorrowingArchive.MemberID) == Member.MemberID', viewonly=True)
+    book = db.relationship('Book', primaryjoin='foreign(BorrowingArchive.BookID) == Book.BookID', viewonly=True)
+    staff = db.relationship('Staff', primaryjoin='foreign(BorrowingArchive.StaffID) == Staff.StaffID', viewonly=True)
+
+    def to_dict(self):
+        return {
+            'BorrowID': self.BorrowID,
+            'MemberID': self.MemberID,
+            'BookID': self.BookID,
+            'BorrowDate': self.BorrowDate.strftime('%Y-%m-%d') if self.BorrowDate else None,
+            'DueDate': self.DueDate.strftime('%Y-%m-%d'),
+            'ReturnDate': self.ReturnDate.strftime('%Y-%m-%d') if self.ReturnDate else None,
+            'StaffID': self.StaffID,
+            'CopyID': self.CopyID,
+            'BranchID': self.BranchID,
+            'MemberName': self.member.Name if self.member else None,
+            'BookTitle': self.book.Title if self.book else None,
+            'StaffName': self.staff.Name if self.staff else None,
+            'Archived': True
+        }
+
+
+class FineArchive(db.Model):
+    __tablename__ = 'fines_archive'
+
+    # Paid fines archived together with their borrowing
+    FineID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    BorrowID = db.Column(db.Integer, nullable=True, index=True)
+    Amount = db.Column(db.Numeric(10, 2), nullable=False)
+    Paid = db.Column(db.Boolean, default=True)
+    ArchivedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    borrowing = db.relationship('BorrowingArchive',
+                                primaryjoin='foreign(FineArchive.BorrowID) == BorrowingArchive.BorrowID', viewonly=True)
+
+    def to_dict(self):
+        borrowing = self.borrowing
+        return {
+            'FineID': self.FineID,
+            'BorrowID': self.BorrowID,
+            'Amount': float(self.Amount),
+            'Paid': self.Paid,
+            'MemberName': borrowing.member.Name if borrowing and borrowing.member else None,
+            'BookTitle': borrowing.book.Title if borrowing and borrowing.book else None,
+            'BorrowDate': borrowing.BorrowDate.strftime('%Y-%m-%d') if borrowing and borrowing.BorrowDate else None,
+            'DueDate': borrowing.DueDate.strftime('%Y-%m-%d') if borrowing and borrowing.DueDate else None,
+            'Archived': True
+        }
+
+
+class CirculationEvent(db.Model):
+    __tablename__ = 'circulation_events'
+
+    # Append-only: rows are never updated or deleted, and IDs are not foreign
+    # keys so the log outlives the borrowings and books it describes.
+    EventID = db.Column(db.Integer, primary_key=True)
+    EventType = db.Column(db.String(20), nullable=False)
+    BorrowID = db.Column(db.Integer, nullable=True, index=True)
+    BookID = db.Column(db.Integer, nullable=True, index=True)
+    MemberID = db.Column(db.Integer, nullable=True, index=True)
+    StaffID = db.Column(db.Integer, nullable=True)
+    QuantityDelta = db.Column(db.Integer, nullable=False, default=0)
+    OccurredAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'EventID': self.EventID,
+            'EventType': self.EventType,
+            'BorrowID': self.BorrowID,
+            'BookID': self.BookID,
+            'MemberID': self.MemberID,
+            'StaffID': self.StaffID,
+            'QuantityDelta': self.QuantityDelta,
+            'OccurredAt': self.OccurredAt.strftime('%Y-%m-%d %H:%M:%S') if self.OccurredAt else None
+        }
+
+
+class DueNotification(db.Model):
+    __tablename__ = 'due_notifications'
+    # One reminder of each kind per loan and due date: re-running the daily
+    # batch sends nothing twice, and a renewed loan gets fresh reminders
+    __table_args__ = (
+        db.UniqueConstraint('BorrowID', 'Kind', 'DueDate', name='uq_due_notification'),
+    )
+
+    NotificationID = db.Column(db.Integer, primary_key=True)
+    BorrowID = db.Column(db.Integer, nullable=False)
+    MemberID = db.Column(db.Integer, nullable=True, index=True)
+    Kind = db.Column(db.String(20), nullable=False)
+    DueDate = db.Column(db.Date, nullable=False)
+    Recipient = db.Column(db.String(100), nullable=True)
+    MessageFile = db.Column(db.String(255), nullable=True)
+    CreatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'NotificationID': self.NotificationID,
+            'BorrowID': self.BorrowID,
+            'MemberID': self.MemberID,
+            'Kind': self.Kind,
+            'DueDate': self.DueDate.strftime('%Y-%m-%d'),
+            'Recipient': self.Recipient,
+            'MessageFile': self.MessageFile,
+            'CreatedAt': self.CreatedAt.strftime('%Y-%m-%d %H:%M:%S') if self.CreatedAt else None
+        }
+
+
+class CirculationRollup(db.Model):
+    __tablename__ = 'circulation_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('RollupDate', 'Dimension', 'DimensionKey', name='uq_circulation_rollup'),
+    )
+
+    RollupID = db.Column(db.Integer, primary_key=True)
+    RollupDate = db.Column(db.Date, nullable=False, index=True)
+    Dimension = db.Column(db.String(20), nullable=False)
+    DimensionKey = db.Column(db.String(100), nullable=False, default='')
+    Checkouts = db.Column(db.Integer, nullable=False, default=0)
+    Returns = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RollupWatermark(db.Model):
+    __tablename__ = 'rollup_watermarks'
+
+    Name = db.Column(db.String(50), primary_key=True)
+    RolledThrough = db.Column(db.Date, nullable=False)
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    JobID = db.Column(db.Integer, primary_key=True)
+    JobType = db.Column(db.String(50), nullable=False, index=True)
+    Status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    Params = db.Column(db.Text, nullable=True)
+    Progress = db.Column(db.Float, nullable=False, default=0.0)
+    Message = db.Column(db.String(255), nullable=True)
+    Result = db.Column(db.Text, nullable=True)
+    Error = db.Column(db.Text, nullable=True)
+    CancelRequested = db.Column(db.Boolean, nullable=False, default=False)
+    CreatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    StartedAt = db.Column(db.DateTime, nullable=True)
+    FinishedAt = db.Column(db.DateTime, nullable=True)
+    # Process running the job, and when it last confirmed it still is
+    Worker = db.Column(db.String(100), nullable=True)
+    HeartbeatAt = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'JobID': self.JobID,
+            'JobType': self.JobType,
+            'Status': self.Status,
+            'Params': json.loads(self.Params) if self.Params else None,
+            'Progress': self.Progress,
+            'Message': self.Message,
+            'Result': json.loads(self.Result) if self.Result else None,
+            'Error': self.Error,
+            'CancelRequested': self.CancelRequested,
+            'CreatedAt': self.CreatedAt.strftime('%Y-%m-%d %H:%M:%S') if self.CreatedAt else None,
+            'StartedAt': self.StartedAt.strftime('%Y-%m-%d %H:%M:%S') if self.StartedAt else None,
+            'FinishedAt': self.FinishedAt.strftime('%Y-%m-%d %H:%M:%S') if self.FinishedAt else None,
+            'Worker': self.Worker
+        }
+
+
+class JobSlot(db.Model):
+    __tablename__ = 'job_slots'
+
+    # One row per allowed concurrent job of a type; a job runs only while it
+    # holds one, so the limit holds across every worker process
+    JobType = db.Column(db.String(50), primary_key=True)
+    Slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    JobID = db.Column(db.Integer, nullable=True)
+
+
+class BookSimilarity(db.Model):
+    __tablename__ = 'book_similarities'
+
+    BookID = db.Column(db.Integer, primary_key=True)
+    Rank = db.Column(db.Integer, primary_key=True)
+    SimilarBookID = db.Column(db.Integer, nullable=False)
+    Score = db.Column(db.Float, nullable=False)
+
+
+class MemberRecommendation(db.Model):
+    __tablename__ = 'member_recommendations'
+
+    MemberID = db.Column(db.Integer, primary_key=True)
+    Rank = db.Column(db.Integer, primary_key=True)
+    BookID = db.Column(db.Integer, nullable=False)
+    Score = db.Column(db.Float, nullable=False)
+
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+
+    TombstoneID = db.Column(db.Integer, primary_key=True)
+    EntityType = db.Column(db.String(30), nullable=False)
+    EntityID = db.Column(db.Integer, nullable=False)
+    DeletedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tombstones_entity_deleted', 'EntityType', 'DeletedAt'),
+    )
+
+
+class StreamEvent(db.Model):
+    __tablename__ = 'stream_events'
+
+    # Short-lived relay rows used to fan live updates out across worker processes
+    StreamEventID = db.Column(db.Integer, primary_key=True)
+    EventType = db.Column(db.String(30), nullable=False)
+    Payload = db.Column(db.Text, nullable=False)
+    CreatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
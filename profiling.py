@@ -0,0 +1,307 @@
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-ID'
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+# Statements longer than this are cut in the SQL timeline
+MAX_STATEMENT_LENGTH = 500
+
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval.
+
+    Statistical rather than cProfile's deterministic tracing: overhead
+    stays flat however many functions the request calls, and the samples
+    keep whole stacks, which flame graphs need.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []
+        self.weights = []
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfile:
+    """Stack samples and SQL statements recorded for one request."""
+
+    def __init__(self, interval: float):
+        self.id = uuid.uuid4().hex
+        self.method = request.method
+        self.path = request.full_path.rstrip('?')
+        self.created_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.sql = []
+        self.sampler = Sampler(threading.get_ident(), interval)
+        self.sampler.start()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def record_sql(self, statement: str, started: float, finished: float) -> None:
+        self.sql.append({
+            'start_ms': round((started - self.started) * 1000, 3),
+            'duration_ms': round((finished - started) * 1000, 3),
+            'statement': statement[:MAX_STATEMENT_LENGTH]
+        })
+
+    def finish(self, status: Optional[int]) -> Dict[str, Any]:
+        self.sampler.stop()
+        duration = self.elapsed_ms()
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': status,
+            'created_at': self.created_at.isoformat(),
+            'duration_ms': round(duration, 3),
+            'sql_count': len(self.sql),
+            'sql_ms': round(sum(entry['duration_ms'] for entry in self.sql), 3),
+            'sql': self.sql,
+            'speedscope': self._speedscope(duration)
+        }
+
+    def _speedscope(self, duration: float) -> Dict[str, Any]:
+        frames = []
+        frame_index = {}
+
+        def index(key) -> int:
+            if key not in frame_index:
+                name, path, line = key
+                frame_index[key] = len(frames)
+                frames.append({'name': name, 'file': path, 'line': line})
+            return frame_index[key]
+
+        samples = [[index(key) for key in stack] for stack in self.sampler.samples]
+
+        # SQL statements as a second, evented profile on the same clock
+        sql_events = []
+        for entry in self.sql:
+            frame = index((entry['statement'].split('\n')[0][:80], 'SQL', 0))
+            sql_events.append({'type': 'O', 'frame': frame, 'at': entry['start_ms']})
+            sql_events.append({'type': 'C', 'frame': frame, 'at': entry['start_ms'] + entry['duration_ms']})
+
+        title = f'{self.method} {self.path}'
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': title,
+            'exporter': 'library profiler',
+            'shared': {'frames': frames},
+            'profiles': [
+                {'type': 'sampled', 'name': f'{title} (Python)', 'unit': 'milliseconds',
+                 'startValue': 0, 'endValue': duration,
+                 'samples': samples, 'weights': self.sampler.weights},
+                {'type': 'evented', 'name': f'{title} (SQL)', 'unit': 'milliseconds',
+                 'startValue': 0, 'endValue': duration, 'events': sql_events},
+            ]
+        }
+
+
+class ProfileStore:
+    """Finished profiles as JSON files in one directory, newest `keep` kept.
+
+    Files rather than memory so that any worker can serve a profile that
+    another worker recorded.
+    """
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f'{profile_id}.json')
+
+    def save(self, profile: Dict[str, Any]) -> None:
+        path = self._path(profile['id'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(profile, f)
+        os.replace(path + '.tmp', path)
+        self._prune()
+
+    def _files(self) -> List[str]:
+        """Profile files, newest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                # Pruned by another worker meanwhile
+                continue
+        return [path for _, path in sorted(entries, reverse=True)]
+
+    def _prune(self) -> None:
+        for path in self._files()[self.keep:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        summaries = []
+        for path in self._files():
+            try:
+                with open(path) as f:
+                    profile = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            summaries.append({key: value for key, value in profile.items() if key not in ('sql', 'speedscope')})
+        return summaries
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('profile') is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('profile') is not None and conn.info.get('profile_started'):
+        g.profile.record_sql(statement, conn.info['profile_started'].pop(), time.perf_counter())
+
+
+class Profiler:
+    """Opt-in per-request profiling: stack samples plus a SQL timeline.
+
+    A request is profiled when its X-Profile header carries PROFILE_SECRET
+    or it is picked by PROFILE_SAMPLE_RATE. Its response gets an
+    X-Profile-ID header; /api/profiles/<id> serves the profile as a
+    speedscope file (https://www.speedscope.app) with Python stacks and
+    SQL statements on one timeline, and /api/profiles/<id>/sql the
+    statements alone. The /api/profiles endpoints also require the secret
+    in X-Profile: profiles hold request paths and SQL. Without a
+    PROFILE_SECRET, only sampling records profiles and none are served.
+
+    Configuration:
+        PROFILING_ENABLED     default False; nothing is profiled or served
+                              unless set
+        PROFILE_SECRET        value the X-Profile header must carry, both
+                              to profile a request and to read profiles
+        PROFILE_SAMPLE_RATE   fraction of requests profiled without the
+                              header (default 0)
+        PROFILE_INTERVAL      seconds between stack samples (default 0.001)
+        PROFILE_DIR           where profiles are kept (default a
+                              library-profiles directory under the system
+                              temp directory)
+        PROFILE_KEEP          how many profiles to keep (default 100)
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.secret = app.config.get('PROFILE_SECRET')
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.interval = app.config.get('PROFILE_INTERVAL', 0.001)
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            return
+        self.store = ProfileStore(
+            app.config.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'library-profiles')),
+            app.config.get('PROFILE_KEEP', 100)
+        )
+        app.before_request(self._start)
+        app.after_request(self._tag)
+        app.teardown_request(self._finish)
+
+    def authorized(self) -> bool:
+        """Whether the request's X-Profile header carries PROFILE_SECRET."""
+        header = request.headers.get(PROFILE_HEADER)
+        return bool(self.secret) and header is not None and hmac.compare_digest(header, self.secret)
+
+    def _wanted(self) -> bool:
+        if request.endpoint in (None, 'static') or request.path.startswith('/api/profiles'):
+            return False
+        if request.headers.get(PROFILE_HEADER) is not None:
+            return self.authorized()
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        if self._wanted():
+            g.profile = RequestProfile(self.interval)
+        return None
+
+    def _tag(self, response):
+        profile = g.get('profile')
+        if profile is not None:
+            if response.mimetype == 'text/event-stream':
+                # Profiling an event stream would hold the sampler open until the client
+                # leaves. Streamed JSON lists are profiled up to their first batch.
+                g.profile = None
+                profile.sampler.stop()
+                return response
+            response.headers[PROFILE_ID_HEADER] = profile.id
+            g.profile_status = response.status_code
+        return response
+
+    def _finish(self, exc=None) -> None:
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        try:
+            self.store.save(profile.finish(g.pop('profile_status', 500)))
+        except Exception as e:
+            logger.error(f"Error saving profile {profile.id}: {str(e)}")
+
+
+profiler = Profiler()
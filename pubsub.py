@@ -0,0 +1,216 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, Optional
+from sqlalchemy import event, func
+from models import db, Book, StreamEvent
+from replicas import RoutingSession
+import duedates
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+
+
+class Broker:
+    """In-process fan-out: every subscriber gets its own bounded queue.
+
+    A slow client never blocks publishers; when its queue is full the
+    oldest event is dropped.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxsize: int = 100) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(message)
+
+
+class StreamHub:
+    """Live update events for the /api/events SSE stream.
+
+    Routes call queue() while they work; the events are published only
+    once the surrounding transaction commits, and dropped on rollback.
+
+    Configuration:
+        EVENT_BACKEND            'local' (default) publishes straight to this
+                                 process's subscribers. 'database' writes each
+                                 event to stream_events, and a relay thread in
+                                 every worker polls it, so all workers see all
+                                 events. It stands in for a shared broker.
+        EVENT_POLL_INTERVAL      seconds between relay polls (default 0.5)
+        EVENT_OVERDUE_INTERVAL   seconds between overdue count checks while
+                                 anyone is listening (default 60)
+        EVENT_MAX_STREAMS        open streams allowed per process; further
+                                 clients get a 503 (default unlimited). Each
+                                 stream holds a thread on threaded servers,
+                                 so gunicorn.conf.py caps it for gthread.
+
+    With more than one worker process the 'local' backend only reaches
+    clients of the worker that handled the write; gunicorn.conf.py
+    defaults to 'database' in that case.
+    """
+
+    def __init__(self, app=None):
+        self.broker = Broker()
+        self.app = None
+        self._ids = itertools.count(1)
+        self._relay = None
+        self._relay_lock = threading.Lock()
+        self._last_overdue = None
+        self._streams = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.backend = app.config.get('EVENT_BACKEND', 'local')
+        self.poll_interval = app.config.get('EVENT_POLL_INTERVAL', 0.5)
+        self.overdue_interval = app.config.get('EVENT_OVERDUE_INTERVAL', 60)
+        max_streams = app.config.get('EVENT_MAX_STREAMS')
+        self._streams = threading.BoundedSemaphore(max_streams) if max_streams is not None else None
+        app.extensions['stream_hub'] = self
+
+    def queue(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Publish an event when the current transaction commits."""
+        if self.backend == 'database':
+            db.session.add(StreamEvent(EventType=event_type, Payload=json.dumps(data, default=str)))
+        else:
+            db.session.info.setdefault('stream_events', []).append((event_type, data))
+
+    def availability_changed(self, book: Book) -> None:
+        self.queue('availability', {'BookID': book.BookID, 'Quantity': book.Quantity})
+
+    def stats_changed(self, **deltas: int) -> None:
+        """Queue changes to the dashboard counters, e.g. total_books=-1."""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if deltas:
+            self.queue('stats', deltas)
+
+    def publish(self, event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> None:
+        self.broker.publish({'id': event_id or next(self._ids), 'event': event_type, 'data': data})
+
+    # ================ Relay ================
+
+    def _ensure_relay(self) -> None:
+        with self._relay_lock:
+            if self._relay is None or not self._relay.is_alive():
+                self._relay = threading.Thread(target=self._relay_loop, name='stream-relay', daemon=True)
+                self._relay.start()
+
+    def _relay_loop(self) -> None:
+        with self.app.app_context():
+            last_id = None
+            last_overdue_check = 0.0
+            last_prune = time.monotonic()
+            while True:
+                try:
+                    if self.backend == 'database':
+                        last_id = self._relay_new_events(last_id)
+                        if time.monotonic() - last_prune > 600:
+                            self._prune()
+                            last_prune = time.monotonic()
+                    if self.broker.subscriber_count and time.monotonic() - last_overdue_check >= self.overdue_interval:
+                        self._check_overdue()
+                        last_overdue_check = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Stream relay error: {str(e)}")
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
+
+    def _relay_new_events(self, last_id: Optional[int]) -> int:
+        if last_id is None:
+            return db.session.query(func.max(StreamEvent.StreamEventID)).scalar() or 0
+        rows = db.session.query(
+            StreamEvent.StreamEventID, StreamEvent.EventType, StreamEvent.Payload
+        ).filter(StreamEvent.StreamEventID > last_id).order_by(StreamEvent.StreamEventID).all()
+        for event_id, event_type, payload in rows:
+            self.publish(event_type, json.loads(payload), event_id)
+            last_id = event_id
+        return last_id
+
+    def _prune(self) -> None:
+        StreamEvent.query.filter(
+            StreamEvent.CreatedAt < datetime.utcnow() - timedelta(minutes=10)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def _check_overdue(self) -> None:
+        # Loans become overdue as the date changes, not when anything commits
+        overdue = duedates.count_overdue()
+        if overdue != self._last_overdue:
+            self._last_overdue = overdue
+            self.publish('overdue', {'overdue_borrowings': overdue})
+
+    # ================ Streaming ================
+
+    def open_stream(self) -> bool:
+        """Reserve one of this process's stream slots; False when all are taken.
+
+        Pair with close_stream() once the response is closed.
+        """
+        return self._streams is None or self._streams.acquire(blocking=False)
+
+    def close_stream(self) -> None:
+        if self._streams is not None:
+            self._streams.release()
+
+    def stream(self) -> Iterator[str]:
+        """Yield server-sent events for one client until it disconnects."""
+        subscriber = self.broker.subscribe()
+        self._ensure_relay()
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    message = subscriber.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"id: {message['id']}\nevent: {message['event']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+        finally:
+            self.broker.unsubscribe(subscriber)
+
+
+stream_hub = StreamHub()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _publish_committed(session) -> None:
+    for event_type, data in session.info.pop('stream_events', []):
+        stream_hub.publish(event_type, data)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_rolled_back(session) -> None:
+    session.info.pop('stream_events', None)
@@ -0,0 +1,183 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from flask import current_app, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Route classes
+DEFAULT = 'default'
+EXPENSIVE = 'expensive'
+CIRCULATION = 'circulation'
+
+# (tokens per second, burst) per client and route class
+DEFAULT_LIMITS = {
+    DEFAULT: (20.0, 40),
+    EXPENSIVE: (0.5, 5),
+}
+
+# In-process buckets kept at most; the least recently used go first
+MAX_MEMORY_KEYS = 10000
+
+
+def route_class(name: str) -> Callable:
+    """Assign a view to a rate limiting class.
+
+    Views default to DEFAULT. EXPENSIVE views get a tighter budget and a
+    per-process concurrency cap; CIRCULATION views (checkouts, returns,
+    fines) are always admitted.
+    """
+    def decorator(view):
+        view.rate_limit_class = name
+        return view
+    return decorator
+
+
+class MemoryStorage:
+    """Token buckets in this process.
+
+    Buckets are kept in least recently used order. Each take() drops the
+    oldest buckets that have refilled by then (a dropped bucket reads as
+    full, so nothing changes for its client), and past MAX_MEMORY_KEYS
+    evicts the least recently used ones outright. Both are constant work
+    per call on average, rather than a scan of every key.
+    """
+
+    def __init__(self, max_keys: int = MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        # key -> (tokens, updated, full_at)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+        with self._lock:
+            tokens, updated, _ = self._buckets.pop(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            self._expire(now)
+            return wait
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            oldest = next(iter(self._buckets.values()))
+            if oldest[2] > now and len(self._buckets) <= self.max_keys:
+                return
+            self._buckets.popitem(last=False)
+
+
+class RedisStorage:
+    """Token buckets shared by every worker through Redis."""
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        return float(self._take(keys=[f'ratelimit:{key}'], args=[rate, burst, now]))
+
+
+class RateLimiter:
+    """Per-client token buckets and a concurrency cap for expensive routes.
+
+    Configuration:
+        RATE_LIMIT_ENABLED         default True
+        RATE_LIMITS                {route class: (tokens per second, burst)}
+        RATE_LIMIT_STORAGE_URL     redis:// URL to share buckets between
+                                   workers; in-process buckets otherwise
+        EXPENSIVE_MAX_CONCURRENT   expensive requests running at once per
+                                   process (default 2)
+        EXPENSIVE_QUEUE_TIMEOUT    seconds an expensive request may wait for
+                                   a slot before being shed (default 2)
+
+    Clients are identified by remote address; put the app behind
+    werkzeug's ProxyFix when it runs behind a reverse proxy.
+    """
+
+    def __init__(self, app=None):
+        self.storage = MemoryStorage()
+        self.limits = dict(DEFAULT_LIMITS)
+        self.enabled = True
+        self._slots = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.limits = {**DEFAULT_LIMITS, **app.config.get('RATE_LIMITS', {})}
+        storage_url = app.config.get('RATE_LIMIT_STORAGE_URL')
+        self.storage = RedisStorage(storage_url) if storage_url else MemoryStorage()
+        self.queue_timeout = app.config.get('EXPENSIVE_QUEUE_TIMEOUT', 2.0)
+        self._slots = {EXPENSIVE: threading.BoundedSemaphore(app.config.get('EXPENSIVE_MAX_CONCURRENT', 2))}
+        app.extensions['rate_limiter'] = self
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    def _route_class(self) -> Optional[str]:
+        if request.endpoint is None or request.endpoint == 'static':
+            return None
+        view = current_app.view_functions.get(request.endpoint)
+        return getattr(view, 'rate_limit_class', DEFAULT)
+
+    def _admit(self):
+        if not self.enabled:
+            return None
+        name = self._route_class()
+        if name is None or name == CIRCULATION:
+            return None
+
+        rate, burst = self.limits[name]
+        wait = self.storage.take(f'{name}:{request.remote_addr}', rate, burst, time.time())
+        if wait:
+            return self._reject(wait, "Too many requests")
+
+        slots = self._slots.get(name)
+        if slots is not None:
+            if not slots.acquire(timeout=self.queue_timeout):
+                logger.warning(f"Shedding {request.endpoint}: all {name} slots busy")
+                return self._reject(self.queue_timeout or 1, "Server busy, try again shortly")
+            g.rate_limit_slot = slots
+        return None
+
+    def _release(self, exc=None) -> None:
+        slots = g.pop('rate_limit_slot', None)
+        if slots is not None:
+            slots.release()
+
+    @staticmethod
+    def _reject(retry_after: float, message: str):
+        response = jsonify({"error": message})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+
+rate_limiter = RateLimiter()
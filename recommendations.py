@@ -0,0 +1,146 @@
+import heapq
+import logging
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from models import db, Book, Borrowing, BorrowingArchive, BookSimilarity, MemberRecommendation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 10
+
+# Members with very large histories add quadratically many pairs but carry
+# little signal; their baskets are capped at this many books.
+MAX_BASKET_SIZE = 200
+
+
+def iter_baskets(batch_size: int = 5000) -> Iterable[Tuple[int, List[int]]]:
+    """Stream (MemberID, [BookID, ...]) baskets from current and archived
+    Borrowings, one member at a time."""
+    current = db.session.query(
+        Borrowing.MemberID, Borrowing.BookID
+    ).filter(
+        Borrowing.MemberID.isnot(None), Borrowing.BookID.isnot(None)
+    )
+    archived = db.session.query(
+        BorrowingArchive.MemberID, BorrowingArchive.BookID
+    ).filter(
+        BorrowingArchive.MemberID.isnot(None), BorrowingArchive.BookID.isnot(None)
+    )
+    # UNION also removes duplicate pairs
+    rows = current.union(archived).order_by(Borrowing.MemberID, Borrowing.BookID).yield_per(batch_size)
+
+    current_member = None
+    basket = []
+    for member_id, book_id in rows:
+        if member_id != current_member:
+            if basket:
+                yield current_member, basket
+            current_member, basket = member_id, []
+        basket.append(book_id)
+    if basket:
+        yield current_member, basket
+
+
+def compute_similarities(top_k: int = DEFAULT_TOP_K, batch_size: int = 5000) -> Dict[int, List[Tuple[int, float]]]:
+    """Item-item cosine similarity from member/book co-occurrence.
+
+    The co-occurrence matrix is kept sparse as a Counter per book, filled in
+    a single streaming pass over the baskets, and only the top K neighbours
+    per book are kept.
+    """
+    book_counts = Counter()
+    co_occurrence = defaultdict(Counter)
+
+    for _, basket in iter_baskets(batch_size):
+        basket = basket[:MAX_BASKET_SIZE]
+        book_counts.update(basket)
+        for i, book_a in enumerate(basket):
+            row = co_occurrence[book_a]
+            for book_b in basket[i + 1:]:
+                row[book_b] += 1
+                co_occurrence[book_b][book_a] += 1
+
+    neighbours = {}
+    for book_id, row in co_occurrence.items():
+        scored = (
+            (other_id, count / math.sqrt(book_counts[book_id] * book_counts[other_id]))
+            for other_id, count in row.items()
+        )
+        neighbours[book_id] = heapq.nlargest(top_k, scored, key=lambda item: (item[1], -item[0]))
+    return neighbours
+
+
+def compute_member_recommendations(neighbours: Dict[int, List[Tuple[int, float]]],
+                                   top_k: int = DEFAULT_TOP_K,
+                                   batch_size: int = 5000) -> Iterable[Tuple[int, List[Tuple[int, float]]]]:
+    """Score unborrowed books for each member by summing neighbour similarities."""
+    for member_id, basket in iter_baskets(batch_size):
+        borrowed = set(basket)
+        scores = Counter()
+        for book_id in basket:
+            for other_id, score in neighbours.get(book_id, ()):
+                if other_id not in borrowed:
+                    scores[other_id] += score
+        if scores:
+            yield member_id, heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def build(top_k: int = DEFAULT_TOP_K, batch_size: int = 5000, progress=None) -> Dict[str, Any]:
+    """Rebuild both recommendation tables from Borrowings in one transaction."""
+    neighbours = compute_similarities(top_k, batch_size)
+    if progress:
+        progress(0.5, f"Computed neighbours for {len(neighbours)} books")
+
+    similarity_rows = [
+        {'BookID': book_id, 'Rank': rank, 'SimilarBookID': other_id, 'Score': score}
+        for book_id, ranked in neighbours.items()
+        for rank, (other_id, score) in enumerate(ranked, start=1)
+    ]
+    recommendation_rows = [
+        {'MemberID': member_id, 'Rank': rank, 'BookID': book_id, 'Score': score}
+        for member_id, ranked in compute_member_recommendations(neighbours, top_k, batch_size)
+        for rank, (book_id, score) in enumerate(ranked, start=1)
+    ]
+
+    db.session.execute(BookSimilarity.__table__.delete())
+    db.session.execute(MemberRecommendation.__table__.delete())
+    if similarity_rows:
+        db.session.execute(BookSimilarity.__table__.insert(), similarity_rows)
+    if recommendation_rows:
+        db.session.execute(MemberRecommendation.__table__.insert(), recommendation_rows)
+    db.session.commit()
+
+    logger.info(f"Built {len(similarity_rows)} book similarities and {len(recommendation_rows)} member recommendations")
+    return {'book_similarities': len(similarity_rows), 'member_recommendations': len(recommendation_rows)}
+
+
+def _book_result(book: Book, score: float) -> Dict[str, Any]:
+    return {
+        'BookID': book.BookID,
+        'Title': book.Title,
+        'Author': book.Author,
+        'Genre': book.Genre,
+        'Quantity': book.Quantity,
+        'Score': round(score, 4)
+    }
+
+
+def get_similar_books(book_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Precomputed neighbours of a book, read with one primary-key range scan."""
+    query = db.session.query(Book, BookSimilarity.Score).join(
+        BookSimilarity, BookSimilarity.SimilarBookID == Book.BookID
+    ).filter(BookSimilarity.BookID == book_id).order_by(BookSimilarity.Rank)
+    if limit:
+        query = query.limit(limit)
+    return [_book_result(book, score) for book, score in query]
+
+
+def get_member_recommendations(member_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Precomputed recommendations for a member, read with one primary-key range scan."""
+    query = db.session.query(Book, MemberRecommendation.Score).join(
+        MemberRecommendation, MemberRecommendation.BookID == Book.BookID
+    ).filter(MemberRecommendation.MemberID == member_id).order_by(MemberRecommendation.Rank)
+    if limit:
+        query = query.limit(limit)
+    return [_book_result(book, score) for book, score in query]
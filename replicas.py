@@ -0,0 +1,247 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+from flask import current_app, g, request, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, exc, text
+
+logger = logging.getLogger(__name__)
+
+
+def primary(view: Callable) -> Callable:
+    """Keep a GET view on the primary.
+
+    For read routes that may also write, such as those creating a member's
+    counter rows on first lookup: what they write is based on what they
+    read, so both must come from the primary.
+    """
+    view.use_primary = True
+    return view
+
+
+def fall_back(error: exc.DBAPIError) -> bool:
+    """Move the rest of a request off its replica after a read there failed.
+
+    Returns whether the failed read should be retried on the primary.
+    """
+    if not has_request_context() or g.get('replica_engine') is None:
+        return False
+    if not (error.connection_invalidated or isinstance(error, exc.OperationalError)):
+        return False
+    logger.warning(f"Read failed on a replica, retrying on the primary: {str(error)}")
+    g.replica_engine = None
+    return True
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica chosen for the current request.
+
+    Flushes, INSERT/UPDATE/DELETE statements, and anything outside a request
+    (CLI commands, background jobs) always go to the primary. Once a request
+    has written, its later reads go to the primary too, so they see the
+    write. A read that fails on the replica is retried on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('replica_engine') is not None:
+            if not self._flushing and not getattr(clause, 'is_dml', False):
+                return g.replica_engine
+            g.replica_engine = None
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _fall_back(self, error: exc.DBAPIError) -> bool:
+        if not fall_back(error):
+            return False
+        # Nothing has been written yet (a write would have moved the request
+        # to the primary), so rolling back only drops the broken connection
+        self.rollback()
+        return True
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except exc.DBAPIError as e:
+            if not self._fall_back(e):
+                raise
+            return super().execute(*args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        try:
+            return super().scalar(*args, **kwargs)
+        except exc.DBAPIError as e:
+            if not self._fall_back(e):
+                raise
+            return super().scalar(*args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        try:
+            return super().scalars(*args, **kwargs)
+        except exc.DBAPIError as e:
+            if not self._fall_back(e):
+                raise
+            return super().scalars(*args, **kwargs)
+
+
+class Replica:
+    """A replica engine plus its last observed health, lag and latency."""
+
+    def __init__(self, url: str, engine):
+        self.url = url
+        self.engine = engine
+        self.latency = None
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def to_dict(self):
+        return {
+            'url': self.name,
+            'latency_ms': round(self.latency * 1000, 2) if self.latency is not None else None,
+            'lag_seconds': self.lag,
+            'down': self.down_until > time.monotonic()
+        }
+
+
+# Replication lag in seconds, per dialect; dialects without replication report none
+LAG_QUERIES = {
+    'postgresql': "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)",
+}
+
+
+class ReplicaRouter:
+    """Route read-only API requests to read replicas.
+
+    Configuration:
+        SQLALCHEMY_REPLICA_URIS  list of replica database URLs
+        REPLICA_STRATEGY         'round_robin' (default) or 'least_latency'
+        REPLICA_MAX_LAG          seconds of lag before a replica is skipped (default 5)
+        REPLICA_CHECK_INTERVAL   seconds between health checks per replica (default 10)
+        REPLICA_RETRY_AFTER      seconds a failed replica is skipped (default 30)
+        REPLICA_STICKY_SECONDS   after a write, reads from the same session stay
+                                 on the primary for this long (default 5)
+
+    Two local SQLite files are enough to try it out: point DATABASE_URL at
+    one and DATABASE_REPLICA_URLS at a copy of it.
+    """
+
+    def __init__(self, app=None):
+        self.replicas: List[Replica] = []
+        self._cycle = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.strategy = app.config.get('REPLICA_STRATEGY', 'round_robin')
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', 5)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        self.retry_after = app.config.get('REPLICA_RETRY_AFTER', 30)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+        engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self.replicas = []
+        for url in app.config.get('SQLALCHEMY_REPLICA_URIS', []):
+            replica = Replica(url, create_engine(url, **engine_options))
+            event.listen(replica.engine, 'handle_error', self._make_error_listener(replica))
+            self.replicas.append(replica)
+        self._cycle = itertools.cycle(self.replicas)
+
+        app.extensions['replica_router'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _make_error_listener(self, replica: Replica):
+        def on_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+                self.mark_down(replica)
+        return on_error
+
+    def mark_down(self, replica: Replica) -> None:
+        logger.warning(f"Replica {replica.name} failed; routing reads to the primary")
+        replica.down_until = time.monotonic() + self.retry_after
+
+    def is_read_only(self) -> bool:
+        if request.method != 'GET' or not request.path.startswith('/api/'):
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        return not getattr(view, 'use_primary', False)
+
+    def _recently_wrote(self) -> bool:
+        last_write = session.get('last_write_at')
+        return last_write is not None and time.time() - last_write < self.sticky_seconds
+
+    def _healthy(self, replica: Replica) -> bool:
+        return replica.down_until <= time.monotonic() and (replica.lag or 0) <= self.max_lag
+
+    def _due_for_check(self) -> List[Replica]:
+        # Stamped under the lock so concurrent requests don't check the same
+        # replica; the checks themselves run outside it
+        now = time.monotonic()
+        with self._lock:
+            due = [replica for replica in self.replicas
+                   if replica.down_until <= now and now - replica.checked_at >= self.check_interval]
+            for replica in due:
+                replica.checked_at = now
+        return due
+
+    def _check(self, replica: Replica) -> None:
+        lag_query = LAG_QUERIES.get(replica.engine.dialect.name, 'SELECT 0')
+        try:
+            started = time.perf_counter()
+            with replica.engine.connect() as conn:
+                lag = conn.execute(text(lag_query)).scalar()
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            logger.warning(f"Replica health check failed for {replica.name}: {str(e)}")
+            self.mark_down(replica)
+            return
+
+        replica.lag = float(lag or 0)
+        # Exponentially weighted so one slow check doesn't flip the choice
+        replica.latency = elapsed if replica.latency is None else 0.8 * replica.latency + 0.2 * elapsed
+
+    def choose(self) -> Optional[Replica]:
+        """Pick a healthy replica, or None to use the primary."""
+        for replica in self._due_for_check():
+            self._check(replica)
+        with self._lock:
+            if self.strategy == 'least_latency':
+                healthy = [replica for replica in self.replicas if self._healthy(replica)]
+                return min(healthy, key=lambda replica: replica.latency or 0) if healthy else None
+
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if self._healthy(replica):
+                    return replica
+        return None
+
+    def _before_request(self):
+        g.replica_engine = None
+        # pinned_to_primary: set by /api/batch for sub-requests after a write,
+        # whose last_write_at lands on a session that is never saved
+        if (not self.replicas or not self.is_read_only() or self._recently_wrote()
+                or g.get('pinned_to_primary')):
+            return
+        replica = self.choose()
+        if replica is not None:
+            g.replica_engine = replica.engine
+
+    def _after_request(self, response):
+        if not self.replicas:
+            return response
+        if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+            session['last_write_at'] = time.time()
+        response.headers['X-Read-Source'] = 'replica' if g.get('replica_engine') is not None else 'primary'
+        return response
+
+    def status(self):
+        return [replica.to_dict() for replica in self.replicas]
+
+
+replica_router = ReplicaRouter()
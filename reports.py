@@ -0,0 +1,261 @@
+import calendar
+import csv
+import logging
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple, TextIO
+from sqlalchemy import create_engine, func, select
+from models import db, Member, MembershipType, Borrowing, Fine, BorrowingArchive, FineArchive
+
+logger = logging.getLogger(__name__)
+
+# Rows per fetch from each worker's server-side cursor
+DEFAULT_CHUNK_SIZE = 5000
+
+# Tasks of each kind per worker, so one slow task doesn't leave the other
+# workers idle at the end
+TASKS_PER_WORKER = 3
+
+# Members carry no end date, so renewals are the ones due if every member
+# renews: billable rather than known to be paid
+COLUMNS = ('Month', 'NewMembers', 'NewMemberFees', 'RenewalsDue', 'RenewalFeesDue',
+           'FinesAssessed', 'FineAmount', 'FinesPaid', 'Revenue')
+
+# Counted per month; amounts in cents so partial sums merge exactly
+COUNTERS = ('new_members', 'new_member_fees', 'renewals', 'renewal_fees',
+            'fines_assessed', 'fine_amount', 'fines_paid')
+
+MEMBERSHIPS = select(Member.MembershipDate, MembershipType.Fee, MembershipType.DurationMonths).join(
+    MembershipType, Member.MembershipTypeID == MembershipType.MembershipTypeID
+).where(Member.MembershipDate.isnot(None))
+
+# Live and archived fines, each dated by its loan's due date (fines have no
+# date of their own)
+FINES = [
+    select(Borrowing.DueDate, Fine.Amount, Fine.Paid).join(Borrowing, Fine.BorrowID == Borrowing.BorrowID),
+    select(BorrowingArchive.DueDate, FineArchive.Amount, FineArchive.Paid).join(
+        BorrowingArchive, FineArchive.BorrowID == BorrowingArchive.BorrowID
+    ),
+]
+
+
+def add_months(day: date, months: int) -> date:
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def month_end(day: date) -> date:
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def months_between(start: date, end: date) -> List[date]:
+    """First days of the months from start's through end's."""
+    months = []
+    month = month_start(start)
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition(start: date, end: date, parts: int) -> List[Tuple[date, date]]:
+    """Split [start, end] into at most `parts` contiguous runs of whole months."""
+    months = months_between(start, end)
+    parts = max(1, min(parts, len(months)))
+    size, extra = divmod(len(months), parts)
+    ranges = []
+    index = 0
+    for i in range(parts):
+        count = size + (1 if i < extra else 0)
+        ranges.append((months[index], month_end(months[index + count - 1])))
+        index += count
+    return ranges
+
+
+def _cents(amount) -> int:
+    return int(round(float(amount or 0) * 100))
+
+
+def _billing_dates(joined: date, duration: Optional[int], start: date, end: date):
+    """Dates in [start, end] a member is billed: joining, then every `duration` months.
+
+    Members carry no end date, so they're taken to renew at the start of
+    every period up to `end`; callers cap `end` at today so periods that
+    haven't started aren't billed.
+    """
+    if not duration or duration <= 0:
+        if start <= joined <= end:
+            yield joined
+        return
+    # Skip straight to the last period starting before the range
+    elapsed = (start.year - joined.year) * 12 + start.month - joined.month
+    period = max(0, elapsed // duration - 1)
+    while True:
+        billed = add_months(joined, period * duration)
+        if billed > end:
+            return
+        if billed >= start:
+            yield billed
+        period += 1
+
+
+def _member_revenue(database_url: str, start: date, end: date, first_id: int, last_id: int,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[date, Dict[str, int]]:
+    """Partial monthly fee aggregates for members first_id..last_id, in a worker process.
+
+    Each worker opens its own engine; rows arrive through a server-side
+    cursor (where the driver has one) a chunk at a time, so no worker
+    holds a whole table.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    query = MEMBERSHIPS.where(Member.MembershipDate <= end, Member.MemberID.between(first_id, last_id))
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                for joined, fee, duration in rows:
+                    fee = _cents(fee)
+                    for billed in _billing_dates(joined, duration, start, end):
+                        month = totals[month_start(billed)]
+                        if billed == joined:
+                            month['new_members'] += 1
+                            month['new_member_fees'] += fee
+                        else:
+                            month['renewals'] += 1
+                            month['renewal_fees'] += fee
+    finally:
+        engine.dispose()
+    return dict(totals)
+
+
+def _fine_revenue(database_url: str, start: date, end: date,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[date, Dict[str, int]]:
+    """Partial monthly fine aggregates for loans due start..end, in a worker process."""
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(yield_per=chunk_size)
+            for fines in FINES:
+                due_date = fines.selected_columns[0]
+                for rows in conn.execute(fines.where(due_date >= start, due_date <= end)).partitions():
+                    for due, amount, paid in rows:
+                        month = totals[month_start(due)]
+                        amount = _cents(amount)
+                        month['fines_assessed'] += 1
+                        month['fine_amount'] += amount
+                        if paid:
+                            month['fines_paid'] += amount
+    finally:
+        engine.dispose()
+    return dict(totals)
+
+
+def _id_ranges(parts: int) -> List[Tuple[int, int]]:
+    """Split the span of member IDs into at most `parts` contiguous ranges."""
+    low, high = db.session.query(func.min(Member.MemberID), func.max(Member.MemberID)).one()
+    if low is None:
+        return []
+    size = -(-(high - low + 1) // parts)
+    return [(first, min(first + size - 1, high)) for first in range(low, high + 1, size)]
+
+
+def _row(month: date, counts: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        'Month': month.strftime('%Y-%m'),
+        'NewMembers': counts['new_members'],
+        'NewMemberFees': counts['new_member_fees'] / 100,
+        'RenewalsDue': counts['renewals'],
+        'RenewalFeesDue': counts['renewal_fees'] / 100,
+        'FinesAssessed': counts['fines_assessed'],
+        'FineAmount': counts['fine_amount'] / 100,
+        'FinesPaid': counts['fines_paid'] / 100,
+        'Revenue': (counts['new_member_fees'] + counts['renewal_fees'] + counts['fines_paid']) / 100
+    }
+
+
+def build_revenue_report(start: date, end: date, workers: Optional[int] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Monthly revenue from membership fees and fines for the months start through end.
+
+    Revenue counts membership fees (on joining and each renewal due) and
+    fines marked paid; fines are dated by their loan's due date. Fees are
+    only counted for periods started by today, so months ahead show
+    none. The work
+    is split into tasks that worker processes aggregate in parallel and
+    the partial results are merged here: fines by runs of months of the
+    report range, fees by ranges of member IDs, so each member's renewals
+    are worked out once however many months a task covers. With workers=1
+    the tasks run one after another in this process.
+    """
+    start, end = month_start(start), month_end(end)
+    if end < start:
+        raise ValueError("Report end is before its start")
+    workers = workers or os.cpu_count() or 1
+    parts = workers * TASKS_PER_WORKER if workers > 1 else 1
+    database_url = db.engine.url.render_as_string(hide_password=False)
+    # Decided once here rather than in each worker, in case the date changes mid-run
+    billed_through = min(end, date.today())
+    tasks = [(_fine_revenue, (database_url, first, last, chunk_size))
+             for first, last in partition(start, end, parts)]
+    tasks += [(_member_revenue, (database_url, start, billed_through, first, last, chunk_size))
+              for first, last in _id_ranges(parts)]
+
+    if workers == 1:
+        partials = [fn(*args) for fn, args in tasks]
+    else:
+        # Spawned, not forked: a fork would copy this process's engine
+        # connections and any lock a background thread holds
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            partials = [future.result() for future in [pool.submit(fn, *args) for fn, args in tasks]]
+
+    merged = {month: dict.fromkeys(COUNTERS, 0) for month in months_between(start, end)}
+    for partial in partials:
+        for month, counts in partial.items():
+            for key, value in counts.items():
+                merged[month][key] += value
+    totals = {key: sum(counts[key] for counts in merged.values()) for key in COUNTERS}
+
+    logger.info(f"Built revenue report for {start:%Y-%m} to {end:%Y-%m} "
+                f"from {len(tasks)} tasks on {workers} workers")
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'months': [_row(month, counts) for month, counts in sorted(merged.items())],
+        'totals': dict(_row(start, totals), Month='Total')
+    }
+
+
+def write_csv(report: Dict[str, Any], out: TextIO) -> None:
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(report['months'])
+    writer.writerow(report['totals'])
+
+
+def format_text(report: Dict[str, Any]) -> str:
+    """The report as a fixed-width plain-text table."""
+    rows = report['months'] + [report['totals']]
+    cells = [[f'{row[column]:.2f}' if isinstance(row[column], float) else str(row[column]) for column in COLUMNS]
+             for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(COLUMNS)]
+
+    def line(values) -> str:
+        return '  '.join(value.ljust(width) if i == 0 else value.rjust(width)
+                         for i, (value, width) in enumerate(zip(values, widths)))
+
+    title = f"Revenue {report['from']} to {report['to']}"
+    body = [line(COLUMNS), line('-' * width for width in widths)]
+    body += [line(values) for values in cells[:-1]]
+    body += [line('-' * width for width in widths), line(cells[-1])]
+    return '\n'.join([title, ''] + body)
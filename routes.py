@@ -0,0 +1,1604 @@
+import logging
+import click
+from flask import Blueprint, Response, request, jsonify, redirect, url_for, g, current_app
+from models import (db, Branch, Publisher, Book, Copy, Member, MembershipType, Staff, Borrowing, Fine, Reservation,
+                    BorrowingArchive, FineArchive, CirculationEvent, Job)
+from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.orm import joinedload
+import circulation
+from branches import current_branch_id, scoped
+import copies
+import duedates
+import analytics
+import archive
+import recommendations
+import reports
+import sync
+from streaming import json_list
+import isbn
+import enrichment
+import limits
+import ledger
+import batch
+import graph
+from jobs import job_queue
+from replicas import replica_router, primary
+from assets import assets, build_bundles
+from pubsub import stream_hub
+from profiling import profiler
+from ratelimit import route_class, EXPENSIVE, CIRCULATION
+
+logger = logging.getLogger(__name__)
+
+# All routes and CLI commands live on this blueprint; create_app() imports
+# this module and registers it, so importing main stays cheap.
+bp = Blueprint('library', __name__, cli_group=None)
+
+@bp.cli.command('assets-build')
+def assets_build_command():
+    """Build the minified per-page JS bundles into static/dist."""
+    manifest = build_bundles(current_app.static_folder)
+    print(f"Built {len(manifest)} bundles")
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create any missing database tables."""
+    db.create_all()
+    print("Database tables created")
+
+@bp.cli.command('isbn-backfill')
+def isbn_backfill_command():
+    """Fill Books.ISBN13 from the free-form ISBNs."""
+    print(isbn.backfill())
+
+@bp.cli.command('member-counters-rebuild')
+def member_counters_rebuild_command():
+    """Recount every member's open loans."""
+    print(limits.rebuild())
+
+@bp.cli.command('fine-ledger-rebuild')
+def fine_ledger_rebuild_command():
+    """Resum every member's fine balance."""
+    print(ledger.rebuild())
+
+@bp.cli.command('copies-migrate')
+def copies_migrate_command():
+    """Create Copies rows from the old Books.Quantity values."""
+    print(copies.migrate_quantities())
+
+def include_archived():
+    """Whether a list or lookup should also read the archive tables (?include_archived=1)."""
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+# ================ Routes ================
+
+# Root route - redirect to dashboard
+@bp.route('/')
+def root():
+    return redirect(url_for('.dashboard'))
+
+# Dashboard route
+@bp.route('/dashboard')
+def dashboard():
+    return assets.render_page('index.html')
+
+# Get dashboard statistics
+@bp.route('/api/dashboard/stats')
+@route_class(EXPENSIVE)
+def get_stats():
+    try:
+        stats = {}
+        branch_id = current_branch_id()
+        
+        # Total books count
+        stats['total_books'] = copies.count_available(branch_id)
+        
+        # Total members count
+        stats['total_members'] = db.session.query(Member).count()
+        
+        # Total borrowings
+        stats['total_borrowings'] = scoped(db.session.query(Borrowing), Borrowing).count()
+        
+        # Overdue borrowings
+        stats['overdue_borrowings'] = duedates.count_overdue(branch_id=branch_id)
+        
+        # Books by genre
+        genre_data = scoped(db.session.query(
+            Book.Genre, 
+            func.count(Book.BookID)
+        ), Book).filter(Book.Genre.isnot(None)).group_by(Book.Genre).all()
+        
+        stats['books_by_genre'] = [
+            {'genre': genre or 'Uncategorized', 'count': count}
+            for genre, count in genre_data
+        ]
+        
+        # Most borrowed books (top 5)
+        top_books_query = scoped(db.session.query(
+            Book.Title,
+            func.count(Borrowing.BorrowID).label('borrow_count')
+        ).join(Borrowing, Book.BookID == Borrowing.BookID), Borrowing
+        ).group_by(Book.Title
+        ).order_by(text('borrow_count DESC')
+        ).limit(5).all()
+        
+        stats['top_books'] = [
+            {'title': title, 'count': count}
+            for title, count in top_books_query
+        ]
+        
+        # Recent borrowings (top 5)
+        recent_borrowings = scoped(db.session.query(Borrowing), Borrowing).order_by(
+            Borrowing.BorrowDate.desc()
+        ).limit(5).all()
+        
+        stats['recent_borrowings'] = [borrowing.to_dict() for borrowing in recent_borrowings]
+        
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error getting dashboard stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Template routes for each entity
+@bp.route('/books')
+def books_page():
+    return assets.render_page('books.html')
+
+@bp.route('/members')
+def members_page():
+    return assets.render_page('members.html')
+
+@bp.route('/publishers')
+def publishers_page():
+    return assets.render_page('publishers.html')
+
+@bp.route('/staff')
+def staff_page():
+    return assets.render_page('staff.html')
+
+@bp.route('/borrowings')
+def borrowings_page():
+    return assets.render_page('borrowings.html')
+
+@bp.route('/fines')
+def fines_page():
+    return assets.render_page('fines.html')
+
+@bp.route('/reservations')
+def reservations_page():
+    return assets.render_page('reservations.html')
+
+@bp.route('/membershiptypes')
+def membership_types_page():
+    return assets.render_page('membershiptypes.html')
+
+# ================ API Endpoints ================
+
+# Delta sync for client-side caches
+@bp.route('/api/<entity>/changes', methods=['GET'])
+def api_get_changes(entity):
+    try:
+        return jsonify(sync.get_changes(entity, request.args.get('since')))
+    except KeyError:
+        return jsonify({"error": "Unknown entity"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching changes for {entity}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Several API calls in one round trip
+@bp.route('/api/batch', methods=['POST'])
+def api_batch():
+    try:
+        data = request.json or {}
+        return jsonify({'responses': batch.run(data.get('requests', []))})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# GraphQL-style queries selecting just the nested fields a client needs
+@bp.route('/api/query', methods=['GET', 'POST'])
+@route_class(EXPENSIVE)
+def api_graph_query():
+    try:
+        source = request.args.get('query') if request.method == 'GET' else (request.json or {}).get('query')
+        if not source:
+            return jsonify({"error": "query is required"}), 400
+        return jsonify(graph.execute(source))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running query: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Publishers
+@bp.route('/api/publishers', methods=['GET'])
+def api_get_publishers():
+    try:
+        return json_list(Publisher.query)
+    except Exception as e:
+        logger.error(f"Error fetching publishers: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/publishers', methods=['POST'])
+def api_add_publisher():
+    try:
+        data = request.json
+        publisher = Publisher(
+            Name=data['Name'], 
+            Address=data.get('Address'),
+            Email=data.get('Email'),
+            Phone=data.get('Phone')
+        )
+        db.session.add(publisher)
+        db.session.commit()
+        return jsonify({"message": "Publisher added successfully", "id": publisher.PublisherID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding publisher: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/publishers/<int:publisher_id>', methods=['PUT'])
+def api_update_publisher(publisher_id):
+    try:
+        data = request.json
+        publisher = Publisher.query.get(publisher_id)
+        if not publisher:
+            return jsonify({"error": "Publisher not found"}), 404
+            
+        publisher.Name = data['Name']
+        publisher.Address = data.get('Address')
+        publisher.Email = data.get('Email')
+        publisher.Phone = data.get('Phone')
+        
+        db.session.commit()
+        return jsonify({"message": "Publisher updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating publisher: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/publishers/<int:publisher_id>', methods=['DELETE'])
+def api_delete_publisher(publisher_id):
+    try:
+        publisher = Publisher.query.get(publisher_id)
+        if not publisher:
+            return jsonify({"error": "Publisher not found"}), 404
+            
+        db.session.delete(publisher)
+        db.session.commit()
+        return jsonify({"message": "Publisher deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting publisher: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Branches
+@bp.route('/api/branches', methods=['GET'])
+def api_get_branches():
+    try:
+        branch_list = Branch.query.order_by(Branch.BranchID).all()
+        return jsonify([branch.to_dict() for branch in branch_list])
+    except Exception as e:
+        logger.error(f"Error fetching branches: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/branches', methods=['POST'])
+def api_add_branch():
+    try:
+        data = request.json
+        branch = Branch(
+            Name=data['Name'],
+            Code=data['Code'],
+            Address=data.get('Address')
+        )
+        db.session.add(branch)
+        db.session.commit()
+        return jsonify({"message": "Branch added successfully", "id": branch.BranchID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding branch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/branches/<int:branch_id>', methods=['PUT'])
+def api_update_branch(branch_id):
+    try:
+        data = request.json
+        branch = Branch.query.get(branch_id)
+        if not branch:
+            return jsonify({"error": "Branch not found"}), 404
+
+        branch.Name = data['Name']
+        branch.Code = data['Code']
+        branch.Address = data.get('Address')
+
+        db.session.commit()
+        return jsonify({"message": "Branch updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating branch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/branches/<int:branch_id>', methods=['DELETE'])
+def api_delete_branch(branch_id):
+    try:
+        branch = Branch.query.get(branch_id)
+        if not branch:
+            return jsonify({"error": "Branch not found"}), 404
+
+        db.session.delete(branch)
+        db.session.commit()
+        return jsonify({"message": "Branch deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting branch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Books
+@bp.route('/api/books', methods=['GET'])
+def api_get_books():
+    try:
+        return json_list(scoped(Book.query, Book).options(joinedload(Book.publisher)))
+    except Exception as e:
+        logger.error(f"Error fetching books: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Desk scanner lookup: any ISBN-10/13 spelling, answered from the ISBN13 index
+@bp.route('/api/books/by-isbn/<isbn_value>', methods=['GET'])
+@route_class(CIRCULATION)
+def api_get_book_by_isbn(isbn_value):
+    try:
+        book = isbn.lookup(isbn.normalize(isbn_value), current_branch_id())
+        if not book:
+            return jsonify({"error": "Book not found"}), 404
+        return jsonify(book)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error looking up ISBN {isbn_value}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/books/<int:book_id>', methods=['GET'])
+def api_get_book(book_id):
+    try:
+        book = Book.query.get(book_id)
+        if not book:
+            return jsonify({"error": "Book not found"}), 404
+        return jsonify(book.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching book: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _count(value):
+    """A required count from a request, such as a book's Quantity."""
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"Invalid count: {value!r}")
+    return value
+
+@bp.route('/api/books', methods=['POST'])
+def api_add_book():
+    try:
+        data = request.json
+        quantity = _count(data['Quantity'])
+        book = Book(
+            Title=data['Title'],
+            Author=data['Author'],
+            ISBN=data['ISBN'],
+            ISBN13=isbn.normalize(data['ISBN']),
+            Genre=data.get('Genre'),
+            PublishedYear=data.get('PublishedYear'),
+            PublisherID=data.get('PublisherID'),
+            BranchID=data.get('BranchID', current_branch_id())
+        )
+        db.session.add(book)
+        copies.add_copies(book, quantity, data.get('Location'))
+        circulation.record_stock_change(book, quantity)
+        stream_hub.availability_changed(book)
+        stream_hub.stats_changed(total_books=quantity)
+        db.session.commit()
+        # Missing genre, year or publisher are looked up by a background job
+        if enrichment.wanted(book):
+            enrichment.schedule(book.BookID)
+        return jsonify({"message": "Book added successfully", "id": book.BookID})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding book: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/books/<int:book_id>', methods=['PUT'])
+def api_update_book(book_id):
+    try:
+        data = request.json
+        book = Book.query.get(book_id)
+        if not book:
+            return jsonify({"error": "Book not found"}), 404
+            
+        book.Title = data['Title']
+        book.Author = data['Author']
+        # Only a changed ISBN is validated; legacy books keep a bad-checksum
+        # ISBN with ISBN13 left NULL, as the backfill leaves them
+        if data['ISBN'] != book.ISBN:
+            book.ISBN13 = isbn.normalize(data['ISBN'])
+        else:
+            book.ISBN13 = isbn.try_normalize(data['ISBN'])
+        book.ISBN = data['ISBN']
+        book.Genre = data.get('Genre')
+        book.PublishedYear = data.get('PublishedYear')
+        book.PublisherID = data.get('PublisherID')
+        book.BranchID = data.get('BranchID', book.BranchID)
+        # Quantity is the number of available copies
+        delta = _count(data['Quantity']) - book.Quantity
+        if delta > 0:
+            copies.add_copies(book, delta, data.get('Location'))
+        elif delta < 0:
+            # Copies taken out on loan meanwhile can't be withdrawn
+            delta = -copies.withdraw_copies(book, -delta)
+        circulation.record_stock_change(book, delta)
+        stream_hub.stats_changed(total_books=delta)
+        stream_hub.availability_changed(book)
+        
+        db.session.commit()
+        return jsonify({"message": "Book updated successfully"})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating book: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/books/<int:book_id>', methods=['DELETE'])
+def api_delete_book(book_id):
+    try:
+        book = Book.query.get(book_id)
+        if not book:
+            return jsonify({"error": "Book not found"}), 404
+            
+        stream_hub.stats_changed(total_books=-book.Quantity)
+        stream_hub.queue('availability', {'BookID': book.BookID, 'Quantity': None})
+        circulation.record_removal(book)
+        db.session.delete(book)
+        db.session.commit()
+        return jsonify({"message": "Book deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting book: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def find_duplicate_books(progress=None):
+    """Find books with the same title and author, grouped together."""
+    duplicate_books = db.session.query(
+        Book.Title, Book.Author, func.count(Book.BookID).label('count')
+    ).group_by(Book.Title, Book.Author
+    ).having(func.count(Book.BookID) > 1).all()
+    
+    results = []
+    
+    for index, (title, author, count) in enumerate(duplicate_books):
+        books = Book.query.filter_by(Title=title, Author=author).all()
+        books_data = [book.to_dict() for book in books]
+        results.append({
+            'title': title,
+            'author': author,
+            'count': count,
+            'books': books_data
+        })
+        if progress:
+            progress((index + 1) / len(duplicate_books), f"Checked {index + 1} of {len(duplicate_books)} groups")
+        
+    return results
+
+@bp.route('/api/books/duplicates', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_get_duplicate_books():
+    try:
+        return jsonify(find_duplicate_books())
+    except Exception as e:
+        logger.error(f"Error finding duplicate books: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/books/<int:book_id>/similar', methods=['GET'])
+def api_get_similar_books(book_id):
+    try:
+        limit = request.args.get('limit', type=int)
+        return jsonify(recommendations.get_similar_books(book_id, limit))
+    except Exception as e:
+        logger.error(f"Error fetching similar books: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for individual copies
+@bp.route('/api/books/<int:book_id>/copies', methods=['GET'])
+def api_get_book_copies(book_id):
+    try:
+        book_copies = scoped(Copy.query.filter_by(BookID=book_id), Copy).order_by(Copy.CopyID).all()
+        return jsonify([copy.to_dict() for copy in book_copies])
+    except Exception as e:
+        logger.error(f"Error fetching copies: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/copies/<int:copy_id>', methods=['PUT'])
+def api_update_copy(copy_id):
+    try:
+        data = request.json
+        copy = Copy.query.get(copy_id)
+        if not copy:
+            return jsonify({"error": "Copy not found"}), 404
+
+        # Loans move copies on and off loan; this only marks them lost, withdrawn or back on the shelf
+        status = data.get('Status', copy.Status)
+        if status not in copies.STATUSES or (status == copies.ON_LOAN) != (copy.Status == copies.ON_LOAN):
+            return jsonify({"error": f"Cannot change copy status from {copy.Status} to {status}"}), 400
+
+        delta = int(status == copies.AVAILABLE) - int(copy.Status == copies.AVAILABLE)
+        copy.Status = status
+        copy.Location = data.get('Location', copy.Location)
+        if delta:
+            book = copy.book
+            circulation.record_stock_change(book, delta)
+            db.session.flush()
+            db.session.expire(book, ['Quantity'])
+            stream_hub.availability_changed(book)
+            stream_hub.stats_changed(total_books=delta)
+
+        db.session.commit()
+        return jsonify({"message": "Copy updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating copy: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Members
+@bp.route('/api/members', methods=['GET'])
+def api_get_members():
+    try:
+        return json_list(Member.query.options(joinedload(Member.membership_type)))
+    except Exception as e:
+        logger.error(f"Error fetching members: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>', methods=['GET'])
+def api_get_member(member_id):
+    try:
+        member = Member.query.get(member_id)
+        if not member:
+            return jsonify({"error": "Member not found"}), 404
+        return jsonify(member.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members', methods=['POST'])
+def api_add_member():
+    try:
+        data = request.json
+        
+        # Handle date conversion
+        membership_date = None
+        if data.get('MembershipDate'):
+            membership_date = datetime.strptime(data['MembershipDate'], '%Y-%m-%d').date()
+            
+        member = Member(
+            Name=data['Name'],
+            Email=data['Email'],
+            Phone=data['Phone'],
+            Address=data.get('Address'),
+            MembershipTypeID=data.get('MembershipTypeID'),
+            MembershipDate=membership_date
+        )
+        db.session.add(member)
+        stream_hub.stats_changed(total_members=1)
+        db.session.commit()
+        return jsonify({"message": "Member added successfully", "id": member.MemberID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>', methods=['PUT'])
+def api_update_member(member_id):
+    try:
+        data = request.json
+        member = Member.query.get(member_id)
+        if not member:
+            return jsonify({"error": "Member not found"}), 404
+            
+        # Handle date conversion
+        membership_date = None
+        if data.get('MembershipDate'):
+            membership_date = datetime.strptime(data['MembershipDate'], '%Y-%m-%d').date()
+            
+        member.Name = data['Name']
+        member.Email = data['Email']
+        member.Phone = data['Phone']
+        member.Address = data.get('Address')
+        member.MembershipTypeID = data.get('MembershipTypeID')
+        member.MembershipDate = membership_date
+        
+        db.session.commit()
+        return jsonify({"message": "Member updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>', methods=['DELETE'])
+def api_delete_member(member_id):
+    try:
+        member = Member.query.get(member_id)
+        if not member:
+            return jsonify({"error": "Member not found"}), 404
+            
+        db.session.delete(member)
+        stream_hub.stats_changed(total_members=-1)
+        db.session.commit()
+        return jsonify({"message": "Member deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>/recommendations', methods=['GET'])
+def api_get_member_recommendations(member_id):
+    try:
+        limit = request.args.get('limit', type=int)
+        return jsonify(recommendations.get_member_recommendations(member_id, limit))
+    except Exception as e:
+        logger.error(f"Error fetching member recommendations: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>/limits', methods=['GET'])
+@primary
+def api_get_member_limits(member_id):
+    try:
+        counters = limits.get_counters(member_id)
+        if counters is None:
+            return jsonify({"error": "Member not found"}), 404
+        # get_counters() may have created the member's counter row
+        db.session.commit()
+        return jsonify(counters)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error fetching member limits: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/members/<int:member_id>/balance', methods=['GET'])
+@primary
+def api_get_member_balance(member_id):
+    try:
+        balance = ledger.get_balance(member_id)
+        if balance is None:
+            return jsonify({"error": "Member not found"}), 404
+        # get_balance() may have created the member's balance row
+        db.session.commit()
+        return jsonify(balance)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error fetching member balance: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Membership Types
+@bp.route('/api/membershiptypes', methods=['GET'])
+def api_get_membership_types():
+    try:
+        membership_types = MembershipType.query.all()
+        return jsonify([membership_type.to_dict() for membership_type in membership_types])
+    except Exception as e:
+        logger.error(f"Error fetching membership types: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/membershiptypes/<int:type_id>', methods=['GET'])
+def api_get_membership_type(type_id):
+    try:
+        membership_type = MembershipType.query.get(type_id)
+        if not membership_type:
+            return jsonify({"error": "Membership type not found"}), 404
+        return jsonify(membership_type.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching membership type: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _optional_amount(value):
+    """A nullable money field from a request; None means no limit."""
+    return ledger.to_amount(value) if value is not None else None
+
+def _optional_count(value):
+    """A nullable count limit from a request; None means no limit."""
+    return _count(value) if value is not None else None
+
+@bp.route('/api/membershiptypes', methods=['POST'])
+def api_add_membership_type():
+    try:
+        data = request.json
+        membership_type = MembershipType(
+            TypeName=data['TypeName'],
+            DurationMonths=data['DurationMonths'],
+            Fee=ledger.to_amount(data['Fee']),
+            MaxLoans=_optional_count(data.get('MaxLoans')),
+            MaxUnpaidFines=_optional_amount(data.get('MaxUnpaidFines'))
+        )
+        db.session.add(membership_type)
+        db.session.commit()
+        return jsonify({"message": "Membership type added successfully", "id": membership_type.MembershipTypeID})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding membership type: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/membershiptypes/<int:type_id>', methods=['PUT'])
+def api_update_membership_type(type_id):
+    try:
+        data = request.json
+        membership_type = MembershipType.query.get(type_id)
+        if not membership_type:
+            return jsonify({"error": "Membership type not found"}), 404
+            
+        membership_type.TypeName = data['TypeName']
+        membership_type.DurationMonths = data['DurationMonths']
+        membership_type.Fee = ledger.to_amount(data['Fee'])
+        if 'MaxLoans' in data:
+            membership_type.MaxLoans = _optional_count(data['MaxLoans'])
+        if 'MaxUnpaidFines' in data:
+            membership_type.MaxUnpaidFines = _optional_amount(data['MaxUnpaidFines'])
+        
+        db.session.commit()
+        return jsonify({"message": "Membership type updated successfully"})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating membership type: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/membershiptypes/<int:type_id>', methods=['DELETE'])
+def api_delete_membership_type(type_id):
+    try:
+        membership_type = MembershipType.query.get(type_id)
+        if not membership_type:
+            return jsonify({"error": "Membership type not found"}), 404
+            
+        db.session.delete(membership_type)
+        db.session.commit()
+        return jsonify({"message": "Membership type deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting membership type: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Staff
+@bp.route('/api/staff', methods=['GET'])
+def api_get_staff():
+    try:
+        return json_list(scoped(Staff.query, Staff))
+    except Exception as e:
+        logger.error(f"Error fetching staff: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/staff/<int:staff_id>', methods=['GET'])
+def api_get_staff_member(staff_id):
+    try:
+        staff_member = Staff.query.get(staff_id)
+        if not staff_member:
+            return jsonify({"error": "Staff member not found"}), 404
+        return jsonify(staff_member.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching staff member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/staff', methods=['POST'])
+def api_add_staff():
+    try:
+        data = request.json
+        
+        # Handle date conversion
+        hire_date = None
+        if data.get('HireDate'):
+            hire_date = datetime.strptime(data['HireDate'], '%Y-%m-%d').date()
+            
+        staff_member = Staff(
+            Name=data['Name'],
+            Email=data['Email'],
+            Phone=data['Phone'],
+            Role=data.get('Role'),
+            HireDate=hire_date,
+            BranchID=data.get('BranchID', current_branch_id())
+        )
+        db.session.add(staff_member)
+        db.session.commit()
+        return jsonify({"message": "Staff member added successfully", "id": staff_member.StaffID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding staff member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/staff/<int:staff_id>', methods=['PUT'])
+def api_update_staff(staff_id):
+    try:
+        data = request.json
+        staff_member = Staff.query.get(staff_id)
+        if not staff_member:
+            return jsonify({"error": "Staff member not found"}), 404
+            
+        # Handle date conversion
+        hire_date = None
+        if data.get('HireDate'):
+            hire_date = datetime.strptime(data['HireDate'], '%Y-%m-%d').date()
+            
+        staff_member.Name = data['Name']
+        staff_member.Email = data['Email']
+        staff_member.Phone = data['Phone']
+        staff_member.Role = data.get('Role')
+        staff_member.HireDate = hire_date
+        staff_member.BranchID = data.get('BranchID', staff_member.BranchID)
+        
+        db.session.commit()
+        return jsonify({"message": "Staff member updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating staff member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/staff/<int:staff_id>', methods=['DELETE'])
+def api_delete_staff(staff_id):
+    try:
+        staff_member = Staff.query.get(staff_id)
+        if not staff_member:
+            return jsonify({"error": "Staff member not found"}), 404
+            
+        db.session.delete(staff_member)
+        db.session.commit()
+        return jsonify({"message": "Staff member deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting staff member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Borrowings
+@bp.route('/api/borrowings', methods=['GET'])
+def api_get_borrowings():
+    try:
+        queries = [scoped(Borrowing.query, Borrowing).options(
+            joinedload(Borrowing.member), joinedload(Borrowing.book), joinedload(Borrowing.staff)
+        )]
+        if include_archived():
+            queries.append(scoped(BorrowingArchive.query, BorrowingArchive).options(
+                joinedload(BorrowingArchive.member), joinedload(BorrowingArchive.book),
+                joinedload(BorrowingArchive.staff)
+            ))
+        return json_list(*queries)
+    except Exception as e:
+        logger.error(f"Error fetching borrowings: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Overdue loans from the due-date index, paged with ?after=<next>
+@bp.route('/api/borrowings/overdue', methods=['GET'])
+def api_get_overdue_borrowings():
+    try:
+        return jsonify(duedates.get_overdue_page(
+            after=request.args.get('after'),
+            limit=request.args.get('limit', duedates.DEFAULT_PAGE_SIZE, type=int)
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching overdue borrowings: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/borrowings/<int:borrow_id>', methods=['GET'])
+def api_get_borrowing(borrow_id):
+    try:
+        borrowing = Borrowing.query.get(borrow_id)
+        if not borrowing and include_archived():
+            borrowing = BorrowingArchive.query.get(borrow_id)
+        if not borrowing:
+            return jsonify({"error": "Borrowing record not found"}), 404
+        return jsonify(borrowing.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching borrowing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/borrowings', methods=['POST'])
+@route_class(CIRCULATION)
+def api_add_borrowing():
+    try:
+        data = request.json
+        
+        # Handle date conversions
+        borrow_date = None
+        if data.get('BorrowDate'):
+            borrow_date = datetime.strptime(data['BorrowDate'], '%Y-%m-%d').date()
+        
+        due_date = datetime.strptime(data['DueDate'], '%Y-%m-%d').date()
+        
+        return_date = None
+        if data.get('ReturnDate'):
+            return_date = datetime.strptime(data['ReturnDate'], '%Y-%m-%d').date()
+            
+        # Check if book is available
+        book = Book.query.get(data['BookID'])
+        if not book:
+            return jsonify({"error": "Book not found"}), 404
+            
+        # Claim a specific copy for an open loan, from the desk's branch if it has one,
+        # once the member's loan and fine limits allow it
+        branch_id = data.get('BranchID', current_branch_id())
+        copy = None
+        if not return_date:
+            refusal = limits.claim_loan(data['MemberID'])
+            if refusal:
+                db.session.rollback()
+                return jsonify({"error": refusal}), 400
+            copy = copies.claim_copy(book, data.get('CopyID'), branch_id)
+            if copy is None:
+                db.session.rollback()
+                return jsonify({"error": "Book is not available for borrowing"}), 400
+            
+        # Create borrowing record
+        borrowing = Borrowing(
+            MemberID=data['MemberID'],
+            BookID=data['BookID'],
+            BorrowDate=borrow_date,
+            DueDate=due_date,
+            ReturnDate=return_date,
+            StaffID=data.get('StaffID'),
+            CopyID=copy.CopyID if copy else None,
+            BranchID=branch_id if branch_id is not None else (copy.BranchID if copy else None)
+        )
+            
+        db.session.add(borrowing)
+        circulation.record_event(circulation.CHECKOUT, borrowing)
+        if return_date:
+            circulation.record_event(circulation.RETURN, borrowing)
+        else:
+            stream_hub.availability_changed(book)
+        stream_hub.stats_changed(total_borrowings=1,
+                                 total_books=0 if return_date else -1,
+                                 overdue_borrowings=_overdue_delta(borrowing))
+        db.session.commit()
+        return jsonify({"message": "Borrowing record added successfully", "id": borrowing.BorrowID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding borrowing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/borrowings/<int:borrow_id>', methods=['PUT'])
+@route_class(CIRCULATION)
+def api_update_borrowing(borrow_id):
+    try:
+        data = request.json
+        borrowing = Borrowing.query.get(borrow_id)
+        if not borrowing:
+            return jsonify({"error": "Borrowing record not found"}), 404
+            
+        # Handle return scenarios (book quantity management)
+        old_return_date = borrowing.ReturnDate
+        new_return_date = None
+        
+        if data.get('ReturnDate'):
+            new_return_date = datetime.strptime(data['ReturnDate'], '%Y-%m-%d').date()
+            
+        # If returning a book that wasn't returned before
+        if new_return_date and not old_return_date:
+            copies.release_copy(borrowing)
+            book = Book.query.get(borrowing.BookID)
+            if book:
+                stream_hub.availability_changed(book)
+            circulation.record_event(circulation.RETURN, borrowing)
+            limits.adjust(borrowing.MemberID, open_loans=-1)
+            stream_hub.stats_changed(total_books=1, overdue_borrowings=-_overdue_delta(borrowing))
+                
+        # If un-returning a book
+        elif old_return_date and not new_return_date:
+            book = Book.query.get(borrowing.BookID)
+            copy = copies.claim_copy(book, branch_id=borrowing.BranchID) if book else None
+            if copy is None:
+                db.session.rollback()
+                return jsonify({"error": "Book is not available for borrowing"}), 400
+            borrowing.CopyID = copy.CopyID
+            stream_hub.availability_changed(book)
+            circulation.record_event(circulation.UNRETURN, borrowing)
+            # A correction rather than a checkout, so not held to the member's limits
+            limits.adjust(borrowing.MemberID, open_loans=1)
+            stream_hub.stats_changed(total_books=-1)
+                
+        # Handle date conversions
+        borrow_date = None
+        if data.get('BorrowDate'):
+            borrow_date = datetime.strptime(data['BorrowDate'], '%Y-%m-%d').date()
+        
+        due_date = datetime.strptime(data['DueDate'], '%Y-%m-%d').date()
+            
+        # An open loan moved to another book takes one of that book's copies
+        # and gives back the copy it held
+        if new_return_date is None and data['BookID'] != borrowing.BookID:
+            new_book = Book.query.get(data['BookID'])
+            copy = copies.claim_copy(new_book, branch_id=borrowing.BranchID) if new_book else None
+            if copy is None:
+                db.session.rollback()
+                return jsonify({"error": "Book is not available for borrowing"}), 400
+            copies.release_copy(borrowing)
+            old_book = Book.query.get(borrowing.BookID)
+            if old_book:
+                stream_hub.availability_changed(old_book)
+            borrowing.CopyID = copy.CopyID
+            stream_hub.availability_changed(new_book)
+
+        # Logged where the loan ends up, so replaying the log credits its
+        # checkout, and any later return or delete, to the same member and book
+        circulation.record_reassignment(borrowing, data['MemberID'], data['BookID'], new_return_date is None)
+
+        # Moving the loan to another member moves its open loan and unpaid fines too
+        if data['MemberID'] != borrowing.MemberID:
+            moved_loans = 0 if new_return_date else 1
+            limits.adjust(borrowing.MemberID, open_loans=-moved_loans)
+            limits.adjust(data['MemberID'], open_loans=moved_loans)
+            fines = ledger.borrowing_share(borrowing)
+            ledger.record(fines, (data['MemberID'],) + fines[1:])
+
+        # Update borrowing record
+        borrowing.MemberID = data['MemberID']
+        borrowing.BookID = data['BookID']
+        borrowing.BorrowDate = borrow_date
+        borrowing.DueDate = due_date
+        borrowing.ReturnDate = new_return_date
+        borrowing.StaffID = data.get('StaffID')
+        if old_return_date and not new_return_date:
+            stream_hub.stats_changed(overdue_borrowings=_overdue_delta(borrowing))
+        
+        db.session.commit()
+        return jsonify({"message": "Borrowing record updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating borrowing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/borrowings/<int:borrow_id>', methods=['DELETE'])
+@route_class(CIRCULATION)
+def api_delete_borrowing(borrow_id):
+    try:
+        borrowing = Borrowing.query.get(borrow_id)
+        if not borrowing:
+            return jsonify({"error": "Borrowing record not found"}), 404
+            
+        # If book was borrowed and not returned, increase quantity when deleting the record
+        if not borrowing.ReturnDate:
+            copies.release_copy(borrowing)
+            book = Book.query.get(borrowing.BookID)
+            if book:
+                stream_hub.availability_changed(book)
+            
+        circulation.record_event(circulation.DELETE, borrowing,
+                                 quantity_delta=0 if borrowing.ReturnDate else 1)
+        # Its fines go with it
+        limits.adjust(borrowing.MemberID, open_loans=0 if borrowing.ReturnDate else -1)
+        ledger.record(ledger.borrowing_share(borrowing), ledger.NO_SHARE)
+        stream_hub.stats_changed(total_borrowings=-1,
+                                 total_books=0 if borrowing.ReturnDate else 1,
+                                 overdue_borrowings=-_overdue_delta(borrowing))
+        db.session.delete(borrowing)
+        db.session.commit()
+        return jsonify({"message": "Borrowing record deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting borrowing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _overdue_delta(borrowing):
+    """1 if the borrowing currently counts towards the overdue total."""
+    return int(borrowing.ReturnDate is None and borrowing.DueDate < datetime.now().date())
+
+# Live updates for the dashboard as server-sent events
+@bp.route('/api/events')
+def api_event_stream():
+    if not stream_hub.open_stream():
+        response = jsonify({"error": "Too many open event streams, try again shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    response = Response(stream_hub.stream(), mimetype='text/event-stream')
+    # Runs when the client disconnects, whether or not the stream was started
+    response.call_on_close(stream_hub.close_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# API endpoints for the circulation event log
+@bp.route('/api/circulation/events', methods=['GET'])
+def api_get_circulation_events():
+    try:
+        query = CirculationEvent.query
+        if request.args.get('book_id', type=int):
+            query = query.filter_by(BookID=request.args.get('book_id', type=int))
+        if request.args.get('member_id', type=int):
+            query = query.filter_by(MemberID=request.args.get('member_id', type=int))
+        if request.args.get('borrow_id', type=int):
+            query = query.filter_by(BorrowID=request.args.get('borrow_id', type=int))
+        
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        events = query.order_by(CirculationEvent.EventID.desc()).limit(limit).all()
+        return jsonify([circulation_event.to_dict() for circulation_event in events])
+    except Exception as e:
+        logger.error(f"Error fetching circulation events: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/circulation/projections', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_get_circulation_projections():
+    try:
+        return jsonify(circulation.build_projections())
+    except Exception as e:
+        logger.error(f"Error building circulation projections: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/circulation/consistency', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_check_circulation_consistency():
+    try:
+        return jsonify(circulation.check_quantity_drift())
+    except Exception as e:
+        logger.error(f"Error checking circulation consistency: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.cli.command('circulation-backfill')
+def circulation_backfill_command():
+    """Seed the circulation event log from existing borrowings."""
+    written = circulation.backfill_from_borrowings()
+    print(f"Wrote {written} circulation events")
+
+# API endpoints for circulation analytics
+@bp.route('/api/analytics/circulation', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_get_circulation_analytics():
+    try:
+        today = datetime.now().date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+        if request.args.get('from'):
+            start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        else:
+            start = end.replace(day=1)
+        
+        result = analytics.get_circulation(
+            start, end,
+            group_by=request.args.get('group_by', 'total'),
+            interval=request.args.get('interval', 'day')
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching circulation analytics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.cli.command('analytics-rollup')
+@click.option('--through', default=None, help='Last day to roll up (YYYY-MM-DD), defaults to yesterday.')
+@click.option('--rebuild-from', default=None, help='Recompute rollups starting from this day (YYYY-MM-DD).')
+def analytics_rollup_command(through, rebuild_from):
+    """Extend the daily circulation rollup tables."""
+    result = analytics.roll_up(
+        through=datetime.strptime(through, '%Y-%m-%d').date() if through else None,
+        rebuild_from=datetime.strptime(rebuild_from, '%Y-%m-%d').date() if rebuild_from else None
+    )
+    print(f"Rolled up {result['rows']} rows through {result['rolled_through']}")
+
+@bp.cli.command('archive-circulation')
+@click.option('--months', default=archive.DEFAULT_MONTHS, help='Archive loans returned more than this many months ago.')
+def archive_circulation_command(months):
+    """Move long-returned borrowings and their paid fines to the archive tables."""
+    result = archive.archive_returned(months)
+    print(f"Archived {result['borrowings']} borrowings and {result['fines']} fines returned before {result['cutoff']}")
+
+# Hot and archive table sizes
+@bp.route('/api/archive', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_get_archive_status():
+    try:
+        horizon = archive.get_horizon()
+        return jsonify({
+            'horizon': horizon.isoformat() if horizon else None,
+            'tables': archive.get_table_sizes()
+        })
+    except Exception as e:
+        logger.error(f"Error fetching archive status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Replica routing status
+@bp.route('/api/replicas', methods=['GET'])
+def api_get_replicas():
+    return jsonify({
+        'strategy': replica_router.strategy,
+        'replicas': replica_router.status(),
+        'read_source': 'replica' if replica_router.replicas and g.get('replica_engine') is not None else 'primary'
+    })
+
+# Request profiles recorded with the X-Profile header or by sampling
+@bp.route('/api/profiles', methods=['GET'])
+def api_get_profiles():
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not profiler.authorized():
+        return jsonify({"error": "X-Profile header must carry PROFILE_SECRET"}), 403
+    try:
+        return jsonify(profiler.store.list())
+    except Exception as e:
+        logger.error(f"Error listing profiles: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# A profile as a speedscope file: open it at https://www.speedscope.app
+@bp.route('/api/profiles/<profile_id>', methods=['GET'])
+def api_get_profile(profile_id):
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not profiler.authorized():
+        return jsonify({"error": "X-Profile header must carry PROFILE_SECRET"}), 403
+    try:
+        profile = profiler.store.get(profile_id)
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+        response = jsonify(profile['speedscope'])
+        response.headers['Content-Disposition'] = f'inline; filename="{profile_id}.speedscope.json"'
+        return response
+    except Exception as e:
+        logger.error(f"Error fetching profile: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/profiles/<profile_id>/sql', methods=['GET'])
+def api_get_profile_sql(profile_id):
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not profiler.authorized():
+        return jsonify({"error": "X-Profile header must carry PROFILE_SECRET"}), 403
+    try:
+        profile = profiler.store.get(profile_id)
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify({key: value for key, value in profile.items() if key != 'speedscope'})
+    except Exception as e:
+        logger.error(f"Error fetching profile: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# ================ Background Jobs ================
+
+@job_queue.job_type('duplicate_scan', max_concurrent=1)
+def duplicate_scan_job(ctx):
+    return find_duplicate_books(progress=ctx.progress)
+
+@job_queue.job_type('circulation_consistency', max_concurrent=1)
+def circulation_consistency_job(ctx):
+    return circulation.check_quantity_drift()
+
+@job_queue.job_type('circulation_projections', max_concurrent=1)
+def circulation_projections_job(ctx, batch_size=1000):
+    return circulation.build_projections(batch_size)
+
+@job_queue.job_type('analytics_rollup', max_concurrent=1)
+def analytics_rollup_job(ctx, through=None, rebuild_from=None):
+    return analytics.roll_up(
+        through=datetime.strptime(through, '%Y-%m-%d').date() if through else None,
+        rebuild_from=datetime.strptime(rebuild_from, '%Y-%m-%d').date() if rebuild_from else None
+    )
+
+@job_queue.job_type('recommendations', max_concurrent=1)
+def recommendations_job(ctx, top_k=recommendations.DEFAULT_TOP_K):
+    return recommendations.build(top_k=top_k, progress=ctx.progress)
+
+@bp.cli.command('recommendations-build')
+@click.option('--top-k', default=recommendations.DEFAULT_TOP_K, help='Neighbours kept per book and member.')
+def recommendations_build_command(top_k):
+    """Rebuild the book similarity and member recommendation tables."""
+    result = recommendations.build(top_k=top_k)
+    print(f"Stored {result['book_similarities']} similarities and {result['member_recommendations']} recommendations")
+
+@job_queue.job_type('due_notifications', max_concurrent=1)
+def due_notifications_job(ctx, date=None, due_soon_days=None):
+    return duedates.send_due_notifications(
+        today=datetime.strptime(date, '%Y-%m-%d').date() if date else None,
+        due_soon_days=due_soon_days,
+        progress=ctx.progress
+    )
+
+@bp.cli.command('notifications-send')
+@click.option('--date', 'day', default=None, help='Day to send reminders for (YYYY-MM-DD), defaults to today.')
+@click.option('--due-soon-days', default=None, type=int, help='Remind loans due within this many days.')
+def notifications_send_command(day, due_soon_days):
+    """Write the daily due-soon and overdue reminders to the outbox."""
+    result = duedates.send_due_notifications(
+        today=datetime.strptime(day, '%Y-%m-%d').date() if day else None,
+        due_soon_days=due_soon_days
+    )
+    print(f"Sent {result['due_soon']} due-soon and {result['overdue']} overdue reminders for {result['date']}")
+
+@bp.cli.command('revenue-report')
+@click.option('--from', 'first', required=True, help='First month of the report (YYYY-MM).')
+@click.option('--to', 'last', default=None, help='Last month of the report (YYYY-MM), defaults to the first.')
+@click.option('--workers', default=None, type=int, help='Aggregating processes, defaults to one per CPU.')
+@click.option('--csv', 'csv_path', default=None, help='Also write the report as CSV to this file.')
+def revenue_report_command(first, last, workers, csv_path):
+    """Print monthly membership fee and fine revenue."""
+    start = datetime.strptime(first, '%Y-%m').date()
+    end = datetime.strptime(last, '%Y-%m').date() if last else start
+    report = reports.build_revenue_report(start, end, workers=workers)
+    print(reports.format_text(report))
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            reports.write_csv(report, f)
+
+@job_queue.job_type(enrichment.JOB_TYPE, max_concurrent=1)
+def catalog_enrichment_job(ctx, book_ids=None, batch_size=enrichment.DEFAULT_BATCH_SIZE):
+    return enrichment.enrich(book_ids=book_ids, batch_size=batch_size, progress=ctx.progress)
+
+@bp.cli.command('catalog-enrich')
+@click.option('--source', default=None, help='Metadata source, overriding ENRICHMENT_SOURCE.')
+@click.option('--batch-size', default=enrichment.DEFAULT_BATCH_SIZE, help='Books looked up and updated at a time.')
+def catalog_enrich_command(source, batch_size):
+    """Fill in missing book genres, years and publishers from a metadata source."""
+    result = enrichment.enrich(batch_size=batch_size, source=enrichment.get_source(source) if source else None)
+    print(f"Enriched {result['updated']} of {result['books']} books "
+          f"({result['cached']} cached, {result['fetched']} fetched, {result['not_found']} not found, "
+          f"{result['failed']} failed)")
+
+@job_queue.job_type('prune_tombstones', max_concurrent=1)
+def prune_tombstones_job(ctx, retention_days=30):
+    return {'deleted': sync.prune_tombstones(retention_days)}
+
+@job_queue.job_type('archive_circulation', max_concurrent=1)
+def archive_circulation_job(ctx, months=archive.DEFAULT_MONTHS):
+    return archive.archive_returned(months, progress=ctx.progress)
+
+# API endpoints for Jobs
+@bp.route('/api/jobs', methods=['GET'])
+def api_get_jobs():
+    try:
+        query = Job.query
+        if request.args.get('status'):
+            query = query.filter_by(Status=request.args['status'])
+        if request.args.get('type'):
+            query = query.filter_by(JobType=request.args['type'])
+        
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        jobs = query.order_by(Job.JobID.desc()).limit(limit).all()
+        return jsonify([job.to_dict() for job in jobs])
+    except Exception as e:
+        logger.error(f"Error fetching jobs: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def api_get_job(job_id):
+    try:
+        job = db.session.get(Job, job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    try:
+        data = request.json
+        job = job_queue.submit(data['JobType'], data.get('Params'))
+        return jsonify({"message": "Job submitted successfully", "id": job.JobID}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error submitting job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    try:
+        job = job_queue.cancel(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify({"message": "Job cancellation requested", "status": job.Status})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error cancelling job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Fines
+@bp.route('/api/fines', methods=['GET'])
+def api_get_fines():
+    try:
+        queries = [Fine.query.options(
+            joinedload(Fine.borrowing).joinedload(Borrowing.member),
+            joinedload(Fine.borrowing).joinedload(Borrowing.book)
+        )]
+        if include_archived():
+            queries.append(FineArchive.query.options(
+                joinedload(FineArchive.borrowing).joinedload(BorrowingArchive.member),
+                joinedload(FineArchive.borrowing).joinedload(BorrowingArchive.book)
+            ))
+        return json_list(*queries)
+    except Exception as e:
+        logger.error(f"Error fetching fines: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/fines/<int:fine_id>', methods=['GET'])
+def api_get_fine(fine_id):
+    try:
+        fine = Fine.query.get(fine_id)
+        if not fine and include_archived():
+            fine = FineArchive.query.get(fine_id)
+        if not fine:
+            return jsonify({"error": "Fine record not found"}), 404
+        return jsonify(fine.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching fine: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Members with unpaid fines, largest balance first
+@bp.route('/api/fines/balances', methods=['GET'])
+@route_class(EXPENSIVE)
+def api_get_fine_balances():
+    try:
+        minimum = request.args.get('min')
+        return jsonify(ledger.get_debtors(
+            minimum=ledger.to_amount(minimum) if minimum is not None else ledger.CENT,
+            limit=request.args.get('limit', ledger.DEFAULT_PAGE_SIZE, type=int)
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching fine balances: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/fines', methods=['POST'])
+@route_class(CIRCULATION)
+def api_add_fine():
+    try:
+        data = request.json
+        fine = Fine(
+            BorrowID=data['BorrowID'],
+            Amount=ledger.to_amount(data['Amount']),
+            Paid=data.get('Paid', False)
+        )
+        db.session.add(fine)
+        ledger.record(ledger.NO_SHARE, ledger.fine_share(fine.BorrowID, fine.Amount, fine.Paid))
+        db.session.commit()
+        return jsonify({"message": "Fine added successfully", "id": fine.FineID})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding fine: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/fines/<int:fine_id>', methods=['PUT'])
+@route_class(CIRCULATION)
+def api_update_fine(fine_id):
+    try:
+        data = request.json
+        fine = Fine.query.get(fine_id)
+        if not fine:
+            return jsonify({"error": "Fine record not found"}), 404
+            
+        before = ledger.fine_share(fine.BorrowID, fine.Amount, fine.Paid)
+        fine.BorrowID = data['BorrowID']
+        fine.Amount = ledger.to_amount(data['Amount'])
+        fine.Paid = data.get('Paid', False)
+        ledger.record(before, ledger.fine_share(fine.BorrowID, fine.Amount, fine.Paid))
+        
+        db.session.commit()
+        return jsonify({"message": "Fine updated successfully"})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating fine: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/fines/<int:fine_id>', methods=['DELETE'])
+@route_class(CIRCULATION)
+def api_delete_fine(fine_id):
+    try:
+        fine = Fine.query.get(fine_id)
+        if not fine:
+            return jsonify({"error": "Fine record not found"}), 404
+            
+        ledger.record(ledger.fine_share(fine.BorrowID, fine.Amount, fine.Paid), ledger.NO_SHARE)
+        db.session.delete(fine)
+        db.session.commit()
+        return jsonify({"message": "Fine deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting fine: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# API endpoints for Reservations
+@bp.route('/api/reservations', methods=['GET'])
+def api_get_reservations():
+    try:
+        return json_list(Reservation.query.options(joinedload(Reservation.member), joinedload(Reservation.book)))
+    except Exception as e:
+        logger.error(f"Error fetching reservations: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/reservations/<int:reservation_id>', methods=['GET'])
+def api_get_reservation(reservation_id):
+    try:
+        reservation = Reservation.query.get(reservation_id)
+        if not reservation:
+            return jsonify({"error": "Reservation not found"}), 404
+        return jsonify(reservation.to_dict())
+    except Exception as e:
+        logger.error(f"Error fetching reservation: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/reservations', methods=['POST'])
+def api_add_reservation():
+    try:
+        data = request.json
+        
+        # Handle date conversion
+        reservation_date = None
+        if data.get('ReservationDate'):
+            reservation_date = datetime.strptime(data['ReservationDate'], '%Y-%m-%d').date()
+            
+        reservation = Reservation(
+            MemberID=data['MemberID'],
+            BookID=data['BookID'],
+            ReservationDate=reservation_date,
+            Status=data.get('Status', 'Pending')
+        )
+        db.session.add(reservation)
+        db.session.commit()
+        return jsonify({"message": "Reservation added successfully", "id": reservation.ReservationID})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding reservation: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/reservations/<int:reservation_id>', methods=['PUT'])
+def api_update_reservation(reservation_id):
+    try:
+        data = request.json
+        reservation = Reservation.query.get(reservation_id)
+        if not reservation:
+            return jsonify({"error": "Reservation not found"}), 404
+            
+        # Handle date conversion
+        reservation_date = None
+        if data.get('ReservationDate'):
+            reservation_date = datetime.strptime(data['ReservationDate'], '%Y-%m-%d').date()
+            
+        reservation.MemberID = data['MemberID']
+        reservation.BookID = data['BookID']
+        reservation.ReservationDate = reservation_date
+        reservation.Status = data.get('Status', 'Pending')
+        
+        db.session.commit()
+        return jsonify({"message": "Reservation updated successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating reservation: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/reservations/<int:reservation_id>', methods=['DELETE'])
+def api_delete_reservation(reservation_id):
+    try:
+        reservation = Reservation.query.get(reservation_id)
+        if not reservation:
+            return jsonify({"error": "Reservation not found"}), 404
+            
+        db.session.delete(reservation)
+        db.session.commit()
+        return jsonify({"message": "Reservation deleted successfully"})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error deleting reservation: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -7,7 +7,17 @@ CREATE TABLE IF NOT EXISTS Publishers (
     Name VARCHAR(255) NOT NULL,
     Address TEXT,
     Email VARCHAR(100) UNIQUE,
-    Phone VARCHAR(15) UNIQUE
+    Phone VARCHAR(15) UNIQUE,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+);
+
+-- Table for library branches
+CREATE TABLE IF NOT EXISTS Branches (
+    BranchID INT AUTO_INCREMENT PRIMARY KEY,
+    Name VARCHAR(255) NOT NULL,
+    Code VARCHAR(20) UNIQUE NOT NULL,
+    Address TEXT,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
 );
 
 -- Table for storing book details
@@ -16,11 +26,34 @@ CREATE TABLE IF NOT EXISTS Books (
     Title VARCHAR(255) NOT NULL,
     Author VARCHAR(255) NOT NULL,
     ISBN VARCHAR(20) UNIQUE NOT NULL,
+    -- ISBN-13 form of ISBN, for scanner lookups
+    ISBN13 CHAR(13),
     Genre VARCHAR(100),
     PublishedYear INT,
     PublisherID INT,
-    Quantity INT NOT NULL CHECK (Quantity >= 0),
-    CONSTRAINT fk_books_publisher FOREIGN KEY (PublisherID) REFERENCES Publishers(PublisherID) ON DELETE SET NULL
+    -- Stock count from before per-copy tracking; availability now comes from Copies
+    Quantity INT NOT NULL DEFAULT 0 CHECK (Quantity >= 0),
+    BranchID INT,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_books_branch (BranchID),
+    INDEX ix_books_ISBN13 (ISBN13),
+    CONSTRAINT fk_books_publisher FOREIGN KEY (PublisherID) REFERENCES Publishers(PublisherID) ON DELETE SET NULL,
+    CONSTRAINT fk_books_branch FOREIGN KEY (BranchID) REFERENCES Branches(BranchID) ON DELETE SET NULL
+);
+
+-- Table for individual copies of a book
+CREATE TABLE IF NOT EXISTS Copies (
+    CopyID INT AUTO_INCREMENT PRIMARY KEY,
+    BookID INT NOT NULL,
+    Barcode VARCHAR(50) UNIQUE NOT NULL,
+    Status VARCHAR(20) NOT NULL DEFAULT 'available',
+    Location VARCHAR(100),
+    BranchID INT,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_copies_book_status (BookID, Status),
+    INDEX ix_copies_branch_status (BranchID, Status),
+    CONSTRAINT fk_copies_book FOREIGN KEY (BookID) REFERENCES Books(BookID) ON DELETE CASCADE,
+    CONSTRAINT fk_copies_branch FOREIGN KEY (BranchID) REFERENCES Branches(BranchID) ON DELETE SET NULL
 );
 
 -- Table for membership types
@@ -28,7 +61,10 @@ CREATE TABLE IF NOT EXISTS MembershipTypes (
     MembershipTypeID INT AUTO_INCREMENT PRIMARY KEY,
     TypeName VARCHAR(100) NOT NULL,
     DurationMonths INT NOT NULL,
-    Fee DECIMAL(10,2) NOT NULL
+    Fee DECIMAL(10,2) NOT NULL,
+    MaxLoans INT,
+    MaxUnpaidFines DECIMAL(10,2),
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
 );
 
 -- Table for library members
@@ -40,9 +76,29 @@ CREATE TABLE IF NOT EXISTS Members (
     Address TEXT,
     MembershipTypeID INT,
     MembershipDate DATE DEFAULT (CURDATE()),
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     CONSTRAINT fk_members_membershiptype FOREIGN KEY (MembershipTypeID) REFERENCES MembershipTypes(MembershipTypeID) ON DELETE SET NULL
 );
 
+-- Cached per-member open loan counts for the checkout policy check
+CREATE TABLE IF NOT EXISTS MemberCounters (
+    MemberID INT PRIMARY KEY,
+    OpenLoans INT NOT NULL DEFAULT 0,
+    CONSTRAINT fk_membercounters_member FOREIGN KEY (MemberID) REFERENCES Members(MemberID) ON DELETE CASCADE
+);
+
+-- Running per-member fine totals, live and archived
+CREATE TABLE IF NOT EXISTS FineBalances (
+    MemberID INT PRIMARY KEY,
+    Assessed DECIMAL(12,2) NOT NULL DEFAULT 0,
+    Paid DECIMAL(12,2) NOT NULL DEFAULT 0,
+    Outstanding DECIMAL(12,2) NOT NULL DEFAULT 0,
+    UnpaidCount INT NOT NULL DEFAULT 0,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_fine_balances_Outstanding (Outstanding),
+    CONSTRAINT fk_finebalances_member FOREIGN KEY (MemberID) REFERENCES Members(MemberID) ON DELETE CASCADE
+);
+
 -- Table for staff
 CREATE TABLE IF NOT EXISTS Staff (
     StaffID INT AUTO_INCREMENT PRIMARY KEY,
@@ -50,7 +106,11 @@ CREATE TABLE IF NOT EXISTS Staff (
     Email VARCHAR(100) UNIQUE NOT NULL,
     Phone VARCHAR(15) UNIQUE NOT NULL,
     Role VARCHAR(50),
-    HireDate DATE DEFAULT (CURDATE())
+    HireDate DATE DEFAULT (CURDATE()),
+    BranchID INT,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_staff_branch (BranchID),
+    CONSTRAINT fk_staff_branch FOREIGN KEY (BranchID) REFERENCES Branches(BranchID) ON DELETE SET NULL
 );
 
 -- Table for borrowing transactions
@@ -62,9 +122,16 @@ CREATE TABLE IF NOT EXISTS Borrowings (
     DueDate DATE NOT NULL,
     ReturnDate DATE,
     StaffID INT,
+    CopyID INT,
+    BranchID INT,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_borrowings_branch_open (BranchID, ReturnDate, DueDate),
+    INDEX ix_borrowings_open_due (ReturnDate, DueDate),
     CONSTRAINT fk_borrowings_member FOREIGN KEY (MemberID) REFERENCES Members(MemberID) ON DELETE CASCADE,
     CONSTRAINT fk_borrowings_book FOREIGN KEY (BookID) REFERENCES Books(BookID) ON DELETE CASCADE,
-    CONSTRAINT fk_borrowings_staff FOREIGN KEY (StaffID) REFERENCES Staff(StaffID) ON DELETE SET NULL
+    CONSTRAINT fk_borrowings_staff FOREIGN KEY (StaffID) REFERENCES Staff(StaffID) ON DELETE SET NULL,
+    CONSTRAINT fk_borrowings_copy FOREIGN KEY (CopyID) REFERENCES Copies(CopyID) ON DELETE SET NULL,
+    CONSTRAINT fk_borrowings_branch FOREIGN KEY (BranchID) REFERENCES Branches(BranchID) ON DELETE SET NULL
 );
 
 -- Table for fines
@@ -73,9 +140,36 @@ CREATE TABLE IF NOT EXISTS Fines (
     BorrowID INT,
     Amount DECIMAL(10,2) NOT NULL,
     Paid BOOLEAN DEFAULT FALSE,
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     CONSTRAINT fk_fines_borrow FOREIGN KEY (BorrowID) REFERENCES Borrowings(BorrowID) ON DELETE CASCADE
 );
 
+-- Returned borrowings moved out of the hot table by the archive job
+CREATE TABLE IF NOT EXISTS BorrowingsArchive (
+    BorrowID INT PRIMARY KEY,
+    MemberID INT,
+    BookID INT,
+    BorrowDate DATE,
+    DueDate DATE NOT NULL,
+    ReturnDate DATE,
+    StaffID INT,
+    CopyID INT,
+    BranchID INT,
+    ArchivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_borrowings_archive_member (MemberID),
+    INDEX idx_borrowings_archive_book (BookID)
+);
+
+-- Paid fines archived together with their borrowing
+CREATE TABLE IF NOT EXISTS FinesArchive (
+    FineID INT PRIMARY KEY,
+    BorrowID INT,
+    Amount DECIMAL(10,2) NOT NULL,
+    Paid BOOLEAN DEFAULT TRUE,
+    ArchivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_fines_archive_borrow (BorrowID)
+);
+
 -- Table for book reservations
 CREATE TABLE IF NOT EXISTS Reservations (
     ReservationID INT AUTO_INCREMENT PRIMARY KEY,
@@ -83,6 +177,119 @@ CREATE TABLE IF NOT EXISTS Reservations (
     BookID INT,
     ReservationDate DATE DEFAULT (CURDATE()),
     Status ENUM('Pending', 'Completed', 'Cancelled') DEFAULT 'Pending',
+    UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     CONSTRAINT fk_reservations_member FOREIGN KEY (MemberID) REFERENCES Members(MemberID) ON DELETE CASCADE,
     CONSTRAINT fk_reservations_book FOREIGN KEY (BookID) REFERENCES Books(BookID) ON DELETE CASCADE
 );
+
+-- Append-only log of circulation events (checkouts, returns, stock changes)
+CREATE TABLE IF NOT EXISTS CirculationEvents (
+    EventID INT AUTO_INCREMENT PRIMARY KEY,
+    EventType VARCHAR(20) NOT NULL,
+    BorrowID INT,
+    BookID INT,
+    MemberID INT,
+    StaffID INT,
+    QuantityDelta INT NOT NULL DEFAULT 0,
+    OccurredAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_circulation_events_borrow (BorrowID),
+    INDEX idx_circulation_events_book (BookID),
+    INDEX idx_circulation_events_member (MemberID)
+);
+
+-- Due-soon and overdue reminders sent by the daily notification batch
+CREATE TABLE IF NOT EXISTS DueNotifications (
+    NotificationID INT AUTO_INCREMENT PRIMARY KEY,
+    BorrowID INT NOT NULL,
+    MemberID INT,
+    Kind VARCHAR(20) NOT NULL,
+    DueDate DATE NOT NULL,
+    Recipient VARCHAR(100),
+    MessageFile VARCHAR(255),
+    CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_due_notification UNIQUE (BorrowID, Kind, DueDate),
+    INDEX idx_due_notifications_member (MemberID),
+    INDEX idx_due_notifications_created (CreatedAt)
+);
+
+-- Daily circulation rollups per dimension (total, genre, book, staff, membership type)
+CREATE TABLE IF NOT EXISTS CirculationRollups (
+    RollupID INT AUTO_INCREMENT PRIMARY KEY,
+    RollupDate DATE NOT NULL,
+    Dimension VARCHAR(20) NOT NULL,
+    DimensionKey VARCHAR(100) NOT NULL DEFAULT '',
+    Checkouts INT NOT NULL DEFAULT 0,
+    Returns INT NOT NULL DEFAULT 0,
+    CONSTRAINT uq_circulation_rollup UNIQUE (RollupDate, Dimension, DimensionKey),
+    INDEX idx_circulation_rollups_date (RollupDate)
+);
+
+-- Progress markers for batch jobs
+CREATE TABLE IF NOT EXISTS RollupWatermarks (
+    Name VARCHAR(50) PRIMARY KEY,
+    RolledThrough DATE NOT NULL
+);
+
+-- Background jobs run off the request thread
+CREATE TABLE IF NOT EXISTS Jobs (
+    JobID INT AUTO_INCREMENT PRIMARY KEY,
+    JobType VARCHAR(50) NOT NULL,
+    Status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    Params TEXT,
+    Progress FLOAT NOT NULL DEFAULT 0,
+    Message VARCHAR(255),
+    Result LONGTEXT,
+    Error TEXT,
+    CancelRequested BOOLEAN NOT NULL DEFAULT FALSE,
+    CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    StartedAt DATETIME,
+    FinishedAt DATETIME,
+    Worker VARCHAR(100),
+    HeartbeatAt DATETIME,
+    INDEX idx_jobs_type (JobType),
+    INDEX idx_jobs_status (Status)
+);
+
+-- Concurrency slots per job type, shared by every worker process
+CREATE TABLE IF NOT EXISTS JobSlots (
+    JobType VARCHAR(50) NOT NULL,
+    Slot INT NOT NULL,
+    JobID INT,
+    PRIMARY KEY (JobType, Slot)
+);
+
+-- Precomputed "also borrowed" neighbours per book (top K, ranked)
+CREATE TABLE IF NOT EXISTS BookSimilarities (
+    BookID INT NOT NULL,
+    `Rank` INT NOT NULL,
+    SimilarBookID INT NOT NULL,
+    Score DOUBLE NOT NULL,
+    PRIMARY KEY (BookID, `Rank`)
+);
+
+-- Precomputed recommendations per member (top K, ranked)
+CREATE TABLE IF NOT EXISTS MemberRecommendations (
+    MemberID INT NOT NULL,
+    `Rank` INT NOT NULL,
+    BookID INT NOT NULL,
+    Score DOUBLE NOT NULL,
+    PRIMARY KEY (MemberID, `Rank`)
+);
+
+-- Deleted rows, so clients syncing with /api/<entity>/changes can drop them
+CREATE TABLE IF NOT EXISTS Tombstones (
+    TombstoneID INT AUTO_INCREMENT PRIMARY KEY,
+    EntityType VARCHAR(30) NOT NULL,
+    EntityID INT NOT NULL,
+    DeletedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX ix_tombstones_entity_deleted (EntityType, DeletedAt)
+);
+
+-- Relay for live update events shared between worker processes
+CREATE TABLE IF NOT EXISTS StreamEvents (
+    StreamEventID INT AUTO_INCREMENT PRIMARY KEY,
+    EventType VARCHAR(30) NOT NULL,
+    Payload TEXT NOT NULL,
+    CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_stream_events_created (CreatedAt)
+);
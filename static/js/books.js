@@ -28,7 +28,7 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 async function loadBooks() {
     try {
-        books = await fetchData('/api/books');
+        books = await fetchSynced('books');
         displayBooks(books, currentPage);
     } catch (error) {
         console.error('Error loading books:', error);
@@ -119,7 +119,7 @@ function setupBookButtonListeners() {
  */
 async function loadPublishersDropdown() {
     try {
-        const publishers = await fetchData('/api/publishers');
+        const publishers = await fetchSynced('publishers');
         const select = document.getElementById('publisherID');
         
         // Clear existing options
@@ -4,8 +4,8 @@ let currentPage = 1;
 const itemsPerPage = 10;
 
 document.addEventListener('DOMContentLoaded', function() {
-    // Initialize borrowings table
-    loadBorrowings();
+    // Initialize borrowings table and the dropdowns in the form
+    loadPage();
     
     // Setup listeners
     document.getElementById('borrowingForm').addEventListener('submit', handleBorrowingFormSubmit);
@@ -15,19 +15,30 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('borrowingModalLabel').textContent = 'Add New Borrowing';
         document.querySelector('#borrowingModal .btn-primary').textContent = 'Add Borrowing';
     });
-    
-    // Setup dropdowns in the form
-    loadMembersDropdown();
-    loadBooksDropdown();
-    loadStaffDropdown();
 });
 
+/**
+ * Load the borrowings table and the form dropdowns in one round trip
+ */
+async function loadPage() {
+    try {
+        const [allBorrowings, members, books, staff] = await fetchSyncedMany(['borrowings', 'members', 'books', 'staff']);
+        borrowings = allBorrowings;
+        displayBorrowings(borrowings, currentPage);
+        fillMembersDropdown(members);
+        fillBooksDropdown(books);
+        fillStaffDropdown(staff);
+    } catch (error) {
+        console.error('Error loading page:', error);
+    }
+}
+
 /**
  * Load all borrowings from API
  */
 async function loadBorrowings() {
     try {
-        borrowings = await fetchData('/api/borrowings');
+        borrowings = await fetchSynced('borrowings');
         displayBorrowings(borrowings, currentPage);
     } catch (error) {
         console.error('Error loading borrowings:', error);
@@ -132,26 +143,22 @@ function setupBorrowingButtonListeners() {
 }
 
 /**
- * Load members for dropdown
+ * Fill the members dropdown
+ * @param {Array} members - All members
  */
-async function loadMembersDropdown() {
-    try {
-        const members = await fetchData('/api/members');
-        const select = document.getElementById('memberID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Member</option>';
-        
-        // Add member options
-        members.forEach(member => {
-            const option = document.createElement('option');
-            option.value = member.MemberID;
-            option.textContent = member.Name;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Error loading members:', error);
-    }
+function fillMembersDropdown(members) {
+    const select = document.getElementById('memberID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Member</option>';
+    
+    // Add member options
+    members.forEach(member => {
+        const option = document.createElement('option');
+        option.value = member.MemberID;
+        option.textContent = member.Name;
+        select.appendChild(option);
+    });
 }
 
 /**
@@ -159,45 +166,48 @@ async function loadMembersDropdown() {
  */
 async function loadBooksDropdown() {
     try {
-        const books = await fetchData('/api/books');
-        const select = document.getElementById('bookID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Book</option>';
-        
-        // Add book options (only show books with quantity > 0)
-        books.filter(book => book.Quantity > 0).forEach(book => {
-            const option = document.createElement('option');
-            option.value = book.BookID;
-            option.textContent = `${book.Title} (${book.Quantity} available)`;
-            select.appendChild(option);
-        });
+        fillBooksDropdown(await fetchSynced('books'));
     } catch (error) {
         console.error('Error loading books:', error);
     }
 }
 
 /**
- * Load staff for dropdown
+ * Fill the books dropdown
+ * @param {Array} books - All books
  */
-async function loadStaffDropdown() {
-    try {
-        const staff = await fetchData('/api/staff');
-        const select = document.getElementById('staffID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Staff Member</option>';
-        
-        // Add staff options
-        staff.forEach(staffMember => {
-            const option = document.createElement('option');
-            option.value = staffMember.StaffID;
-            option.textContent = staffMember.Name;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Error loading staff:', error);
-    }
+function fillBooksDropdown(books) {
+    const select = document.getElementById('bookID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Book</option>';
+    
+    // Add book options (only show books with quantity > 0)
+    books.filter(book => book.Quantity > 0).forEach(book => {
+        const option = document.createElement('option');
+        option.value = book.BookID;
+        option.textContent = `${book.Title} (${book.Quantity} available)`;
+        select.appendChild(option);
+    });
+}
+
+/**
+ * Fill the staff dropdown
+ * @param {Array} staff - All staff
+ */
+function fillStaffDropdown(staff) {
+    const select = document.getElementById('staffID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Staff Member</option>';
+    
+    // Add staff options
+    staff.forEach(staffMember => {
+        const option = document.createElement('option');
+        option.value = staffMember.StaffID;
+        option.textContent = staffMember.Name;
+        select.appendChild(option);
+    });
 }
 
 /**
@@ -2,6 +2,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Load dashboard data
     loadDashboardData();
     
+    // Keep the statistics cards current without reloading
+    subscribeToLiveUpdates();
+    
     /**
      * Load all dashboard data
      */
@@ -46,6 +49,42 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('overdue-borrowings').textContent = stats.overdue_borrowings || 0;
     }
     
+    /**
+     * Apply live updates pushed by the server
+     */
+    function subscribeToLiveUpdates() {
+        if (!window.EventSource) {
+            return;
+        }
+        const source = new EventSource('/api/events');
+        
+        // Counter deltas, e.g. {"total_books": -1, "total_borrowings": 1}
+        source.addEventListener('stats', function(event) {
+            const deltas = JSON.parse(event.data);
+            Object.keys(deltas).forEach(key => {
+                const element = document.getElementById(key.replace(/_/g, '-'));
+                if (element) {
+                    element.textContent = (parseInt(element.textContent, 10) || 0) + deltas[key];
+                }
+            });
+        });
+        
+        // Absolute overdue count, sent as loans pass their due date
+        source.addEventListener('overdue', function(event) {
+            const data = JSON.parse(event.data);
+            document.getElementById('overdue-borrowings').textContent = data.overdue_borrowings;
+        });
+        
+        // The event stream only carries changes, so resync after a reconnect
+        let connected = false;
+        source.addEventListener('open', function() {
+            if (connected) {
+                loadDashboardData();
+            }
+            connected = true;
+        });
+    }
+    
     /**
      * Create chart showing books by genre
      * @param {Array} genreData - The genre data
@@ -4,8 +4,8 @@ let currentPage = 1;
 const itemsPerPage = 10;
 
 document.addEventListener('DOMContentLoaded', function() {
-    // Initialize fines table
-    loadFines();
+    // Initialize fines table and the borrowings dropdown in the form
+    loadPage();
     
     // Setup listeners
     document.getElementById('fineForm').addEventListener('submit', handleFineFormSubmit);
@@ -15,17 +15,28 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('fineModalLabel').textContent = 'Add New Fine';
         document.querySelector('#fineModal .btn-primary').textContent = 'Add Fine';
     });
-    
-    // Setup borrowings dropdown in the form
-    loadBorrowingsDropdown();
 });
 
+/**
+ * Load the fines table and the form dropdowns in one round trip
+ */
+async function loadPage() {
+    try {
+        const [allFines, borrowings] = await fetchSyncedMany(['fines', 'borrowings']);
+        fines = allFines;
+        displayFines(fines, currentPage);
+        fillBorrowingsDropdown(borrowings);
+    } catch (error) {
+        console.error('Error loading page:', error);
+    }
+}
+
 /**
  * Load all fines from API
  */
 async function loadFines() {
     try {
-        fines = await fetchData('/api/fines');
+        fines = await fetchSynced('fines');
         displayFines(fines, currentPage);
     } catch (error) {
         console.error('Error loading fines:', error);
@@ -116,26 +127,22 @@ function setupFineButtonListeners() {
 }
 
 /**
- * Load borrowings for dropdown
+ * Fill the borrowings dropdown
+ * @param {Array} borrowings - All borrowings
  */
-async function loadBorrowingsDropdown() {
-    try {
-        const borrowings = await fetchData('/api/borrowings');
-        const select = document.getElementById('borrowID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Borrowing</option>';
-        
-        // Add borrowing options
-        borrowings.forEach(borrowing => {
-            const option = document.createElement('option');
-            option.value = borrowing.BorrowID;
-            option.textContent = `${borrowing.MemberName} - ${borrowing.BookTitle} (Due: ${formatDateForDisplay(borrowing.DueDate)})`;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Error loading borrowings:', error);
-    }
+function fillBorrowingsDropdown(borrowings) {
+    const select = document.getElementById('borrowID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Borrowing</option>';
+    
+    // Add borrowing options
+    borrowings.forEach(borrowing => {
+        const option = document.createElement('option');
+        option.value = borrowing.BorrowID;
+        option.textContent = `${borrowing.MemberName} - ${borrowing.BookTitle} (Due: ${formatDateForDisplay(borrowing.DueDate)})`;
+        select.appendChild(option);
+    });
 }
 
 /**
@@ -187,7 +187,14 @@ function createPagination(container, totalItems, itemsPerPage, currentPage, onCh
  */
 async function fetchData(url) {
     try {
-        const response = await fetch(url);
+        let response = await fetch(url);
+        
+        // Rate limited: wait as long as the server asks, then retry once
+        if (response.status === 429) {
+            const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 1;
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+            response = await fetch(url);
+        }
         
         if (!response.ok) {
             const error = await response.json();
@@ -201,6 +208,155 @@ async function fetchData(url) {
     }
 }
 
+/**
+ * Primary key of each entity that can be synced with /api/<entity>/changes
+ */
+const SYNC_KEYS = {
+    publishers: 'PublisherID',
+    books: 'BookID',
+    members: 'MemberID',
+    membershiptypes: 'MembershipTypeID',
+    staff: 'StaffID',
+    borrowings: 'BorrowID',
+    fines: 'FineID',
+    reservations: 'ReservationID'
+};
+
+let cacheDbPromise = null;
+
+/**
+ * Open (and on first use create) the IndexedDB cache of synced entities
+ * @returns {Promise<IDBDatabase>} The database
+ */
+function openCacheDb() {
+    if (!cacheDbPromise) {
+        cacheDbPromise = new Promise((resolve, reject) => {
+            const request = indexedDB.open('library-cache', 1);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                Object.entries(SYNC_KEYS).forEach(([entity, keyPath]) => {
+                    db.createObjectStore(entity, { keyPath: keyPath });
+                });
+                db.createObjectStore('syncTokens', { keyPath: 'entity' });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+    return cacheDbPromise;
+}
+
+/**
+ * Wrap an IndexedDB request or transaction in a promise
+ * @param {IDBRequest|IDBTransaction} target - The request or transaction
+ * @returns {Promise<any>} The request result, once it (or the transaction) completes
+ */
+function idbDone(target) {
+    return new Promise((resolve, reject) => {
+        if (target instanceof IDBTransaction) {
+            target.oncomplete = () => resolve();
+            target.onabort = target.onerror = () => reject(target.error);
+        } else {
+            target.onsuccess = () => resolve(target.result);
+            target.onerror = () => reject(target.error);
+        }
+    });
+}
+
+/**
+ * Apply a /api/<entity>/changes response to the local copy of an entity
+ * @param {IDBDatabase} db - The cache database
+ * @param {string} entity - The entity name, e.g. 'books'
+ * @param {object} changes - The changes response
+ * @returns {Promise<Array>} All rows of the entity
+ */
+async function applyChanges(db, entity, changes) {
+    const tx = db.transaction([entity, 'syncTokens'], 'readwrite');
+    const store = tx.objectStore(entity);
+    if (changes.full) {
+        store.clear();
+    }
+    changes.upserts.forEach(row => store.put(row));
+    changes.deletes.forEach(id => store.delete(id));
+    tx.objectStore('syncTokens').put({ entity: entity, token: changes.token });
+    
+    const rows = store.getAll();
+    await idbDone(tx);
+    return rows.result;
+}
+
+/**
+ * Build the changes URL for an entity from its stored sync token
+ * @param {IDBDatabase} db - The cache database
+ * @param {string} entity - The entity name, e.g. 'books'
+ * @returns {Promise<string>} The URL to fetch
+ */
+async function changesUrl(db, entity) {
+    const tokenRecord = await idbDone(db.transaction('syncTokens').objectStore('syncTokens').get(entity));
+    const since = tokenRecord ? `?since=${encodeURIComponent(tokenRecord.token)}` : '';
+    return `/api/${entity}/changes${since}`;
+}
+
+/**
+ * Get all rows of an entity, keeping a local IndexedDB copy up to date with
+ * only the rows changed since the last sync. Falls back to a full fetch when
+ * IndexedDB is unavailable.
+ * @param {string} entity - The entity name, e.g. 'books'
+ * @returns {Promise<Array>} All rows of the entity
+ */
+async function fetchSynced(entity) {
+    if (!window.indexedDB) {
+        return fetchData(`/api/${entity}`);
+    }
+    
+    try {
+        const db = await openCacheDb();
+        const changes = await fetchData(await changesUrl(db, entity));
+        return await applyChanges(db, entity, changes);
+    } catch (error) {
+        console.error(`Error syncing ${entity}, fetching everything instead:`, error);
+        return fetchData(`/api/${entity}`);
+    }
+}
+
+/**
+ * Send several API requests in one round trip through /api/batch
+ * @param {Array<object>} requests - Sub-requests as {method, path, body}
+ * @returns {Promise<Array>} One {status, body} result per sub-request, in order
+ */
+async function fetchBatch(requests) {
+    const result = await sendRequest('/api/batch', 'POST', { requests: requests });
+    return result.responses;
+}
+
+/**
+ * Like fetchSynced, for several entities at once: all changes are fetched
+ * in a single batch request. Entities whose part of the batch fails are
+ * synced on their own instead.
+ * @param {Array<string>} entities - The entity names, e.g. ['members', 'books']
+ * @returns {Promise<Array<Array>>} All rows of each entity, in order
+ */
+async function fetchSyncedMany(entities) {
+    try {
+        if (!window.indexedDB) {
+            const responses = await fetchBatch(entities.map(entity => ({ method: 'GET', path: `/api/${entity}` })));
+            return await Promise.all(entities.map((entity, i) =>
+                responses[i].status === 200 ? responses[i].body : fetchData(`/api/${entity}`)
+            ));
+        }
+        
+        const db = await openCacheDb();
+        const urls = await Promise.all(entities.map(entity => changesUrl(db, entity)));
+        const responses = await fetchBatch(urls.map(url => ({ method: 'GET', path: url })));
+        return await Promise.all(entities.map((entity, i) =>
+            responses[i].status === 200 ? applyChanges(db, entity, responses[i].body) : fetchSynced(entity)
+        ));
+    } catch (error) {
+        console.error('Error in batch sync, syncing one by one instead:', error);
+        return Promise.all(entities.map(entity => fetchSynced(entity)));
+    }
+}
+
 /**
  * Generic function to post/put data to an API endpoint
  * @param {string} url - The API endpoint URL
@@ -25,7 +25,7 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 async function loadMembers() {
     try {
-        members = await fetchData('/api/members');
+        members = await fetchSynced('members');
         displayMembers(members, currentPage);
     } catch (error) {
         console.error('Error loading members:', error);
@@ -116,7 +116,7 @@ function setupMemberButtonListeners() {
  */
 async function loadMembershipTypesDropdown() {
     try {
-        const membershipTypes = await fetchData('/api/membershiptypes');
+        const membershipTypes = await fetchSynced('membershiptypes');
         const select = document.getElementById('membershipTypeID');
         
         // Clear existing options
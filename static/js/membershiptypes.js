@@ -15,7 +15,7 @@ document.addEventListener('DOMContentLoaded', function() {
     async function loadMembershipTypes() {
         showLoader();
         try {
-            const response = await fetchData('/api/membershiptypes');
+            const response = await fetchSynced('membershiptypes');
             allMembershipTypes = response;
             displayMembershipTypes(allMembershipTypes, 1);
             hideLoader();
@@ -39,7 +39,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const paginatedTypes = membershipTypesToDisplay.slice(startIndex, endIndex);
         
         if (paginatedTypes.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="5" class="text-center">No membership types found</td></tr>';
+            tbody.innerHTML = '<tr><td colspan="7" class="text-center">No membership types found</td></tr>';
             return;
         }
         
@@ -51,6 +51,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 <td>${type.TypeName}</td>
                 <td>${type.DurationMonths}</td>
                 <td>$${type.Fee.toFixed(2)}</td>
+                <td>${type.MaxLoans ?? 'No limit'}</td>
+                <td>${type.MaxUnpaidFines != null ? '$' + type.MaxUnpaidFines.toFixed(2) : 'No limit'}</td>
                 <td>
                     <button class="btn btn-sm btn-outline-primary edit-btn" data-id="${type.MembershipTypeID}">
                         <i class="bi bi-pencil"></i> Edit
@@ -149,6 +151,8 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('typeName').value = response.TypeName;
             document.getElementById('durationMonths').value = response.DurationMonths;
             document.getElementById('fee').value = response.Fee;
+            document.getElementById('maxLoans').value = response.MaxLoans ?? '';
+            document.getElementById('maxUnpaidFines').value = response.MaxUnpaidFines ?? '';
             
             // Change modal title
             document.getElementById('membershipTypeModalLabel').textContent = 'Edit Membership Type';
@@ -182,12 +186,17 @@ document.addEventListener('DOMContentLoaded', function() {
         const typeName = document.getElementById('typeName').value;
         const durationMonths = parseInt(document.getElementById('durationMonths').value);
         const fee = parseFloat(document.getElementById('fee').value);
+        // Blank limits mean no limit
+        const maxLoans = document.getElementById('maxLoans').value;
+        const maxUnpaidFines = document.getElementById('maxUnpaidFines').value;
         
         // Create data object
         const data = {
             TypeName: typeName,
             DurationMonths: durationMonths,
-            Fee: fee
+            Fee: fee,
+            MaxLoans: maxLoans === '' ? null : parseInt(maxLoans),
+            MaxUnpaidFines: maxUnpaidFines === '' ? null : parseFloat(maxUnpaidFines)
         };
         
         if (typeId) {
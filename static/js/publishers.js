@@ -22,7 +22,7 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 async function loadPublishers() {
     try {
-        publishers = await fetchData('/api/publishers');
+        publishers = await fetchSynced('publishers');
         displayPublishers(publishers, currentPage);
     } catch (error) {
         console.error('Error loading publishers:', error);
@@ -4,8 +4,8 @@ let currentPage = 1;
 const itemsPerPage = 10;
 
 document.addEventListener('DOMContentLoaded', function() {
-    // Initialize reservations table
-    loadReservations();
+    // Initialize reservations table and the dropdowns in the form
+    loadPage();
     
     // Setup listeners
     document.getElementById('reservationForm').addEventListener('submit', handleReservationFormSubmit);
@@ -15,18 +15,29 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('reservationModalLabel').textContent = 'Add New Reservation';
         document.querySelector('#reservationModal .btn-primary').textContent = 'Add Reservation';
     });
-    
-    // Setup dropdowns in the form
-    loadMembersDropdown();
-    loadBooksDropdown();
 });
 
+/**
+ * Load the reservations table and the form dropdowns in one round trip
+ */
+async function loadPage() {
+    try {
+        const [allReservations, members, books] = await fetchSyncedMany(['reservations', 'members', 'books']);
+        reservations = allReservations;
+        displayReservations(reservations, currentPage);
+        fillMembersDropdown(members);
+        fillBooksDropdown(books);
+    } catch (error) {
+        console.error('Error loading page:', error);
+    }
+}
+
 /**
  * Load all reservations from API
  */
 async function loadReservations() {
     try {
-        reservations = await fetchData('/api/reservations');
+        reservations = await fetchSynced('reservations');
         displayReservations(reservations, currentPage);
     } catch (error) {
         console.error('Error loading reservations:', error);
@@ -119,49 +130,41 @@ function setupReservationButtonListeners() {
 }
 
 /**
- * Load members for dropdown
+ * Fill the members dropdown
+ * @param {Array} members - All members
  */
-async function loadMembersDropdown() {
-    try {
-        const members = await fetchData('/api/members');
-        const select = document.getElementById('memberID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Member</option>';
-        
-        // Add member options
-        members.forEach(member => {
-            const option = document.createElement('option');
-            option.value = member.MemberID;
-            option.textContent = member.Name;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Error loading members:', error);
-    }
+function fillMembersDropdown(members) {
+    const select = document.getElementById('memberID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Member</option>';
+    
+    // Add member options
+    members.forEach(member => {
+        const option = document.createElement('option');
+        option.value = member.MemberID;
+        option.textContent = member.Name;
+        select.appendChild(option);
+    });
 }
 
 /**
- * Load books for dropdown
+ * Fill the books dropdown
+ * @param {Array} books - All books
  */
-async function loadBooksDropdown() {
-    try {
-        const books = await fetchData('/api/books');
-        const select = document.getElementById('bookID');
-        
-        // Clear existing options
-        select.innerHTML = '<option value="">Select Book</option>';
-        
-        // Add book options
-        books.forEach(book => {
-            const option = document.createElement('option');
-            option.value = book.BookID;
-            option.textContent = `${book.Title} (${book.Quantity} available)`;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Error loading books:', error);
-    }
+function fillBooksDropdown(books) {
+    const select = document.getElementById('bookID');
+    
+    // Clear existing options
+    select.innerHTML = '<option value="">Select Book</option>';
+    
+    // Add book options
+    books.forEach(book => {
+        const option = document.createElement('option');
+        option.value = book.BookID;
+        option.textContent = `${book.Title} (${book.Quantity} available)`;
+        select.appendChild(option);
+    });
 }
 
 /**
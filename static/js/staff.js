@@ -22,7 +22,7 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 async function loadStaff() {
     try {
-        staffMembers = await fetchData('/api/staff');
+        staffMembers = await fetchSynced('staff');
         displayStaff(staffMembers, currentPage);
     } catch (error) {
         console.error('Error loading staff:', error);
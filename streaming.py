@@ -0,0 +1,88 @@
+import logging
+from flask import Response, current_app
+from sqlalchemy import exc
+from sqlalchemy.orm import Session
+from models import db
+from replicas import fall_back
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched and serialized at a time
+STREAM_BATCH_SIZE = 1000
+
+
+def _batches(session: Session, queries, serialize, batch_size: int):
+    for query in queries:
+        batch = []
+        for row in query.with_session(session).yield_per(batch_size):
+            batch.append(serialize(row))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _chunks(session: Session, queries, serialize, batch_size: int, dumps):
+    try:
+        separator = '['
+        for batch in _batches(session, queries, serialize, batch_size):
+            # One dumps() per batch; [1:-1] drops the batch's own brackets
+            yield separator + dumps(batch, separators=(',', ':'))[1:-1]
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+    finally:
+        session.close()
+
+
+def _stream(opening: str, chunks):
+    yield opening
+    try:
+        yield from chunks
+    except Exception as e:
+        # Too late for an error response; the client sees a cut-off array
+        logger.error(f"Error streaming list response: {str(e)}")
+        raise
+
+
+def json_list(*queries, serialize=None, batch_size: int = STREAM_BATCH_SIZE) -> Response:
+    """Stream the rows of one or more queries as a single JSON array.
+
+    Equivalent to jsonify([row.to_dict() for row in query.all()]) with
+    memory bounded by the batch size instead of the result: rows are
+    fetched with yield_per (a server-side cursor where the driver has
+    one) and serialized a batch at a time, so a large table is never held
+    as ORM objects, dicts and one JSON string all at once.
+
+    The rows are read in a session of their own, on the engine the
+    request's session would use (a replica, for routed reads): the
+    request's session is closed at teardown, before the body is sent.
+    Nothing else uses that session and its identity map holds rows
+    weakly, so each batch's objects are freed once serialized without
+    expunging them one by one, which costs about as much as loading them.
+
+    Queries should eager-load every relationship serialize() touches; a
+    lazy load per row is slow, and MySQL can't run one while a
+    server-side cursor is open. The first batch is fetched before the
+    response starts, so a query that fails outright still gets the
+    route's 500, or is retried on the primary if it was a replica that
+    failed.
+    """
+    serialize = serialize or (lambda row: row.to_dict())
+
+    def start():
+        chunks = _chunks(Session(bind=db.session.get_bind()), queries, serialize, batch_size,
+                         current_app.json.dumps)
+        try:
+            return next(chunks), chunks
+        except Exception:
+            chunks.close()
+            raise
+
+    try:
+        opening, chunks = start()
+    except exc.DBAPIError as e:
+        if not fall_back(e):
+            raise
+        opening, chunks = start()
+    return Response(_stream(opening, chunks), mimetype='application/json')
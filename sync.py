@@ -0,0 +1,150 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import event, or_, select
+from models import (db, Branch, Publisher, Book, Copy, Member, MembershipType, Staff, Borrowing, Fine, Reservation,
+                    Tombstone, RollupWatermark)
+from replicas import RoutingSession
+from branches import scoped
+
+logger = logging.getLogger(__name__)
+
+# URL name -> (model, primary key attribute)
+SYNC_ENTITIES = {
+    'branches': (Branch, 'BranchID'),
+    'publishers': (Publisher, 'PublisherID'),
+    'books': (Book, 'BookID'),
+    'members': (Member, 'MemberID'),
+    'membershiptypes': (MembershipType, 'MembershipTypeID'),
+    'staff': (Staff, 'StaffID'),
+    'borrowings': (Borrowing, 'BorrowID'),
+    'fines': (Fine, 'FineID'),
+    'reservations': (Reservation, 'ReservationID'),
+}
+
+ENTITY_NAMES = {model: name for name, (model, _) in SYNC_ENTITIES.items()}
+
+# Entities whose list endpoints are scoped to the request's branch
+BRANCH_SCOPED = {'books', 'staff', 'borrowings'}
+
+# Fields copied from other tables (Book.Quantity counts available Copies,
+# Borrowing.MemberName is the member's name, ...): a row also counts as
+# changed when a row it copies from did.
+# URL name -> [(column of the synced row, since -> query for the values of
+# that column whose source rows changed)]
+DERIVED_CHANGES = {
+    'books': [
+        (Book.BookID, lambda since: select(Copy.BookID).where(Copy.UpdatedAt >= since)),
+        (Book.PublisherID, lambda since: select(Publisher.PublisherID).where(Publisher.UpdatedAt >= since)),
+    ],
+    'members': [
+        (Member.MembershipTypeID, lambda since: select(MembershipType.MembershipTypeID).where(
+            MembershipType.UpdatedAt >= since)),
+    ],
+    'borrowings': [
+        (Borrowing.MemberID, lambda since: select(Member.MemberID).where(Member.UpdatedAt >= since)),
+        (Borrowing.BookID, lambda since: select(Book.BookID).where(Book.UpdatedAt >= since)),
+        (Borrowing.StaffID, lambda since: select(Staff.StaffID).where(Staff.UpdatedAt >= since)),
+    ],
+    'fines': [
+        (Fine.BorrowID, lambda since: select(Borrowing.BorrowID).where(Borrowing.UpdatedAt >= since)),
+        (Fine.BorrowID, lambda since: select(Borrowing.BorrowID).join(
+            Member, Borrowing.MemberID == Member.MemberID).where(Member.UpdatedAt >= since)),
+        (Fine.BorrowID, lambda since: select(Borrowing.BorrowID).join(
+            Book, Borrowing.BookID == Book.BookID).where(Book.UpdatedAt >= since)),
+    ],
+    'reservations': [
+        (Reservation.MemberID, lambda since: select(Member.MemberID).where(Member.UpdatedAt >= since)),
+        (Reservation.BookID, lambda since: select(Book.BookID).where(Book.UpdatedAt >= since)),
+    ],
+}
+
+TOKEN_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Tokens are issued this far in the past so that a transaction which stamped
+# UpdatedAt just before the token but committed just after is still picked
+# up next time. Clients upsert by ID, so seeing a row twice is harmless.
+TOKEN_OVERLAP = timedelta(seconds=2)
+
+TOMBSTONE_HORIZON = 'tombstones'
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _record_tombstones(session, flush_context, instances) -> None:
+    for obj in session.deleted:
+        entity = ENTITY_NAMES.get(type(obj))
+        if entity is None:
+            continue
+        entity_id = getattr(obj, SYNC_ENTITIES[entity][1])
+        if entity_id is not None:
+            session.add(Tombstone(EntityType=entity, EntityID=entity_id))
+
+
+def encode_token(moment: datetime) -> str:
+    return moment.strftime(TOKEN_FORMAT)
+
+
+def decode_token(token: str) -> datetime:
+    try:
+        return datetime.strptime(token, TOKEN_FORMAT)
+    except ValueError:
+        raise ValueError("Invalid change token")
+
+
+def get_changes(entity: str, since: Optional[str] = None) -> Dict[str, Any]:
+    """Rows of an entity changed or deleted since a change token.
+
+    Without a token, or with one older than the tombstone retention horizon,
+    the full table is returned with `full` set so the client can replace
+    its cache instead of merging.
+    """
+    if entity not in SYNC_ENTITIES:
+        raise KeyError(entity)
+    model, id_attr = SYNC_ENTITIES[entity]
+
+    # Taken before reading, so anything committed meanwhile is seen next time
+    token = encode_token(datetime.utcnow() - TOKEN_OVERLAP)
+
+    since_moment = decode_token(since) if since else None
+    horizon = db.session.get(RollupWatermark, TOMBSTONE_HORIZON)
+    if since_moment and horizon and since_moment.date() < horizon.RolledThrough:
+        since_moment = None
+
+    # The same rows the entity's list endpoint returns
+    query = scoped(model.query, model) if entity in BRANCH_SCOPED else model.query
+
+    if since_moment is None:
+        rows = query.order_by(getattr(model, id_attr)).all()
+        return {'token': token, 'full': True, 'upserts': [row.to_dict() for row in rows], 'deletes': []}
+
+    changed = or_(model.UpdatedAt >= since_moment, *(
+        column.in_(sources(since_moment)) for column, sources in DERIVED_CHANGES.get(entity, [])
+    ))
+    rows = query.filter(changed).order_by(getattr(model, id_attr)).all()
+    deleted_ids = [entity_id for (entity_id,) in db.session.query(Tombstone.EntityID).filter(
+        Tombstone.EntityType == entity, Tombstone.DeletedAt >= since_moment
+    )]
+    return {
+        'token': token,
+        'full': False,
+        'upserts': [row.to_dict() for row in rows],
+        'deletes': deleted_ids
+    }
+
+
+def prune_tombstones(retention_days: int = 30) -> int:
+    """Delete old tombstones and move the horizon that forces a full resync."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = Tombstone.query.filter(Tombstone.DeletedAt < cutoff).delete(synchronize_session=False)
+
+    # Tokens from before the day after the cutoff may have missed a pruned
+    # tombstone, so they get a full resync
+    horizon_date = cutoff.date() + timedelta(days=1)
+    horizon = db.session.get(RollupWatermark, TOMBSTONE_HORIZON)
+    if horizon:
+        horizon.RolledThrough = horizon_date
+    else:
+        db.session.add(RollupWatermark(Name=TOMBSTONE_HORIZON, RolledThrough=horizon_date))
+    db.session.commit()
+    logger.info(f"Pruned {deleted} tombstones older than {cutoff}")
+    return deleted